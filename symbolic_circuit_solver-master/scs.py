@@ -10,14 +10,21 @@
     also to standard output.
 """
 import argparse
+import atexit
 import sys
 import os
 import logging
 import time
 
+import scs_backend
 import scs_instance_hier
 import scs_circuit
 import scs_parser
+import scs_errors
+import scs_reduction
+import scs_cascade
+import scs_governor
+import scs_trace
 
 __author__ = "Tomasz Kniola"
 __credits__ = ["Tomasz Kniola"]
@@ -44,6 +51,42 @@ def main():
                         help='output files name, on default name from input file before prefix will be used')
     parser.add_argument('-v', action='store_true',
                         help='verbose mode - displays output warning and errors onto standard output')
+    parser.add_argument('--macro', action='append', metavar='SUBCKT',
+                        help='pre-solve subcircuit SUBCKT of input file into macro model file output_SUBCKT.scm and '
+                             'exit, could be used many times. Load it in netlist with .macro \'output_SUBCKT.scm\'')
+    parser.add_argument('--trace', metavar='FILE',
+                        help='write JSON trace of timings and expresion sizes of each phase, subinstance and analysis '
+                             'step to FILE')
+    parser.add_argument('-j', type=int, default=1, metavar='JOBS',
+                        help='number of processes performing analyses at the same time, 1 on default')
+    parser.add_argument('--check', action='store_true',
+                        help='only parse, instantiate and check the circuit, without solving it and performing '
+                             'analyses')
+    parser.add_argument('--max-ops', type=int, metavar='N',
+                        help='skip simplifying steps (cancel, factor, simplify, symbolic poles and zeros) of expresions '
+                             'with more than N operations and use cheaper fallback instead')
+    parser.add_argument('--stage-timeout', type=float, metavar='SEC',
+                        help='interrupt simplifying step after SEC seconds and use cheaper fallback instead')
+    parser.add_argument('--solver', default='inverse', choices=sorted(scs_instance_hier.solvers),
+                        help='engine solving equations of instances: inverse - explicit inversion of matrix (default), '
+                             'ddd - determinant decision diagrams, for big flat circuits, interpolation - numeric '
+                             'solving at many points of s interpolated into polynomials, for circuits with numeric '
+                             'parameters')
+    parser.add_argument('--backend', default='sympy', choices=sorted(scs_backend.backends),
+                        help='symbolic engine of cancelling, determinants and factoring: sympy (default) or symengine, '
+                             'if installed')
+    parser.add_argument('--exact', action='store_true',
+                        help='keep numbers and engineer suffixes of netlist as exact rationals instead of floats, so '
+                             'results are exact and reproducible, floats appear only in numeric results')
+    parser.add_argument('--reduce', action='store_true',
+                        help='merge series and parallel passive elements and eliminate nets which analyses don\'t '
+                             'observe before solving, nets and elements removed can\'t be probed')
+    parser.add_argument('--cascade', action='store_true',
+                        help='replace chains of two-port subinstances (ladders, cascaded stages) by products of their '
+                             'transmission matrices before solving, nets and instances inside chains can\'t be probed')
+    parser.add_argument('--superposition', action='store_true',
+                        help='solve each independent source as a right hand side of its own, so contribution of source '
+                             'to voltage of net can be probed by vsrc(net,source) in analyses')
     args = parser.parse_args(sys.argv[1:])
 
     input_file_name = args.i
@@ -75,34 +118,124 @@ def main():
     Runtime: %s
     """ % (__version__, __author__, time.strftime("%Y-%m-%d %H:%M:%S", time.localtime())))
 
+    # Trace is dumped however the run ends
+    if args.trace:
+        scs_trace.enable()
+        atexit.register(scs_trace.dump, args.trace)
+
+    scs_governor.configure(args.max_ops, args.stage_timeout)
+    scs_instance_hier.solver = args.solver
+    scs_parser.exact = args.exact
+    scs_reduction.enabled = args.reduce
+    scs_cascade.enabled = args.cascade
+    scs_instance_hier.superposition = args.superposition
+    if not scs_backend.use(args.backend):
+        parser.error('%s backend is not installed' % args.backend)
+
+    run(input_file_name, output_file_prefix, args.macro, args.check, args.j)
+
+
+def run(input_file_name, output_file_prefix, macro=None, check=False, jobs=1):
+    """ Solves a netlist
+
+        input_file_name: netlist file
+
+        output_file_prefix: prefix of output files (.results, plots, macro models)
+
+        macro: list of subcircuit names to pre-solve into macro models instead of solving the circuit
+
+        check: only parse, instantiate and check the circuit
+
+        jobs: number of processes performing analyses at the same time
+
+        Parses the netlist, instantiates, checks and solves the circuit and performs its analyses. Each error is
+        logged. Returns dictionary with 'status' - 'ok' or description of the failure, and times in seconds of phases
+        which were performed.
+    """
+    summary = {'status': 'ok'}
+
     # Create top circtuit by parsing input file
     time1 = time.clock()
-    top_cir = scs_parser.parse_file(input_file_name, scs_circuit.TopCircuit())
+    with scs_trace.phase('parse', file=input_file_name):
+        top_cir = scs_parser.parse_file(input_file_name, scs_circuit.TopCircuit())
     if not top_cir:
         logging.error("Failed to parse a circuit.")
-        exit()
-    logging.info('Input file parsed in: %f s' % (time.clock() - time1))
+        summary['status'] = 'parse failed'
+        return summary
+    summary['parse'] = time.clock() - time1
+    logging.info('Input file parsed in: %f s' % summary['parse'])
+
+    # Compile macro models instead of solving a circuit
+    if macro:
+        for subcircuit_name in macro:
+            time1 = time.clock()
+            try:
+                macromodel = scs_instance_hier.make_macromodel(top_cir, subcircuit_name)
+            except scs_errors.ScsInstanceError, e:
+                logging.error(e)
+                summary['status'] = 'macro model of %s failed' % subcircuit_name
+                return summary
+            macromodel.save('%s_%s.scm' % (output_file_prefix, subcircuit_name))
+            logging.info('Macro model of %s made in: %f s' % (subcircuit_name, time.clock() - time1))
+        return summary
+
+    top_instance = solve(top_cir, summary, check)
+    if not top_instance or check:
+        return summary
+
+    time1 = time.clock()
+    top_cir.perform_analysis(top_instance, output_file_prefix, jobs)
+    summary['analyses'] = time.clock() - time1
+    return summary
+
+
+def solve(top_cir, summary, check=False):
+    """ Instantiates, checks and solves a parsed circuit
+
+        top_cir: top circuit made by parser
 
+        summary: dictionary to which status and times of phases are written (see run)
+
+        check: only instantiate and check the circuit, without solving it
+
+        Returns top instance, solved unless check is set, or None if any phase failed.
+    """
     # Instantiate circuit
     time1 = time.clock()
-    top_instance = scs_instance_hier.make_top_instance(top_cir)
+    with scs_trace.phase('instantiate'):
+        top_instance = scs_instance_hier.make_top_instance(top_cir)
     if not top_instance:
         logging.error("Failed to instanace a circuit.")
-        exit()
-    logging.info('Instantiated circuit in: %f s' % (time.clock() - time1))
+        summary['status'] = 'instantiation failed'
+        return None
+    summary['instantiate'] = time.clock() - time1
+    logging.info('Instantiated circuit in: %f s' % summary['instantiate'])
 
     # Check if circuit is "well-formed"
-    if not top_instance.check_path_to_gnd(): exit()
-    if not top_instance.check_voltage_loop(): exit()
+    with scs_trace.phase('check'):
+        if not top_instance.check_path_to_gnd() or not top_instance.check_voltage_loop():
+            summary['status'] = 'check failed'
+            return None
+    if check:
+        logging.info('Circuit checked')
+        return top_instance
+
+    if scs_reduction.enabled:
+        scs_reduction.reduce_circuit(top_instance, top_cir)
+    if scs_cascade.enabled:
+        scs_cascade.cascade_circuit(top_instance, top_cir)
 
     time1 = time.clock()
     try:
         top_instance.solve()
-    except:
-        exit()
-    logging.info('Solved circuit in: %f s' % (time.clock() - time1))
-
-    top_cir.perform_analysis(top_instance, output_file_prefix)
+    except BaseException, e:
+        logging.error("Failed to solve a circuit. %s" % e)
+        summary['status'] = 'solve failed'
+        return None
+    summary['solve'] = time.clock() - time1
+    logging.info('Solved circuit in: %f s' % summary['solve'])
+
+    return top_instance
 
 
 if __name__ == "__main__":
@@ -1,14 +1,21 @@
 """
     Module holding functions for performing analysis on solved instances of circuits.
+
+    numpy and matplotlib are imported only when first analysis needing them is performed (see numpy_module and
+    pyplot_module), so parsing, checking and measure only runs don't pay for them.
 """
+import logging
+import os
 import sympy
 import sympy.abc
 import warnings
-import numpy as np
-import matplotlib.pyplot as plt
 
+import scs_backend
 import scs_parser
 import scs_errors
+import scs_governor
+import scs_results
+import scs_trace
 
 __author__ = "Tomasz Kniola"
 __credits__ = ["Tomasz Kniola"]
@@ -19,14 +26,44 @@ __email__ = "kniola.tomasz@gmail.com"
 __status__ = "development"
 
 
-def measure_analysis(param_d, param_l, instance, file_sufix):
+_numpy = None  # numpy module, once imported
+_pyplot = None  # matplotlib.pyplot module, once imported
+
+
+def numpy_module():
+    """ Returns numpy module, importing it on first use
+    """
+    global _numpy
+    if _numpy is None:
+        import numpy
+        _numpy = numpy
+    return _numpy
+
+
+def pyplot_module():
+    """ Returns matplotlib.pyplot module, importing it on first use
+
+        Plots are only saved to files, so non-interactive Agg backend is chosen, unless other one is set in
+        MPLBACKEND environment variable.
+    """
+    global _pyplot
+    if _pyplot is None:
+        import matplotlib
+        if not os.environ.get('MPLBACKEND'):
+            matplotlib.use('Agg')
+        import matplotlib.pyplot
+        _pyplot = matplotlib.pyplot
+    return _pyplot
+
+
+def measure_analysis(param_d, param_l, instance, output):
     """ Performs measure analysis
         
         param_d: substitutions for symbols, should evaluate to numeric values
         
         param_l: expresions to print
 
-        filename: filename for output of print analysis
+        output: AnalysisOutput to which text and values are written
 
         Measure analisis format is:
         .measure measure_name expresion1 [expresion2 ...]  [symbol0 = value0 symbol1 = value1 ...]    
@@ -38,8 +75,11 @@ def measure_analysis(param_d, param_l, instance, file_sufix):
 
         value of a measue will be saved on instance.paramsd dictionary with measute_name which allows it to be used
         in next analysis. This feature can be abused to show parametric plots of ac and dc.
+
+        With cse = yes expresion isn't factored and simplified, but written as its common subexpresions
+        (x0 = ..., x1 = ...) followed by the value using them, which is much shorter for hierarchical circuits.
     """
-    filename = "%s.results" % file_sufix
+    cse = param_d.pop('cse', 'no') == 'yes'
     subst = []
     for symbol, value in param_d.iteritems():
         # tokens = scs_parser.parse_param_expresion(value)
@@ -54,32 +94,216 @@ def measure_analysis(param_d, param_l, instance, file_sufix):
 
     for expresion in param_l[1:]:
         tokens = scs_parser.parse_analysis_expresion(expresion)
-        value = sympy.factor(sympy.sympify(scs_parser.results2values(tokens, instance),sympy.abc._clash), sympy.symbols('s'))
-        # value =  sympy.sympify(scs_parser.results2values(tokens,instance)).simplify()
-        value = value.subs(subst).simplify()
+        with scs_trace.phase('expresion', expresion=expresion) as event:
+            value = scs_parser.sympify(scs_parser.results2values(tokens, instance))
+            scs_trace.measure(event, 'value', value)
+        if cse:
+            value = value.subs(subst)
+        else:
+            with scs_trace.phase('factor', expresion=expresion) as event:
+                value = scs_governor.guarded('factor', _factor_s, scs_governor.keep, value, event)
+                scs_trace.measure(event, 'value', value)
+            # value =  sympy.sympify(scs_parser.results2values(tokens,instance)).simplify()
+            with scs_trace.phase('simplify', expresion=expresion) as event:
+                value = scs_governor.guarded('simplify', sympy.simplify, scs_governor.keep, value.subs(subst), event)
+                scs_trace.measure(event, 'value', value)
         instance.paramsd.update({print_name: value})
-        with open(filename, 'a') as fil:
-            fil.write("%s: %s \n---------------------\n" % (print_name, expresion))
-            fil.write(str(value))
-            fil.write("\n\n")
+        output.results.add('measure', print_name, expresion, expresions={'value': value})
+        output.write("%s: %s \n---------------------\n" % (print_name, expresion))
+        if cse:
+            write_common_subexpresions(output, print_name, value)
+        else:
+            output.write(str(value))
+            output.write("\n\n")
+
+
+def _factor_s(expresion):
+    """ Factors expresion with respect to complex frequency s
+    """
+    return scs_backend.backend.factor(expresion, sympy.symbols('s'))
+
+
+def _poles_zeros(expresion, numeric=False):
+    """ Finds poles and zeros of transfer function
+
+        expresion: transfer function of s
+
+        numeric: find roots numerically, needs all symbols but s to be substituted with numbers
+
+        Returns tuple of lists of poles and zeros, and dictionaries of poles and zeros with their degrees. Numeric
+        search which fails (symbols left) returns no poles and zeros.
+    """
+    s = sympy.symbols('s')
+    np = numpy_module()
+    if numeric:
+        expresion = scs_backend.backend.cancel(expresion)
+    denominator = sympy.denom(expresion)
+    numerator = sympy.numer(expresion)
+    if not numeric:
+        return sympy.solve(denominator, s), sympy.solve(numerator, s), \
+            sympy.roots(denominator, s), sympy.roots(numerator, s)
+    try:
+        poles = [sympy.sympify(root) for root in np.roots(
+            [complex(coefficient) for coefficient in sympy.Poly(denominator, s).all_coeffs()])]
+        zeros = [sympy.sympify(root) for root in np.roots(
+            [complex(coefficient) for coefficient in sympy.Poly(numerator, s).all_coeffs()])]
+    except (sympy.polys.polyerrors.BasePolynomialError, TypeError, ValueError), e:
+        logging.warning("Numeric poles and zeros not found: %s" % e)
+        return [], [], {}, {}
+    poles_r, zeros_r = {}, {}
+    for pole in poles:
+        poles_r[pole] = poles_r.get(pole, 0) + 1
+    for zero in zeros:
+        zeros_r[zero] = zeros_r.get(zero, 0) + 1
+    return sorted(poles_r, key=sympy.default_sort_key), sorted(zeros_r, key=sympy.default_sort_key), poles_r, zeros_r
+
 
+def _numeric_poles_zeros(expresion, subst, event=None):
+    """ Finds poles and zeros of transfer function numerically, after substitution of values, through the governor
 
-class PlotNumber:
-    """ Just to keep track of how many files were saved to a file not to overwrite them
+        expresion: transfer function of s
+
+        subst: list of (symbol, value) pairs substituting all symbols but s
+
+        event: optional trace event dictionary to record taken fallback in
+
+        Cancelling the whole expresion can blow up, so when governor stops it no poles and zeros are found, and
+        analysis only evaluates the unsimplified expresion numerically.
+    """
+    return scs_governor.guarded('numeric poles and zeros', lambda value: _poles_zeros(value, numeric=True),
+                                lambda value: ([], [], {}, {}), expresion.subs(subst), event)
+
+
+def _complex_value(expresion, subst):
+    """ Returns complex value of expresion after substitutions, or nan if some symbols are left
+    """
+    try:
+        return complex(expresion.subs(subst))
+    except TypeError:
+        return complex('nan')
+
+
+def common_subexpresions(expresion):
+    """ Splits expresion into its common subexpresions
+
+        expresion: sympy expresion
+
+        Returns tuple of list of (symbol, subexpresion) pairs, in order in which they have to be evaluated, and
+        expresion written with those symbols. Symbols are named x0, x1, ... skipping names of symbols of expresion.
+    """
+    replacements, reduced = sympy.cse(expresion, sympy.numbered_symbols('x', exclude=expresion.free_symbols))
+    return replacements, reduced[0]
+
+
+def write_common_subexpresions(output, name, expresion):
+    """ Writes expresion to output as its common subexpresions followed by name = reduced expresion
+    """
+    replacements, reduced = common_subexpresions(expresion)
+    for symbol, subexpresion in replacements:
+        output.write("%s = %s\n" % (symbol, subexpresion))
+    output.write("%s = %s \n\n" % (name, reduced))
+
+
+def cse_lambdify(variables, expresion, modules='numpy'):
+    """ Makes numeric function of expresion which evaluates each of its common subexpresions once
+
+        variables: list of symbols (or their names) being arguments of the function
+
+        expresion: sympy expresion
+
+        modules: modules used by sympy.lambdify
+
+        Expresions of hierarchical circuits repeat the same big subexpresions many times, lambdify of the whole tree
+        evaluates each of them every time it occurs, while this function evaluates them once, in order.
+    """
+    replacements, reduced = common_subexpresions(expresion)
+    variables = [sympy.Symbol(variable) if isinstance(variable, basestring) else variable for variable in variables]
+    steps = []
+    for symbol, subexpresion in replacements + [(None, reduced)]:
+        used = sorted(subexpresion.free_symbols, key=sympy.default_sort_key)
+        # Arguments are passed in one list, python functions can't have more than 255 arguments
+        steps.append((symbol, used, sympy.lambdify([used], subexpresion, modules) if used else
+                      sympy.lambdify([], subexpresion, modules)))
+
+    def function(*values):
+        valuesd = dict(zip(variables, values))
+        for symbol, used, step in steps:
+            value = step([valuesd[argument] for argument in used]) if used else step()
+            valuesd[symbol] = value
+        return value
+
+    return function
+
+
+class AnalysisOutput(object):
+    """ Output of analysis: text for .results file, structured results and plots
+
+        Analyses don't write .results file themselves, so they can be performed in any order or in other processes,
+        while output is written in order of analyses in netlist. Plots are numbered from number given by caller, so
+        their names don't depend on order of performing analyses either.
     """
-    plot_num = 0
 
-    def __init__(self):
-        pass
+    def __init__(self, file_prefix, plot_num=0):
+        """ Initialize output
 
+            file_prefix: prefix of files where analyses save their plots (file_prefix_number.png)
 
-def dc_analysis(param_d, param_l, instance, file_sufix):
+            plot_num: number of first plot saved by analysis
+        """
+        self.file_prefix = file_prefix
+        self.plot_num = plot_num
+        self.text = []  # List of written pieces of text
+        self.results = scs_results.ResultsStore()
+
+    def write(self, text):
+        """ Adds text to output for .results file
+        """
+        self.text.append(text)
+
+    def savefig(self, plt):
+        """ Saves current figure of pyplot as next plot
+        """
+        plt.savefig('%s_%d.png' % (self.file_prefix, self.plot_num))
+        self.plot_num += 1
+
+
+def close_plots():
+    """ Closes all figures of pyplot, if it was imported at all, so next analysis starts with clean plot state
+    """
+    if _pyplot is not None:
+        _pyplot.close('all')
+
+
+def plots_count(analysis_type, param_d, param_l):
+    """ Returns number of plots which analysis saves
+
+        analysis_type: type of analysis
+
+        param_d: named parameters of analysis
+
+        param_l: positional parameters of analysis
+
+        .ac saves plot for each of expresions, .dc one for all of them, and none of them if plot is held for next
+        analysis.
+    """
+    if param_d.get('hold', 'no') != 'no':
+        return 0
+    if analysis_type == 'ac':
+        return len(param_l)
+    if analysis_type == 'dc':
+        return 1
+    return 0
+
+
+def dc_analysis(param_d, param_l, instance, output):
     """ Performs dc analysis
 
         param_d: substitutions for symbols, or named parameters for plot
         
         param_l: expresions to plot
 
+        output: AnalysisOutput to which plot and sweeps are written
+
         format is:
         .dc expresion0 [expresion1 expresion2 ...] sweep = parameter_to_sweep [symmbol_or_option0 = value0
         symmbol_or_option1 = value1 ...]
@@ -101,6 +325,7 @@ def dc_analysis(param_d, param_l, instance, file_sufix):
         title:          display title above dc plot [string]
         show_legend:    show legend on plot [yes | no]
         xkcd:           style plot to be xkcd like scetch
+        cse:            don't simplify expresions, evaluate them over their common subexpresions [yes | no]
     """
     config = {'sweep': None,  # Name of the variable to be an x - parameter, must be filled!
               'xstart': 1,
@@ -111,7 +336,8 @@ def dc_analysis(param_d, param_l, instance, file_sufix):
               'hold': 'no',
               'title': None,
               'show_legend': 'no',
-              'xkcd': 'no'}
+              'xkcd': 'no',
+              'cse': 'no'}
 
     for config_name in config.keys():
         if config_name in param_d:
@@ -136,6 +362,8 @@ def dc_analysis(param_d, param_l, instance, file_sufix):
         subst.append((symbol, value))
 
     s = sympy.symbols('s')
+    np = numpy_module()
+    plt = pyplot_module()
 
     if config['xscale'] == 'log':
         xs = np.logspace(np.log10(float(config['xstart'])),
@@ -156,15 +384,28 @@ def dc_analysis(param_d, param_l, instance, file_sufix):
 
     for expresion in param_l:
         tokens = scs_parser.parse_analysis_expresion(expresion)
-        value0 = sympy.sympify(scs_parser.results2values(tokens, instance),sympy.abc._clash).subs(s, 0).simplify()
+        with scs_trace.phase('expresion', expresion=expresion) as event:
+            value0 = scs_parser.sympify(scs_parser.results2values(tokens, instance)).subs(s, 0)
+            scs_trace.measure(event, 'value', value0)
+        if config['cse'] != 'yes':
+            with scs_trace.phase('simplify', expresion=expresion) as event:
+                value0 = scs_governor.guarded('simplify', sympy.simplify, scs_governor.keep, value0, event)
+                scs_trace.measure(event, 'value', value0)
         value = value0.subs(subst)
-        yf = sympy.lambdify(xsym, value)
+        if value.free_symbols - {xsym}:
+            # Symbols which cancel out are still there if simplify was skipped
+            value = scs_backend.backend.cancel(value)
+        yf = cse_lambdify([xsym], value) if config['cse'] == 'yes' else sympy.lambdify(xsym, value)
         try:
-            ys = [float(yf(x)) for x in xs]
+            with scs_trace.phase('evaluation', expresion=expresion, points=len(xs)):
+                ys = [float(yf(x)) for x in xs]
         except (ValueError, TypeError):
             raise scs_errors.ScsAnalysisError(
                 "Numeric error while evaluating expresions: %s. Not all values where subsituted?" % value)
 
+        output.results.add('dc', param_l[0], expresion, arrays={'x': xs, 'y': ys}, expresions={'value': value0},
+                           info={'sweep': config['sweep'], 'xscale': config['xscale'], 'yscale': config['yscale']})
+
         plt.plot(xs, ys, label=expresion)
         try:
             plt.xscale(config['xscale'])
@@ -177,18 +418,19 @@ def dc_analysis(param_d, param_l, instance, file_sufix):
     if config['show_legend'] == 'yes':
         plt.legend()
     if config['hold'] == 'no':
-        plt.savefig('%s_%d.png' % (file_sufix, PlotNumber.plot_num))
-        PlotNumber.plot_num += 1
+        output.savefig(plt)
         plt.hold(False)
 
 
-def ac_analysis(param_d, param_l, instance, file_sufix):
+def ac_analysis(param_d, param_l, instance, output):
     """ Performs ac analysis
 
         param_d: substitutions for symbols, or named parameters for plot
         
         param_l: expresions to plot
 
+        output: AnalysisOutput to which text, plots, sweeps, poles and zeros are written
+
         format is:
         .ac expresion0 [expresion1 expresion2 ...] sweep = parameter_to_sweep [symmbol_or_option0 = value0
         symmbol_or_option1 = value1 ...]
@@ -211,9 +453,13 @@ def ac_analysis(param_d, param_l, instance, file_sufix):
         title:          display title above ac plot [string]
         show_legend:    show legend on plot [yes | no]
         xkcd:           style plot to be xkcd like scetch
+        cse:            don't factor and simplify expresions, write them as common subexpresions, evaluate them over
+                        those and find poles and zeros numerically [yes | no]
     """
     warnings.filterwarnings('ignore')  # Just getting rid of those fake casting from complex warnings
     s, w = sympy.symbols(('s', 'w'))
+    np = numpy_module()
+    plt = pyplot_module()
     config = {'fstart': 1,
               'fstop': 1e6,
               'fscale': 'log',
@@ -225,12 +471,14 @@ def ac_analysis(param_d, param_l, instance, file_sufix):
               'show_zeros': 'yes',
               'title': None,
               'show_legend': 'no',
-              'xkcd': 'no'}
+              'xkcd': 'no',
+              'cse': 'no'}
 
     for config_name in config.keys():
         if config_name in param_d:
             config.update({config_name: param_d[config_name]})
             param_d.pop(config_name)
+    cse = config['cse'] == 'yes'
 
     subst = []
     for symbol, value in param_d.iteritems():
@@ -252,130 +500,155 @@ def ac_analysis(param_d, param_l, instance, file_sufix):
     if config['yscale'] != 'log' and config['yscale'] != 'linear':
         raise scs_errors.ScsAnalysisError(("Option %s for yscale invalid!" % config['fscale']))
 
-    filename = "%s.results" % file_sufix
-
-    with open(filename, 'a') as fil:
-        if config['xkcd'] == 'yes':
-            plt.xkcd()
-        plt.hold(True)
-
-        for expresion in param_l:
-            fil.write("%s: %s \n---------------------\n" % ('AC analysis of', expresion))
-            tokens = scs_parser.parse_analysis_expresion(expresion)
-            value0 = sympy.factor(sympy.sympify(scs_parser.results2values(tokens, instance),sympy.abc._clash), s).simplify()
-            fil.write("%s = %s \n\n" % (expresion, str(value0)))
-            denominator = sympy.denom(value0)
-            numerator = sympy.numer(value0)
-            poles = sympy.solve(denominator, s)
-            zeros = sympy.solve(numerator, s)
-            poles_r = sympy.roots(denominator, s)
-            zeros_r = sympy.roots(numerator, s)
-            gdc = str(value0.subs(s, 0).simplify())
-            fil.write('G_DC = %s\n\n' % gdc)
-
-            p = 0
-            titled = 1
-            for pole, degree in poles_r.iteritems():
-                if pole == 0:
-                    titled *= s ** degree
-                else:
-                    titled *= (s / sympy.symbols("\\omega_p%d" % p) + 1)
-                p += 1
-            z = 0
-            titlen = 1
-            for zero, degree in zeros_r.iteritems():
-                if zero == 0:
-                    titlen *= s ** degree
-                else:
-                    titlen *= (s / sympy.symbols("\\omega_z%d" % z) + 1)
-                z += 1
-            # title = sympy.symbols("G_DC") * (titlen / titled)
-            value = value0.subs(subst)
-            f = sympy.symbols('f', real=True)
-            value = value.subs(s, sympy.sympify('2*pi*I').evalf() * f)
+    if config['xkcd'] == 'yes':
+        plt.xkcd()
+    plt.hold(True)
+
+    for expresion in param_l:
+        output.write("%s: %s \n---------------------\n" % ('AC analysis of', expresion))
+        tokens = scs_parser.parse_analysis_expresion(expresion)
+        with scs_trace.phase('expresion', expresion=expresion) as event:
+            value0 = scs_parser.sympify(scs_parser.results2values(tokens, instance))
+            scs_trace.measure(event, 'value', value0)
+        if cse:
+            write_common_subexpresions(output, expresion, value0)
+            with scs_trace.phase('poles_zeros', expresion=expresion) as event:
+                poles, zeros, poles_r, zeros_r = _numeric_poles_zeros(value0, subst, event)
+                event.update({'poles': len(poles), 'zeros': len(zeros)})
+            write_common_subexpresions(output, 'G_DC', value0.subs(s, 0))
+        else:
+            with scs_trace.phase('factor', expresion=expresion) as event:
+                value0 = scs_governor.guarded('factor', _factor_s, scs_governor.keep, value0, event)
+                scs_trace.measure(event, 'value', value0)
+            with scs_trace.phase('simplify', expresion=expresion) as event:
+                value0 = scs_governor.guarded('simplify', sympy.simplify, scs_governor.keep, value0, event)
+                scs_trace.measure(event, 'value', value0)
+            output.write("%s = %s \n\n" % (expresion, str(value0)))
+            with scs_trace.phase('poles_zeros', expresion=expresion) as event:
+                poles, zeros, poles_r, zeros_r = scs_governor.guarded(
+                    'poles and zeros', _poles_zeros, lambda value: _numeric_poles_zeros(value, subst, event),
+                    value0, event)
+                event.update({'poles': len(poles), 'zeros': len(zeros)})
+            gdc = str(scs_governor.guarded('simplify', sympy.simplify, scs_governor.keep, value0.subs(s, 0)))
+            output.write('G_DC = %s\n\n' % gdc)
+
+        p = 0
+        titled = 1
+        for pole, degree in poles_r.iteritems():
+            if pole == 0:
+                titled *= s ** degree
+            else:
+                titled *= (s / sympy.symbols("\\omega_p%d" % p) + 1)
+            p += 1
+        z = 0
+        titlen = 1
+        for zero, degree in zeros_r.iteritems():
+            if zero == 0:
+                titlen *= s ** degree
+            else:
+                titlen *= (s / sympy.symbols("\\omega_z%d" % z) + 1)
+            z += 1
+        # title = sympy.symbols("G_DC") * (titlen / titled)
+        value = value0.subs(subst)
+        if value.free_symbols - {s}:
+            # Symbols which cancel out are still there if simplify was skipped
+            value = scs_backend.backend.cancel(value)
+        f = sympy.symbols('f', real=True)
+        value = value.subs(s, sympy.sympify('2*pi*I').evalf() * f)
+        if cse:
+            cf = cse_lambdify([f], value)
+            tf = lambda f: np.abs(cf(f))
+            phf = lambda f: np.angle(cf(f))
+        else:
             tf = sympy.lambdify(f, abs(sympy.numer(value)) / abs(sympy.denom(value)))
             phf = sympy.lambdify(f, sympy.arg(value))
 
-            if config['type'] == 'amp':
-                zf = tf
-                ylabel = '|T(f)|'
-            elif config['type'] == 'phase':
-                zf = phf
-                ylabel = 'ph(T(f))'
-            else:
-                raise scs_errors.ScsAnalysisError("Option %s for type invalid!" % config['type'])
+        if config['type'] == 'amp':
+            zf = tf
+            ylabel = '|T(f)|'
+        elif config['type'] == 'phase':
+            zf = phf
+            ylabel = 'ph(T(f))'
+        else:
+            raise scs_errors.ScsAnalysisError("Option %s for type invalid!" % config['type'])
 
-            try:
+        try:
+            with scs_trace.phase('evaluation', expresion=expresion, points=len(fs)):
                 ys = [float(zf(f)) for f in fs]
-            except (ValueError, TypeError):
-                raise scs_errors.ScsAnalysisError(
-                    "Numeric error while evaluating expresions: %s. Not all values where subsituted?" % value0)
+        except (ValueError, TypeError):
+            raise scs_errors.ScsAnalysisError(
+                "Numeric error while evaluating expresions: %s. Not all values where subsituted?" % value0)
+
+        plt.plot(fs, ys, label=expresion)
 
-            plt.plot(fs, ys, label=expresion)
+        plt.title(r'$%s$' % config['title'] if config['title'] else ' ', y=1.05)
+        try:
+            plt.xscale(config['fscale'])
+            plt.yscale(config['yscale'])
+        except ValueError, e:
+            raise scs_errors.ScsAnalysisError(e)
+
+        plt.xlabel('f [Hz]')
+        plt.ylabel(ylabel)
+
+        if len(poles):
+            output.write('Poles: \n')
+
+        p = 0
+        for pole in poles:
 
-            plt.title(r'$%s$' % config['title'] if config['title'] else ' ', y=1.05)
             try:
-                plt.xscale(config['fscale'])
-                plt.yscale(config['yscale'])
-            except ValueError, e:
-                raise scs_errors.ScsAnalysisError(e)
-
-            plt.xlabel('f [Hz]')
-            plt.ylabel(ylabel)
-
-            if len(poles):
-                fil.write('Poles: \n')
-
-            p = 0
-            for pole in poles:
-
-                try:
-                    pole_value = pole.subs(subst)
-                    pole_value_f = abs(np.float64(-abs(pole_value) / sympy.sympify('2*pi').evalf()))
-                    pole_s = (-pole).simplify()
-                    polestr = str(pole_s)
-                    fil.write('wp_%d = %s\n\n' % (p, polestr))
-
-                    p += 1
-                    if pole_value_f > float(config['fstop']) \
-                            or pole_value_f < float(config['fstart']) \
-                            or np.isnan(zf(pole_value_f)):
-                        continue
-                    if config['show_poles'] == 'yes':
-                        pole_label = r'$\omega_{p%d} $' % (p - 1)
-                        plt.plot(pole_value_f, zf(pole_value_f), 'o', label=pole_label)
-                        plt.text(pole_value_f, zf(pole_value_f), pole_label)
-                        plt.axvline(pole_value_f, linestyle='dashed')
-                except:
-                    pass
-
-            z = 0
-            for zero in zeros:
-                try:
-                    zero_value = zero.subs(subst)
-                    zero_value_f = abs(np.float64(-abs(zero_value) / sympy.sympify('2*pi').evalf()))
-                    zero_s = (-zero).simplify()
-                    zerostr = str(zero_s)
-                    fil.write('wz_%d = %s\n\n' % (z, zerostr))
-                    z += 1
-                    if zero_value_f > float(config['fstop']) \
-                            or zero_value_f < float(config['fstart']) \
-                            or np.isnan(zf(zero_value_f)):
-                        continue
-                    if config['show_zeros'] == 'yes':
-                        zero_label = r'$\omega_{z%d} $' % (z - 1)
-                        plt.plot(zero_value_f, zf(zero_value_f), '*', label=zero_label)
-                        plt.axvline(zero_value_f, linestyle='dashed')
-                        plt.text(zero_value_f, zf(zero_value_f), zero_label)
-                except:
-                    pass
-            if config['show_legend'] == 'yes':
-                plt.legend()
-            if config['hold'] == 'no':
-                plt.hold(False)
-                plt.savefig('%s_%d.png' % (file_sufix, PlotNumber.plot_num))
-                plt.clf()
-                PlotNumber.plot_num += 1
+                pole_value = pole.subs(subst)
+                pole_value_f = abs(np.float64(-abs(pole_value) / sympy.sympify('2*pi').evalf()))
+                pole_s = scs_governor.guarded('simplify', sympy.simplify, scs_governor.keep, -pole)
+                polestr = str(pole_s)
+                output.write('wp_%d = %s\n\n' % (p, polestr))
+
+                p += 1
+                if pole_value_f > float(config['fstop']) \
+                        or pole_value_f < float(config['fstart']) \
+                        or np.isnan(zf(pole_value_f)):
+                    continue
+                if config['show_poles'] == 'yes':
+                    pole_label = r'$\omega_{p%d} $' % (p - 1)
+                    plt.plot(pole_value_f, zf(pole_value_f), 'o', label=pole_label)
+                    plt.text(pole_value_f, zf(pole_value_f), pole_label)
+                    plt.axvline(pole_value_f, linestyle='dashed')
+            except:
+                pass
+
+        z = 0
+        for zero in zeros:
+            try:
+                zero_value = zero.subs(subst)
+                zero_value_f = abs(np.float64(-abs(zero_value) / sympy.sympify('2*pi').evalf()))
+                zero_s = scs_governor.guarded('simplify', sympy.simplify, scs_governor.keep, -zero)
+                zerostr = str(zero_s)
+                output.write('wz_%d = %s\n\n' % (z, zerostr))
+                z += 1
+                if zero_value_f > float(config['fstop']) \
+                        or zero_value_f < float(config['fstart']) \
+                        or np.isnan(zf(zero_value_f)):
+                    continue
+                if config['show_zeros'] == 'yes':
+                    zero_label = r'$\omega_{z%d} $' % (z - 1)
+                    plt.plot(zero_value_f, zf(zero_value_f), '*', label=zero_label)
+                    plt.axvline(zero_value_f, linestyle='dashed')
+                    plt.text(zero_value_f, zf(zero_value_f), zero_label)
+            except:
+                pass
+        output.results.add('ac', param_l[0], expresion,
+                           arrays={'f': fs, 'y': ys,
+                                   'pole_values': [_complex_value(pole, subst) for pole in poles],
+                                   'zero_values': [_complex_value(zero, subst) for zero in zeros]},
+                           expresions={'value': value0, 'poles': list(poles), 'zeros': list(zeros)},
+                           info={'type': config['type'], 'fscale': config['fscale'], 'yscale': config['yscale']})
+        if config['show_legend'] == 'yes':
+            plt.legend()
+        if config['hold'] == 'no':
+            plt.hold(False)
+            output.savefig(plt)
+            plt.clf()
 # Dictionary of analysis name with appropriate functions
 analysis_dict = {'measure': measure_analysis,
                  'ac': ac_analysis,
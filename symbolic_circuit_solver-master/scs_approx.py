@@ -0,0 +1,214 @@
+"""
+Approximate symbolic analysis
+
+Exact solutions of real circuits are huge, while most of their terms are numerically negligible. With .approx control
+sentence in netlist:
+
+.approx tol=0.01 fstart=1 fstop=1e9 gm=1m gds=10u RL=10k cgs=100f Vin=1
+
+circuit is solved approximately. Named parameters other than options (tol, fstart, fstop, npoints) are nominal values
+of symbols. Each instance prunes its equations before solving them (conductance matrix and current vector) and its
+solution after (numerators of V0 and Ap and their determinant): expresion is brought to numerator/denominator form, and in coefficient of each power of s
+the smallest terms, evaluated at nominal values, are dropped as long as their sum is below tolerance of the sum of
+all terms. Pruned solution is then checked against numeric solution of exact equations at npoints frequencies between
+fstart and fstop. If relative error is above tolerance pruning is repeated with ten times smaller tolerance, and after
+few tries instance is solved exactly. Instances with symbols without nominal values are solved exactly too.
+"""
+import logging
+
+import sympy
+
+import scs_errors
+import scs_governor
+import scs_parser
+import scs_trace
+
+__author__ = "Tomasz Kniola"
+__credits__ = ["Tomasz Kniola"]
+
+__license__ = "LGPL"
+__version__ = "0.0.1"
+__email__ = "kniola.tomasz@gmail.com"
+__status__ = "development"
+
+_tries = 3  # Number of tries of pruning, each with ten times smaller tolerance, before solving exactly
+_floor = 1e-6  # Values below this fraction of peak value of entry over frequency are compared as if they were that big
+
+
+class Approximation(object):
+    """ Settings of approximate solving, shared by all instances of a circuit
+    """
+
+    def __init__(self, tolerance, nominal, fstart=1, fstop=1e6, npoints=20):
+        """ Initialize Approximation
+
+            tolerance: maximal relative error of solution
+
+            nominal: dictionary of symbol names with their nominal numeric values
+
+            fstart, fstop: frequency range over which error is checked
+
+            npoints: number of frequencies (log scale) at which error is checked
+        """
+        self.tolerance = tolerance
+        self.nominal = dict((sympy.Symbol(name), sympy.Float(value)) for name, value in nominal.iteritems())
+        self.fstart = fstart
+        self.fstop = fstop
+        self.npoints = npoints
+        self.pruned = 0  # Number of terms pruned in last call of prune
+
+    def key(self):
+        """ Returns hashable description of the settings, solutions cache keeps approximate solutions under it
+        """
+        return (self.tolerance, tuple(sorted(self.nominal.iteritems())), self.fstart, self.fstop, self.npoints)
+
+    def missing(self, *matrices):
+        """ Returns set of symbols of matrices without nominal values (s is frequency)
+        """
+        symbols = set()
+        for matrix in matrices:
+            symbols |= matrix.free_symbols
+        return symbols - set(self.nominal) - set([sympy.Symbol('s')])
+
+    def prune(self, expresion, epsilon):
+        """ Drops insignificant terms of expresion
+
+            expresion: sympy expresion, rational function of s and symbols with nominal values
+
+            epsilon: relative tolerance of each coefficient of numerator and denominator
+
+            Returns pruned expresion, number of dropped terms is added to self.pruned.
+        """
+        if expresion.is_number:
+            return expresion
+        numerator, denominator = sympy.fraction(sympy.together(expresion))
+        return self._prune_polynomial(numerator, epsilon) / self._prune_polynomial(denominator, epsilon)
+
+    def _prune_polynomial(self, polynomial, epsilon):
+        """ Drops insignificant terms of coefficients of each power of s of polynomial
+        """
+        s = sympy.Symbol('s')
+        pruned = []
+        for power, coefficient in sympy.collect(sympy.expand(polynomial), s, evaluate=False).iteritems():
+            terms = sympy.Add.make_args(coefficient)
+            magnitudes = [abs(complex(term.xreplace(self.nominal))) for term in terms]
+            limit = epsilon * sum(magnitudes)
+            dropped = 0
+            for magnitude, term in sorted(zip(magnitudes, terms), key=lambda pair: pair[0]):
+                if dropped + magnitude <= limit:
+                    dropped += magnitude
+                    self.pruned += 1
+                else:
+                    pruned.append(power * term)
+        return sympy.Add(*pruned)
+
+    def _prune_matrix(self, matrix, epsilon, event):
+        """ Returns matrix with each entry pruned, entries too big for governor are kept as they are
+        """
+        return matrix.applyfunc(lambda expresion: scs_governor.guarded('prune', lambda expr: self.prune(expr, epsilon),
+                                                                       scs_governor.keep, expresion, event))
+
+    def _numeric(self, matrix):
+        """ Returns list of numeric values of matrix (numpy arrays) at frequencies of the check
+        """
+        import scs_analysis  # Imported here, analyses import solver modules
+        np = scs_analysis.numpy_module()
+        s = sympy.Symbol('s')
+        function = sympy.lambdify(s, matrix.xreplace(self.nominal), 'numpy')
+        frequencies = np.logspace(np.log10(self.fstart), np.log10(self.fstop), self.npoints)
+        return [np.array(function(2j * np.pi * f), dtype=complex).reshape(matrix.shape) for f in frequencies]
+
+    def _reference(self, G_i, G_p, I_v):
+        """ Returns list of numeric exact solutions [V0 | Ap] at frequencies of the check, None where G_i is singular
+        """
+        import scs_analysis
+        np = scs_analysis.numpy_module()
+        Ni, Np = G_i.shape[1], G_p.shape[1]
+        reference = []
+        for G in self._numeric(G_i.row_join(G_p).row_join(I_v)):
+            try:
+                reference.append(np.linalg.solve(G[:, :Ni], np.hstack((G[:, Ni + Np:], -G[:, Ni:Ni + Np]))))
+            except np.linalg.LinAlgError:
+                reference.append(None)
+        return reference
+
+    def _error(self, solution, reference):
+        """ Returns maximal relative error of solution [V0 | Ap] against reference
+        """
+        import scs_analysis
+        np = scs_analysis.numpy_module()
+        points = [(value, exact) for value, exact in zip(self._numeric(solution), reference) if exact is not None]
+        if not points:
+            return 0.0
+        peak = np.max([np.abs(exact) for value, exact in points], axis=0)
+        floor = np.where(peak > 0, _floor * peak, 1.0)
+        return max(np.max(np.abs(value - exact) / np.maximum(np.abs(exact), floor)) for value, exact in points)
+
+    def solve(self, G_i, G_p, I_v, solution, name, event):
+        """ Solves equations G_i*V_i + G_p*V_p = I_v approximately
+
+            G_i, G_p, I_v: exact equations of an instance
+
+            solution: function solving equations exactly, taking G_i, G_p, I_v and returning numerators of V0 and Ap
+                      matrices and their determinant
+
+            name: name of instance for log
+
+            event: trace event of solving the instance
+
+            Returns (V0, Ap, determinant) like solution, pruned if error of such solution is within tolerance, else
+            exact.
+        """
+        if not G_i.rows:
+            return solution(G_i, G_p, I_v)
+        missing = self.missing(G_i, G_p, I_v)
+        if missing:
+            logging.warning("Solving %s exactly, no nominal values for: %s" %
+                            (name, ', '.join(sorted(str(symbol) for symbol in missing))))
+            return solution(G_i, G_p, I_v)
+        reference = self._reference(G_i, G_p, I_v)
+        epsilon = self.tolerance
+        for tries in range(_tries):
+            with scs_trace.phase('pruning', instance=name, epsilon=epsilon) as pruning_event:
+                self.pruned = 0
+                V0_m, Ap_m, determinant = solution(self._prune_matrix(G_i, epsilon, pruning_event),
+                                                   self._prune_matrix(G_p, epsilon, pruning_event),
+                                                   self._prune_matrix(I_v, epsilon, pruning_event))
+                V0_m = self._prune_matrix(V0_m, epsilon, pruning_event)
+                Ap_m = self._prune_matrix(Ap_m, epsilon, pruning_event)
+                determinant = self._prune_matrix(sympy.Matrix([determinant]), epsilon, pruning_event)[0]
+                error = self._error(V0_m.row_join(Ap_m) / determinant, reference)
+                pruning_event.update({'pruned': self.pruned, 'error': error})
+            if error <= self.tolerance:
+                logging.info("Solved %s approximately, %d terms pruned, relative error %g" % (name, self.pruned, error))
+                event.update({'pruned': self.pruned, 'error': error})
+                return V0_m, Ap_m, determinant
+            epsilon /= 10
+        logging.warning("Solving %s exactly, error of approximation %g is above tolerance %g" %
+                        (name, error, self.tolerance))
+        return solution(G_i, G_p, I_v)
+
+
+def make_approximation(approxd):
+    """ Makes approximation settings from parameters of .approx control sentence
+
+        approxd: dictionary of names with values expresions, options (tol, fstart, fstop, npoints) and nominal values
+
+        Returns Approximation, or None if approxd is None. If any value isn't a number raise an error.
+    """
+    if approxd is None:
+        return None
+    options = {'tol': 0.01, 'fstart': 1, 'fstop': 1e6, 'npoints': 20}
+    nominal = {}
+    for name, expresion in approxd.iteritems():
+        value = scs_parser.evaluate_expresion(expresion, {})
+        if not value.is_number:
+            raise scs_errors.ScsParameterError("Value of %s in .approx isn't a number: %s" % (name, expresion))
+        if name in options:
+            options[name] = float(value)
+        else:
+            nominal[name] = float(value)
+    if options['tol'] <= 0 or options['fstart'] <= 0 or options['fstop'] < options['fstart']:
+        raise scs_errors.ScsParameterError("Wrong options of .approx: tol and fstart have to be positive and fstart "
+                                           "not above fstop")
+    return Approximation(options['tol'], nominal, options['fstart'], options['fstop'], int(options['npoints']))
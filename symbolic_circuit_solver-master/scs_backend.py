@@ -0,0 +1,215 @@
+"""
+Symbolic backends
+
+Nearly all time of solving goes into few symbolic operations: cancelling entries of equations, determinant and adjugate
+of conductance matrix, and factoring results in analyses. They go through backend chosen with --backend option, the
+rest of the solver (parsing, elements, instance tree, writing results) keeps working on sympy expresions, which
+backends take and return.
+
+- sympy - default, sympy itself,
+- symengine - determinants and adjugates are computed by symengine (C++ library, if its python wrapper is installed),
+  on expresions converted from sympy and back; cancel and factor, which symengine doesn't have, stay in sympy,
+- field - entries of equations are converted to elements of fraction field of polynomials in circuit symbols and s
+  (e.g. ZZ(s,C,R) or QQ(...), RR(...) when there are floats), which are always kept cancelled in sparse polynomial
+  form, matrix is inverted by fraction free elimination in polynomial ring, and only results are converted back to
+  expresions. Entries which don't make a fraction field (functions like sqrt or exp of symbols) are left to sympy.
+
+Other engines are added by subclassing Backend, overriding its operations, and registering it in backends dictionary.
+"""
+import sympy
+from sympy.polys.constructor import construct_domain
+
+__author__ = "Tomasz Kniola"
+__credits__ = ["Tomasz Kniola"]
+
+__license__ = "LGPL"
+__version__ = "0.0.1"
+__email__ = "kniola.tomasz@gmail.com"
+__status__ = "development"
+
+
+class Backend(object):
+    """ Sympy backend, base class of other backends
+    """
+    name = 'sympy'
+    cancelled = False  # Results of det_adjugate are cancelled already
+
+    def available(self):
+        """ Returns True if modules needed by backend can be imported
+        """
+        return True
+
+    def cancel(self, expresion):
+        """ Returns expresion as cancelled ratio of polynomials
+        """
+        return sympy.cancel(expresion)
+
+    def factor(self, expresion, *symbols):
+        """ Returns expresion factored with respect to symbols
+        """
+        return sympy.factor(expresion, *symbols)
+
+    def det(self, matrix):
+        """ Returns determinant of square sympy matrix
+        """
+        return matrix.det(method='berkowitz')
+
+    def adjugate(self, matrix):
+        """ Returns adjugate of square sympy matrix, matrix of size 0 is its own adjugate
+        """
+        return matrix.adjugate(method='berkowitz') if matrix.rows else matrix
+
+    def det_adjugate(self, matrix):
+        """ Returns tuple of determinant and adjugate of square sympy matrix
+        """
+        return self.det(matrix), self.adjugate(matrix)
+
+
+class SymengineBackend(Backend):
+    """ Backend computing determinants and adjugates with symengine
+    """
+    name = 'symengine'
+
+    def __init__(self):
+        """ Initialize SymengineBackend, symengine is imported on first use
+        """
+        self._symengine = None
+
+    def available(self):
+        """ Returns True if symengine is installed
+        """
+        try:
+            self._module()
+        except ImportError:
+            return False
+        return True
+
+    def _module(self):
+        """ Returns symengine module, importing it on first use
+        """
+        if self._symengine is None:
+            import symengine
+            self._symengine = symengine
+        return self._symengine
+
+    def _matrix(self, rows):
+        """ Returns symengine matrix of list of rows of sympy expresions
+        """
+        symengine = self._module()
+        return symengine.DenseMatrix(len(rows), len(rows[0]) if rows else 0,
+                                     [symengine.sympify(entry) for row in rows for entry in row])
+
+    def det(self, matrix):
+        """ Returns determinant of square sympy matrix, computed by symengine
+        """
+        if not matrix.rows:
+            return sympy.S.One
+        return sympy.sympify(self._matrix(matrix.tolist()).det())
+
+    def adjugate(self, matrix):
+        """ Returns adjugate of square sympy matrix from determinants of its minors, computed by symengine
+        """
+        if matrix.rows < 2:
+            return sympy.ones(matrix.rows, matrix.rows)
+        rows = matrix.tolist()
+        adjugate = sympy.zeros(matrix.rows, matrix.rows)
+        for i in range(matrix.rows):
+            for j in range(matrix.rows):
+                minor = [row[:j] + row[j + 1:] for k, row in enumerate(rows) if k != i]
+                cofactor = sympy.sympify(self._matrix(minor).det())
+                adjugate[j, i] = -cofactor if (i + j) % 2 else cofactor
+        return adjugate
+
+
+class FieldBackend(Backend):
+    """ Backend computing in fraction field of polynomials
+    """
+    name = 'field'
+    cancelled = True
+
+    def _field(self, expresions):
+        """ Returns tuple of fraction field and list of its elements made of expresions, or (None, None) if expresions
+            don't make a fraction field
+        """
+        domain, elements = construct_domain(expresions, field=True)
+        if not domain.is_FractionField:
+            return None, None
+        return domain, elements
+
+    def cancel(self, expresion):
+        """ Returns expresion as cancelled ratio of polynomials, made by the field
+        """
+        expresion = sympy.sympify(expresion)
+        if expresion.is_number:
+            return Backend.cancel(self, expresion)
+        domain, elements = self._field([expresion])
+        if domain is None:
+            return Backend.cancel(self, expresion)
+        return domain.to_sympy(elements[0])
+
+    def det_adjugate(self, matrix):
+        """ Returns tuple of determinant and adjugate of square sympy matrix
+
+            Each row is multiplied by least common multiple of denominators of its entries, so matrix is made of
+            polynomials, and fraction free (Bareiss) Gauss-Jordan elimination of [matrix | 1] runs in polynomial ring,
+            where each division is exact and no gcd is needed. It ends with [d*1 | d*inverse], d being the determinant
+            of scaled matrix. Both determinant and adjugate are returned multiplied by product of row multiples, so
+            their ratio is the inverse. Adjugate of singular matrix isn't computed, it's None.
+        """
+        n = matrix.rows
+        domain, elements = self._field(list(matrix)) if n else (None, None)
+        if domain is None:
+            return Backend.det_adjugate(self, matrix)
+        ring = domain.field.ring
+        rows, multiples = [], []
+        for i in range(n):
+            row = elements[i * n:(i + 1) * n]
+            multiple = reduce(lambda a, b: a.lcm(b), [entry.denom for entry in row])
+            rows.append([entry.numer * (multiple // entry.denom) for entry in row] +
+                        [ring.one if j == i else ring.zero for j in range(n)])
+            multiples.append(multiple)
+        sign = 1
+        previous = ring.one
+        for col in range(n):
+            candidates = [candidate for candidate in range(col, n) if rows[candidate][col]]
+            if not candidates:
+                return sympy.S.Zero, None
+            # Pivot with the fewest terms keeps the growth of entries low
+            pivot = min(candidates, key=lambda candidate: len(rows[candidate][col]))
+            if pivot != col:
+                rows[col], rows[pivot] = rows[pivot], rows[col]
+                sign = -sign
+            pivot_row = rows[col]
+            for row in range(n):
+                if row != col:
+                    factor = rows[row][col]
+                    if factor:
+                        rows[row] = [(pivot_row[col] * entry - factor * pivot_entry) // previous
+                                     for entry, pivot_entry in zip(rows[row], pivot_row)]
+                    else:
+                        rows[row] = [(pivot_row[col] * entry) // previous if entry else entry for entry in rows[row]]
+            previous = pivot_row[col]
+        adjugate = sympy.Matrix(n, n, lambda i, j: (rows[i][n + j] * multiples[j] * sign).as_expr())
+        return (previous * sign).as_expr(), adjugate
+
+
+# Dictionary of names of backends with their objects
+backends = {'sympy': Backend(),
+            'symengine': SymengineBackend(),
+            'field': FieldBackend()}
+
+backend = backends['sympy']  # Backend in use
+
+
+def use(name):
+    """ Chooses backend by its name
+
+        name: key of backends dictionary
+
+        Returns False, leaving backend as it was, if modules needed by chosen backend aren't installed.
+    """
+    global backend
+    if not backends[name].available():
+        return False
+    backend = backends[name]
+    return True
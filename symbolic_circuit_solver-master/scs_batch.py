@@ -0,0 +1,185 @@
+#!/depot/Python-2.7.2/bin/python -E
+
+""" Batch script.
+
+    Solves many netlists in a pool of long living worker processes. Each worker imports sympy, numpy and matplotlib
+    once, and keeps parsed included files (libraries) and solutions of subinstances between netlists it solves, so
+    the same library is parsed once per worker and the same subcircuit with the same parameters is solved once per
+    worker. Each netlist is solved like by scs.py: outputs are written next to it (netlist.log, netlist.results, plots).
+    Summary with status and timings of phases of each netlist is saved as JSON file, and failures are printed.
+
+    Netlists are given as file names or glob patterns, and/or in manifest file - one file name or pattern in line,
+    lines starting with # are comments.
+
+    Example:
+    scs_batch.py -j 8 -o summary.json 'regression/*.sp' --manifest more_netlists.txt
+"""
+import argparse
+import glob
+import json
+import logging
+import multiprocessing
+import os
+import sys
+import time
+
+import scs
+import scs_analysis
+import scs_backend
+import scs_cascade
+import scs_governor
+import scs_instance_hier
+import scs_parser
+import scs_reduction
+
+__author__ = "Tomasz Kniola"
+__credits__ = ["Tomasz Kniola"]
+
+__license__ = "LGPL"
+__version__ = "0.0.1"
+__email__ = "kniola.tomasz@gmail.com"
+__status__ = "development"
+
+__description__ = """
+    Symbolic circuit solver batch mode - solves many netlists in pool of worker processes
+
+"""
+
+
+def _init_worker(max_ops, stage_timeout, solver, exact, backend, reduce_instances, superposition, cascade):
+    """ Prepares worker process: turns on caches, sets limits of governor, solver engine, exact mode, symbolic
+        backend, reduction of instances, superposition mode and cascades, and imports plotting modules
+    """
+    scs_parser.include_cache = {}
+    scs_instance_hier.solution_cache = {}
+    scs_instance_hier.solver = solver
+    scs_parser.exact = exact
+    scs_backend.use(backend)
+    scs_reduction.enabled = reduce_instances
+    scs_instance_hier.superposition = superposition
+    scs_cascade.enabled = cascade
+    scs_governor.configure(max_ops, stage_timeout)
+    scs_analysis.numpy_module()
+    scs_analysis.pyplot_module()
+
+
+def solve_netlist(input_file_name):
+    """ Solves a netlist with its own log file
+
+        input_file_name: netlist file, outputs are written with prefix of its name
+
+        Returns summary dictionary of scs.run with name of the netlist, total time and fallbacks taken by the governor,
+        if any, added.
+    """
+    output_file_prefix = os.path.splitext(input_file_name)[0]
+    logging_file_name = '%s.log' % output_file_prefix
+    try:
+        os.remove(logging_file_name)
+    except OSError:
+        pass
+    handler = logging.FileHandler(logging_file_name)
+    handler.setFormatter(logging.Formatter('%(levelname)s: %(message)s'))
+    logger = logging.getLogger()
+    logger.addHandler(handler)
+    time1 = time.time()
+    scs_governor.reset()
+    try:
+        summary = scs.run(input_file_name, output_file_prefix)
+    except Exception, e:
+        logging.exception(e)
+        summary = {'status': 'error: %s' % e}
+    finally:
+        logger.removeHandler(handler)
+        handler.close()
+    summary.update({'netlist': input_file_name, 'total': time.time() - time1})
+    if scs_governor.fallbacks():
+        summary['fallbacks'] = scs_governor.fallbacks()
+    return summary
+
+
+def netlists_from(patterns, manifest=None):
+    """ Returns list of netlist files
+
+        patterns: list of file names or glob patterns
+
+        manifest: name of file with file names or glob patterns in lines
+
+        Files are listed once, in order of patterns, files matching a pattern are sorted.
+    """
+    patterns = list(patterns)
+    if manifest:
+        with open(manifest) as fil:
+            patterns += [line.strip() for line in fil if line.strip() and not line.strip().startswith('#')]
+    netlists = []
+    for pattern in patterns:
+        for netlist in sorted(glob.glob(pattern)) or [pattern]:
+            if netlist not in netlists:
+                netlists.append(netlist)
+    return netlists
+
+
+def main():
+    """ Main function.
+
+        Look at description of this file.
+    """
+    parser = argparse.ArgumentParser(description=__description__, prog='scs_batch')
+    parser.add_argument('netlists', nargs='*', help='netlist files or glob patterns')
+    parser.add_argument('--manifest', help='file with netlist files or glob patterns, one in line')
+    parser.add_argument('-o', default='scs_batch.json', help='summary file name, scs_batch.json on default')
+    parser.add_argument('-j', type=int, default=multiprocessing.cpu_count(), metavar='JOBS',
+                        help='number of worker processes, number of CPUs on default')
+    parser.add_argument('--max-ops', type=int, metavar='N',
+                        help='skip simplifying steps of expresions with more than N operations (see scs.py)')
+    parser.add_argument('--stage-timeout', type=float, metavar='SEC',
+                        help='interrupt simplifying step after SEC seconds (see scs.py)')
+    parser.add_argument('--solver', default='inverse', choices=sorted(scs_instance_hier.solvers),
+                        help='engine solving equations of instances (see scs.py)')
+    parser.add_argument('--backend', default='sympy', choices=sorted(scs_backend.backends),
+                        help='symbolic engine of cancelling, determinants and factoring (see scs.py)')
+    parser.add_argument('--exact', action='store_true',
+                        help='keep numbers of netlists as exact rationals (see scs.py)')
+    parser.add_argument('--reduce', action='store_true',
+                        help='reduce series and parallel passive elements before solving (see scs.py)')
+    parser.add_argument('--cascade', action='store_true',
+                        help='replace chains of two-port subinstances by their cascades before solving (see scs.py)')
+    parser.add_argument('--superposition', action='store_true',
+                        help='solve each independent source as a right hand side of its own (see scs.py)')
+    args = parser.parse_args(sys.argv[1:])
+
+    try:
+        netlists = netlists_from(args.netlists, args.manifest)
+    except IOError, e:
+        parser.error(e)
+    if not netlists:
+        parser.error('no netlists given')
+
+    if not scs_backend.backends[args.backend].available():
+        parser.error('%s backend is not installed' % args.backend)
+    logging.getLogger().setLevel(logging.INFO)
+    time1 = time.time()
+    pool = multiprocessing.Pool(args.j, _init_worker, (args.max_ops, args.stage_timeout, args.solver, args.exact, args.backend,
+                                                       args.reduce, args.superposition,
+                                                       args.cascade))
+    summaries = []
+    try:
+        # Small chunks keep workers busy evenly when some netlists take much longer than others
+        for summary in pool.imap_unordered(solve_netlist, netlists, max(1, len(netlists) / (args.j * 16))):
+            summaries.append(summary)
+            if summary['status'] != 'ok':
+                print '%s: %s' % (summary['netlist'], summary['status'])
+    finally:
+        pool.close()
+        pool.join()
+
+    order = dict((netlist, number) for number, netlist in enumerate(netlists))
+    summaries.sort(key=lambda summary: order[summary['netlist']])
+    failed = len([summary for summary in summaries if summary['status'] != 'ok'])
+    with open(args.o, 'w') as fil:
+        json.dump({'netlists': summaries, 'failed': failed, 'total': time.time() - time1}, fil, indent=1,
+                  sort_keys=True)
+    print '%d netlists solved, %d failed in %.1f s' % (len(summaries) - failed, failed, time.time() - time1)
+
+
+if __name__ == "__main__":
+    main()
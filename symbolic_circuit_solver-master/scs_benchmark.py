@@ -0,0 +1,319 @@
+#!/depot/Python-2.7.2/bin/python -E
+
+""" Benchmark script.
+
+    Generates parameterized netlists of growing size: RC and RLC ladders of N stages, LC ladders of N identical
+    subcircuits, R-2R networks, cascades of mos_s gain stages and hierarchical trees of opamp instances. Each of them is
+    run in a separate process through all the phases of scs.py: parsing, instantiating, checks, solving and analyses,
+    while timings of each phase, expresion sizes (from scs_trace) and peak memory are recorded. Report is saved as JSON
+    file, so runs of different versions of solver, of different solver engines (--solver), symbolic backends
+    (--backend) or with cascades (--cascade) can be compared.
+
+    Example:
+    scs_benchmark.py -o report.json --suite rc,r2r --sizes 1,2,4,8 --timeout 600
+"""
+import argparse
+import json
+import logging
+import multiprocessing
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+
+try:
+    import resource
+except ImportError:  # Not on Windows
+    resource = None
+
+import sympy
+
+import scs_backend
+import scs_cascade
+import scs_circuit
+import scs_instance_hier
+import scs_parser
+import scs_trace
+
+__author__ = "Tomasz Kniola"
+__credits__ = ["Tomasz Kniola"]
+
+__license__ = "LGPL"
+__version__ = "0.0.1"
+__email__ = "kniola.tomasz@gmail.com"
+__status__ = "development"
+
+__description__ = """
+    Symbolic circuit solver benchmark - times solving generated circuits of growing size
+
+"""
+
+# Directory with libraries of subcircuits used by generated netlists
+library_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'examples', 'library')
+
+
+def rc_ladder(n):
+    """ Netlist of RC ladder of n stages, each stage with its own R and C symbols
+    """
+    lines = ['*$ RC ladder of %d stages' % n,
+             '.param Vin %s' % ' '.join('R%d C%d' % (k, k) for k in range(1, n + 1)),
+             'Vin n0 0 Vin']
+    for k in range(1, n + 1):
+        lines.append('R%d n%d n%d R%d' % (k, k - 1, k, k))
+        lines.append('C%d n%d 0 C%d' % (k, k, k))
+    subst = ' '.join('R%d=1k C%d=1n' % (k, k) for k in range(1, n + 1))
+    lines.append(".measure T 'v(n%d)/Vin'" % n)
+    lines.append(".ac T %s fstart=1 fstop=1e9" % subst)
+    return lines
+
+
+def rlc_ladder(n):
+    """ Netlist of RLC ladder of n stages: series R-L and shunt C
+    """
+    lines = ['*$ RLC ladder of %d stages' % n,
+             '.param Vin %s' % ' '.join('R%d L%d C%d' % (k, k, k) for k in range(1, n + 1)),
+             'Vin n0 0 Vin']
+    for k in range(1, n + 1):
+        lines.append('R%d n%d m%d R%d' % (k, k - 1, k, k))
+        lines.append('L%d m%d n%d L%d' % (k, k, k, k))
+        lines.append('C%d n%d 0 C%d' % (k, k, k))
+    subst = ' '.join('R%d=10 L%d=1u C%d=1n' % (k, k, k) for k in range(1, n + 1))
+    lines.append(".measure T 'v(n%d)/Vin'" % n)
+    lines.append(".ac T %s fstart=1e3 fstop=1e9" % subst)
+    return lines
+
+
+def r2r(n):
+    """ Netlist of R-2R network of n bits, all bits driven by own voltage source
+    """
+    lines = ['*$ R-2R network of %d bits' % n,
+             '.param R %s' % ' '.join('V%d' % k for k in range(n))]
+    lines.append('Rt n0 0 2*R')
+    for k in range(n):
+        lines.append('V%d b%d 0 V%d' % (k, k, k))
+        lines.append('R2_%d b%d n%d 2*R' % (k, k, k))
+        if k:
+            lines.append('R1_%d n%d n%d R' % (k, k - 1, k))
+    lines.append(".measure out 'v(n%d)'" % (n - 1))
+    return lines
+
+
+def mos_cascade(n):
+    """ Netlist of cascade of n common source stages made of mos_s library subcircuit with resistive loads
+    """
+    lines = ['*$ Cascade of %d common source stages' % n,
+             ".include '%s'" % os.path.join(library_dir, 'mos.sp'),
+             '.param Vin RL CL gds cgs',
+             'Vin n0 0 Vin']
+    for k in range(1, n + 1):
+        lines.append("xm%d n%d n%d 0 mos_s gds='gds' cgs='cgs'" % (k, k, k - 1))
+        lines.append('RL%d n%d 0 RL' % (k, k))
+        lines.append('CL%d n%d 0 CL' % (k, k))
+    lines.append(".measure T 'v(n%d)/Vin'" % n)
+    lines.append(".ac T RL=10k CL=1p gm=1m gds=0.1m cgs=10f fstart=1e3 fstop=1e10")
+    return lines
+
+
+def lc_chain(n):
+    """ Netlist of LC ladder of n identical stages, each stage an instance of the same subcircuit
+    """
+    lines = ['*$ LC ladder of %d stages in subcircuits' % n,
+             '.param Vin R L C',
+             ".subckt in out ref stage L='L' C='C'",
+             'L1 in out L',
+             'C1 out ref C',
+             '.ends',
+             'Vin in 0 Vin',
+             'Rs in n0 R',
+             'Rl n%d 0 R' % n]
+    for k in range(1, n + 1):
+        lines.append('x%d n%d n%d 0 stage' % (k, k - 1, k))
+    lines.append(".measure T 'v(n%d)/Vin'" % n)
+    lines.append(".ac T R=50 L=10n C=4p fstart=1e6 fstop=1e10")
+    return lines
+
+
+def opamp_tree(n):
+    """ Netlist of binary tree of opamp instances of depth n
+
+        Leaf is inverting amplifier made of opamp library subcircuit, each next level is a subcircuit holding two
+        previous level subcircuits in cascade. Parameters have symbolic defaults, so all leaves share the same symbols.
+    """
+    lines = ['*$ Tree of opamp inverting amplifiers of depth %d' % n,
+             ".include '%s'" % os.path.join(library_dir, 'opamp.sp'),
+             '.param Vin R1 R2 A',
+             ".subckt in out ref level0 R1='R1' R2='R2' A='A'",
+             'R1 in x R1',
+             'R2 x out R2',
+             "xota ref x out ref opamp gain='1/A'",
+             '.ends']
+    for k in range(1, n):
+        lines += ['.subckt in out ref level%d' % k,
+                  'xa in mid ref level%d' % (k - 1),
+                  'xb mid out ref level%d' % (k - 1),
+                  '.ends']
+    lines.append('Vin in 0 Vin')
+    lines.append('xtop in out 0 level%d' % (n - 1))
+    lines.append(".measure T 'v(out)/Vin' rout=0")
+    return lines
+
+
+# Dictionary of suite name with netlist generator function
+suited = {'rc': rc_ladder,
+          'lc': lc_chain,
+          'rlc': rlc_ladder,
+          'r2r': r2r,
+          'mos': mos_cascade,
+          'opamp': opamp_tree}
+
+
+def _run_case(filename, output_prefix, queue):
+    """ Runs all phases for a netlist and puts the measurements into queue
+
+        filename: netlist file
+
+        output_prefix: prefix for analysis output files
+
+        queue: multiprocessing queue for the result
+
+        Runs in its own process, so peak memory is the one of this case only.
+    """
+    logging.basicConfig(filename='%s.log' % output_prefix, level=logging.INFO)
+    scs_trace.enable()
+    result = {'phases': {}, 'analyses': [], 'status': 'ok'}
+
+    def timed(phase, function, *args):
+        time1 = time.time()
+        value = function(*args)
+        result['phases'][phase] = time.time() - time1
+        return value
+
+    try:
+        top_cir = timed('parse', scs_parser.parse_file, filename, scs_circuit.TopCircuit())
+        top_instance = timed('instantiate', scs_instance_hier.make_top_instance, top_cir)
+        if not top_instance:
+            raise RuntimeError('instantiation failed')
+        if not timed('check_path_to_gnd', top_instance.check_path_to_gnd):
+            raise RuntimeError('check_path_to_gnd failed')
+        if not timed('check_voltage_loop', top_instance.check_voltage_loop):
+            raise RuntimeError('check_voltage_loop failed')
+        if scs_cascade.enabled:
+            timed('cascade', scs_cascade.cascade_circuit, top_instance, top_cir)
+        timed('solve', top_instance.solve)
+        result['inner_nets'] = len(top_instance.inner_nets)
+        timed('analyses', top_cir.perform_analysis, top_instance, output_prefix)
+    except BaseException, e:
+        result['status'] = 'error: %s' % e
+
+    for event in scs_trace.events():
+        if event['phase'] == 'product' and event['instance'] == 'top':
+            result.update({'V0_ops': event['V0_ops'], 'Ap_ops': event['Ap_ops']})
+        elif event['phase'] == 'analysis':
+            result['analyses'].append({'type': event['type'], 'name': event['analysis'], 'wall': event['wall']})
+        elif event['phase'] in ('factor', 'simplify'):
+            result.setdefault('%s_ops' % event['phase'], []).append(event['value_ops'])
+    if resource:
+        result['peak_memory_kb'] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    queue.put(result)
+
+
+def run_case(suite, size, workdir, timeout):
+    """ Generates netlist and runs benchmark for it
+
+        suite: name of the netlist generator from suited
+
+        size: size of generated circuit
+
+        workdir: directory where netlist and outputs are written
+
+        timeout: time in seconds after which the case is stopped
+
+        Returns dictionary with measurements.
+    """
+    name = '%s_%d' % (suite, size)
+    filename = os.path.join(workdir, '%s.sp' % name)
+    with open(filename, 'w') as fil:
+        fil.write('\n'.join(suited[suite](size) + ['.ends']) + '\n')
+
+    queue = multiprocessing.Queue()
+    process = multiprocessing.Process(target=_run_case, args=(filename, os.path.join(workdir, name), queue))
+    time1 = time.time()
+    process.start()
+    process.join(timeout)
+    if process.is_alive():
+        process.terminate()
+        process.join()
+        result = {'status': 'timeout'}
+    elif queue.empty():
+        result = {'status': 'crashed with exit code %s' % process.exitcode}
+    else:
+        result = queue.get()
+    result.update({'suite': suite, 'size': size, 'total': time.time() - time1})
+    return result
+
+
+def main():
+    """ Main function.
+
+        Look at description of this file.
+    """
+    parser = argparse.ArgumentParser(description=__description__, prog='scs_benchmark')
+    parser.add_argument('-o', default='benchmark.json', help='report file name, benchmark.json on default')
+    parser.add_argument('--suite', default=','.join(sorted(suited)),
+                        help='comma separated list of circuits to generate: %s' % ', '.join(sorted(suited)))
+    parser.add_argument('--sizes', default='1,2,4,8', help='comma separated list of circuit sizes')
+    parser.add_argument('--timeout', type=float, default=600, help='time limit for one case in seconds')
+    parser.add_argument('--keep', action='store_true', help='keep generated netlists and outputs in ./benchmark')
+    parser.add_argument('--solver', default='inverse', choices=sorted(scs_instance_hier.solvers),
+                        help='engine solving equations of instances (see scs.py)')
+    parser.add_argument('--backend', default='sympy', choices=sorted(scs_backend.backends),
+                        help='symbolic engine of cancelling, determinants and factoring (see scs.py)')
+    parser.add_argument('--cascade', action='store_true',
+                        help='replace chains of two-port subinstances by their cascades before solving (see scs.py)')
+    args = parser.parse_args(sys.argv[1:])
+
+    suites = args.suite.split(',')
+    for suite in suites:
+        if suite not in suited:
+            parser.error('unknown suite: %s' % suite)
+    sizes = [int(size) for size in args.sizes.split(',')]
+    # Cases run in forked processes, which inherit the engine
+    scs_instance_hier.solver = args.solver
+    scs_cascade.enabled = args.cascade
+    if not scs_backend.use(args.backend):
+        parser.error('%s backend is not installed' % args.backend)
+
+    workdir = 'benchmark' if args.keep else tempfile.mkdtemp(prefix='scs_benchmark')
+    if not os.path.isdir(workdir):
+        os.makedirs(workdir)
+
+    report = {'version': __version__,
+              'python': platform.python_version(),
+              'sympy': sympy.__version__,
+              'solver': args.solver,
+              'backend': args.backend,
+              'cascade': args.cascade,
+              'platform': platform.platform(),
+              'date': time.strftime("%Y-%m-%d %H:%M:%S", time.localtime()),
+              'cases': []}
+    try:
+        for suite in suites:
+            for size in sizes:
+                result = run_case(suite, size, workdir, args.timeout)
+                report['cases'].append(result)
+                print '%-8s %4d  %-8s %10.3f s' % (suite, size, result['status'], result['total'])
+                # Next sizes would time out as well
+                if result['status'] == 'timeout':
+                    break
+    finally:
+        if not args.keep:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    with open(args.o, 'w') as fil:
+        json.dump(report, fil, indent=1, sort_keys=True)
+
+
+if __name__ == "__main__":
+    main()
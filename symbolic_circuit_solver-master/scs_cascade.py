@@ -0,0 +1,231 @@
+"""
+Cascades of two-port subinstances
+
+Ladder filters, transmission line models and chains of gain stages are made of the same subcircuit instantiated many
+times, each instance connected to the next one by a net with nothing else on it. Pass between instantiating and solving
+a circuit finds such chains in top instance and replaces each run of identical links (the same subcircuit with the same
+parameters, connected in the same direction) by one macro instance (scs_instance_hier.MacroInstance), so nets inside
+the run aren't unknowns of top instance.
+
+Link of a chain is a subinstance with two signal ports, its other ports are connected to ground. Link is solved alone and its port currents (Instance.port_current) give its admittance
+parameters, from which its transmission (ABCD) matrix is made:
+[V1 ; I1] = [A B ; C D] * [V2 ; -I2]
+A = -y22/y21, B = -1/y21, C = -(y11*y22 - y12*y21)/y21, D = -y11/y21
+Only the first link of a run is solved, its matrix is raised to the power of run length by squaring, so a run of 64
+stages takes 6 products of 2x2 matrices instead of solving 64 nets. Matrix of the run is written back as admittance
+parameters of the macro instance, over common denominator B which isn't cancelled. Chains inside subcircuits are left
+as they are: parent of a subcircuit cancels its port currents, and denominators of cascades mixed with other entries
+make gcd of that cancelling slower than solving the chain.
+
+Links with sources inside (port currents for zero port voltages), with voltage sources on ports or with y21 = 0 break a
+chain, as do nets and instances observed by analyses, subinstances of isub() ports among them. Nets inside chains and instances of links can't be probed
+afterwards, so the pass is turned on by --cascade option.
+"""
+import logging
+
+import sympy
+
+import scs_backend
+import scs_circuit
+import scs_governor
+import scs_instance_hier
+import scs_reduction
+import scs_trace
+
+__author__ = "Tomasz Kniola"
+__credits__ = ["Tomasz Kniola"]
+
+__license__ = "LGPL"
+__version__ = "0.0.1"
+__email__ = "kniola.tomasz@gmail.com"
+__status__ = "development"
+
+enabled = False  # Replace chains of two-port subinstances by their cascades before solving
+
+
+def _signal_ports(subinstance):
+    """ Returns list of two ports of subinstance which aren't connected to '0' net, or None if it isn't a two-port
+    """
+    ports = sorted(port for port, net in subinstance.port_map.iteritems() if net != '0')
+    if len(ports) != 2 or subinstance.port_map[ports[0]] == subinstance.port_map[ports[1]]:
+        return None
+    return ports
+
+
+def _chains(inst, kept_nets, kept_instances):
+    """ Finds chains of two-port subinstances of instance
+
+        inst: instance, whose subinstances are searched
+
+        kept_nets, kept_instances: sets of names of nets and subinstances which can't be hidden in a chain
+
+        Returns list of chains, each one a list of (subinstance, input port, output port) from one end of chain to the
+        other, with at least two links.
+    """
+    links = {}
+    for name, subinstance in inst.subinstances.iteritems():
+        ports = _signal_ports(subinstance)
+        if ports and name not in kept_instances:
+            links.update({name: ports})
+
+    # Nets joining two links and nothing else
+    joints = set()
+    for net, elements in inst.elements_on_net.iteritems():
+        if net in inst.port_map or net == '0' or net in kept_nets or len(elements) != 2:
+            continue
+        if all(isinstance(element, scs_instance_hier.Instance) and element.name in links and
+               [element.port_map[port] for port in links[element.name]].count(net) == 1 for element in elements):
+            joints.add(net)
+
+    chains = []
+    for name in sorted(links):
+        subinstance = inst.subinstances[name]
+        nets = [subinstance.port_map[port] for port in links[name]]
+        if len([net for net in nets if net in joints]) != 1:
+            continue  # Not an end of chain
+        in_port = links[name][0] if nets[0] not in joints else links[name][1]
+        chain = []
+        while True:
+            out_port = links[subinstance.name][1] if in_port == links[subinstance.name][0] else links[subinstance.name][0]
+            chain.append((subinstance, in_port, out_port))
+            net = subinstance.port_map[out_port]
+            if net not in joints:
+                break
+            subinstance = [element for element in inst.elements_on_net[net] if element is not subinstance][0]
+            in_port = [port for port in links[subinstance.name] if subinstance.port_map[port] == net][0]
+        # Each chain is found from both its ends
+        if chain[0][0].name < chain[-1][0].name:
+            chains.append(chain)
+    return chains
+
+
+def _link_key(link, in_port, out_port):
+    """ Returns key which is the same for links with the same equations, connected in the same direction by the same
+        ports, with the same ports grounded
+    """
+    grounded = tuple(sorted(port for port, net in link.port_map.iteritems() if net == '0'))
+    return (link.circuit_name, in_port, out_port, grounded,
+            tuple(sorted((param, str(value)) for param, value in link.paramsd.iteritems())))
+
+
+def _runs(chain):
+    """ Splits chain into runs of identical links, returns list of runs with at least two links
+    """
+    runs = []
+    for link in chain:
+        if runs and _link_key(*runs[-1][-1]) == _link_key(*link):
+            runs[-1].append(link)
+        else:
+            runs.append([link])
+    return [run for run in runs if len(run) > 1]
+
+
+def _transmission(link, in_port, out_port, cancel):
+    """ Returns transmission (ABCD) matrix of link, or None if link can't be a part of cascade
+
+        Link is solved to get its port currents as functions of port voltages.
+    """
+    link.solve()
+    y = {}
+    for port in (in_port, out_port):
+        if link.chained_ports.get(port) or scs_instance_hier._unused_voltage_sources(link, port):
+            return None
+        G_pd, I_port, _ = link.port_current(port)
+        if cancel(I_port) != 0:
+            return None
+        y.update({port: dict((p, cancel(G_pd.get(p, 0))) for p in (in_port, out_port))})
+    y11, y12 = y[in_port][in_port], y[in_port][out_port]
+    y21, y22 = y[out_port][in_port], y[out_port][out_port]
+    if y21 == 0:
+        return None
+    return sympy.Matrix([[-y22 / y21, -1 / y21], [-(y11 * y22 - y12 * y21) / y21, -y11 / y21]]).applyfunc(cancel)
+
+
+def _power(matrix, n, cancel):
+    """ Returns n-th power of matrix, by squaring
+    """
+    result = None
+    while n:
+        if n & 1:
+            result = matrix if result is None else (result * matrix).applyfunc(cancel)
+        n >>= 1
+        if n:
+            matrix = (matrix * matrix).applyfunc(cancel)
+    return result
+
+
+def _replace_chain(inst, chain, matrix, determinant):
+    """ Replaces links of chain in top instance by macro instance with admittance parameters of transmission matrix
+
+        determinant: determinant of transmission matrix, product of determinants of links
+
+        Admittances share denominator B and aren't cancelled, gcd of polynomials of long chains would take longer than
+        solving the parent. Returns False, leaving instance as it was, if the chain has no admittance parameters (B = 0).
+    """
+    (A, B), (C, D) = matrix.tolist()
+    if B == 0:
+        return False
+    over_B = lambda numerator: sympy.Mul(numerator, sympy.Pow(B, -1))
+    y = [[over_B(D), over_B(-determinant)], [over_B(-1), over_B(A)]]
+    first, last = chain[0], chain[-1]
+    port_map = {'1': first[0].port_map[first[1]], '2': last[0].port_map[last[2]]}
+    G = {'1': {'1': y[0][0], '2': y[0][1]}, '2': {'1': y[1][0], '2': y[1][1]}}
+    I = dict((port, sympy.S.Zero) for port in port_map)
+    chained_ports = dict((port, []) for port in port_map)
+    connected_ports = dict((port, [p for p in port_map if p != port and G[port][p] != 0]) for port in port_map)
+    name = '%s-%s' % (first[0].name, last[0].name)
+    macromodel = scs_circuit.MacroModel(name, sorted(port_map), {}, G, I, chained_ports, connected_ports)
+
+    for link, _, _ in chain:
+        del inst.subinstances[link.name]
+        for net in set(link.port_map.values()):
+            inst.elements_on_net[net].remove(link)
+            if not inst.elements_on_net[net] and net not in inst.port_map:
+                del inst.elements_on_net[net]
+    inst.add_sub_instance(scs_instance_hier.MacroInstance(inst, name, port_map, macromodel, {}))
+    return True
+
+
+def cascade_instance(inst, observed_names):
+    """ Replaces runs of identical links of chains of two-port subinstances of top instance by their cascades
+
+        inst: top instance made by scs_instance_hier.make_instance, not solved yet
+
+        observed_names: set of names of nets and instances which have to be kept, in dot notation from top instance
+
+        Returns tuple of numbers of runs and links replaced.
+    """
+    runs_count, links_count = 0, 0
+    if len(inst.subinstances) < 2:
+        return runs_count, links_count
+    with scs_trace.phase('cascade', instance=inst.hier_name()) as event:
+        cancel = lambda expr: scs_governor.guarded('cancel', scs_backend.backend.cancel, scs_governor.keep, expr, event)
+        kept_nets = set(observed_names)
+        kept_instances = set(name.split('.')[0] for name in observed_names)
+        for chain in _chains(inst, kept_nets, kept_instances):
+            for run in _runs(chain):
+                link, in_port, out_port = run[0]
+                transmission = _transmission(link, in_port, out_port, cancel)
+                if transmission is None:
+                    logging.info('%s can\'t be a link of cascade' % link.name)
+                    continue
+                determinant = cancel(transmission.det()) ** len(run)
+                if _replace_chain(inst, run, _power(transmission, len(run), cancel), determinant):
+                    logging.info('Run of %d links %s-%s replaced by cascade' % (len(run), run[0][0].name, run[-1][0].name))
+                    runs_count += 1
+                    links_count += len(run)
+        if links_count:
+            inst._prepare_nets()
+        event.update({'links': links_count})
+    return runs_count, links_count
+
+
+def cascade_circuit(inst, circuit):
+    """ Replaces chains of top instance keeping nets and instances observed by analyses of circuit
+
+        inst: top instance, checked but not solved
+
+        circuit: top circuit made by parser
+    """
+    runs, links = cascade_instance(inst, scs_reduction.observed(circuit))
+    logging.info('Cascades replaced %d runs of %d links' % (runs, links))
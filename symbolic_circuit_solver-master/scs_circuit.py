@@ -4,9 +4,16 @@
 """
 import scs_errors
 import scs_analysis
+import scs_results
+import scs_trace
 
 import time
+import json
 import logging
+import multiprocessing
+import os
+import re
+import sympy
 
 __author__ = "Tomasz Kniola"
 __credits__ = ["Tomasz Kniola"]
@@ -40,6 +47,7 @@ class Circuit(object):
         self.elementsd = {}  # Dictionary of element names with elements objects of circuit
         self.parametersd = {}  # Dictionary parameter names with expresion for them
         self.subcircuitsd = {}  # Dictionary of subcircuit names with circuit object
+        self.macromodelsd = {}  # Dictionary of macro model names with macro model object
         self.parent = parent
         self.ports = ports
         if params:
@@ -73,6 +81,85 @@ class Circuit(object):
         new = Circuit(subcircuit_name, self, subcircuit_ports, subcircuit_params)
         self.subcircuitsd.update({subcircuit_name: new})
 
+    def add_macromodel(self, macromodel):
+        """ Adds a macro model to self macro models dictionary
+
+            macromodel: MacroModel object being added to self.macromodelsd dictionary
+
+            if macro model with such names exist raise an error.
+        """
+        if macromodel.name in self.macromodelsd:
+            raise scs_errors.ScsParserError("Macro model %s defintion already exists" % macromodel.name)
+        self.macromodelsd.update({macromodel.name: macromodel})
+
+
+    def add(self, element_name, *params, **named_params):
+        """ Adds an element or an instance of subcircuit, like a line of netlist
+
+            element_name: name of element, its first letter says of which type it is (R, L, C, V, I, E, G, H, F, N or X)
+
+            params: nets and value of element, for subcircuit instance nets and subcircuit name as last one
+
+            named_params: parameters passed to subcircuit instance
+
+            Values can be strings with expresions written like in netlist, numbers or sympy expresions. Returns self, so
+            calls can be chained:
+            top.add('V1', 'in', 0, 'Vin').add('R1', 'in', 'out', 'R').add('C1', 'out', 0, 1e-12)
+
+            if element with such name exist or its type is unknown raise an error.
+        """
+        if element_name[:1] not in ('R', 'r', 'L', 'l', 'C', 'c', 'V', 'v', 'I', 'i', 'E', 'e', 'H', 'h', 'G', 'g', 'F',
+                                    'f', 'N', 'n', 'X', 'x'):
+            raise scs_errors.ScsParserError("Unknown element: %s" % element_name)
+        self.add_element(intern(element_name), Element([intern(_param_string(param)) for param in params],
+                                                       _params_strings(named_params)))
+        return self
+
+    def subcircuit(self, subcircuit_name, ports, **params):
+        """ Adds a subcircuit definition, like .subckt
+
+            subcircuit_name: name of subcircuit
+
+            ports: list of port nets
+
+            params: default parameters of subcircuit
+
+            Returns new subcircuit, to which its elements can be added.
+        """
+        self.add_subcircuit(subcircuit_name, [_param_string(port) for port in ports], _params_strings(params))
+        return self.subcircuitsd[subcircuit_name]
+
+    def param(self, *names, **params):
+        """ Adds parameters, like .param
+
+            names: names of parameters being just symbols
+
+            params: parameters with their values
+
+            Returns self.
+        """
+        for name in names:
+            self.parametersd.update({name: name})
+        self.parametersd.update(_params_strings(params))
+        return self
+
+    def add_library(self, library):
+        """ Adds contents of a circuit parsed from included file
+
+            library: circuit with contents of included file, its subcircuits and elements are shared and not copied
+
+            if element, subcircuit or macro model with such name exists raise an error.
+        """
+        for element_name, element in library.elementsd.iteritems():
+            self.add_element(element_name, element)
+        for subcircuit_name, subcircuit in library.subcircuitsd.iteritems():
+            if subcircuit_name in self.subcircuitsd:
+                raise scs_errors.ScsParserError("Subcircuit %s defintion already exists" % subcircuit_name)
+            self.subcircuitsd.update({subcircuit_name: subcircuit})
+        for macromodel in library.macromodelsd.itervalues():
+            self.add_macromodel(macromodel)
+        self.parametersd.update(library.parametersd)
+
 
 class TopCircuit(Circuit):
     """Circuit which doesn't have any parent (isn't subcircuit of any circuit). Holds also analysis that can be
@@ -86,25 +173,204 @@ class TopCircuit(Circuit):
         """
         Circuit.__init__(self, 'top', None, None, None)
         self.analysisl = []
+        self.approxd = None  # Parameters of .approx: options and nominal values, None if solved exactly
+        self.symmetryd = None  # Pairs of symmetric nets of .symmetry, empty to find them, None if not used
 
-    def perform_analysis(self, instance, file_prefix):
+    def add_library(self, library):
+        """ Adds contents of a circuit parsed from included file, together with its analyses
+        """
+        Circuit.add_library(self, library)
+        self.analysisl.extend(getattr(library, 'analysisl', []))
+        if getattr(library, 'approxd', None) is not None:
+            self.approxd = library.approxd
+        if getattr(library, 'symmetryd', None) is not None:
+            self.symmetryd = library.symmetryd
+
+    def analysis(self, analysis_type, *params, **named_params):
+        """ Adds an analysis, like .measure, .dc or .ac line of netlist
+
+            analysis_type: 'measure', 'dc' or 'ac'
+
+            params: positional parameters: name and expresions for .measure, expresions for .dc and .ac
+
+            named_params: options and substitutions of analysis
+
+            Returns self.
+
+            if type of analysis is unknown raise an error.
+        """
+        if analysis_type not in scs_analysis.analysis_dict:
+            raise scs_errors.ScsParserError("Unknown analysis: %s" % analysis_type)
+        self.analysisl.append(Analysis(analysis_type, [_param_string(param) for param in params],
+                                       _params_strings(named_params)))
+        return self
+
+    def approx(self, **params):
+        """ Makes circuit solved approximately, like .approx
+
+            params: options (tol, fstart, fstop, npoints) and nominal values of symbols, look at scs_approx
+
+            Returns self.
+        """
+        self.approxd = _params_strings(params)
+        return self
+
+    def symmetry(self, **pairs):
+        """ Makes symmetric instances solved as half circuits, like .symmetry
+
+            pairs: names of symmetric nets of top circuit, e.g. outp='outm', if none are given they are found in
+            equations, look at scs_symmetry
+
+            Returns self.
+        """
+        self.symmetryd = _params_strings(pairs)
+        return self
+
+    def perform_analysis(self, instance, file_prefix, jobs=1):
         """ Performs all analysis for self circuit.
 
             instance: solved instance for which we want to perform analysis
     
             file_prefix: prefix of a file where analysis are gonna print their answers
-        """
-        results_filename = "%s.results" % file_prefix
 
-        created_print_file = False
+            jobs: number of processes performing analyses at the same time
 
+            Analyses are performed in groups: chain of analyses holding plot for the next one is one group. With more
+            than one job groups are performed in pool of processes forked from this one, in waves: group which uses
+            value measured by .measure is in later wave than group which measures it. Output of analyses is written
+            in their order in netlist anyway. Structured results of all analyses are saved at the end into
+            file_prefix.npz (see scs_results).
+        """
+        if not self.analysisl:
+            return
+
+        groups, dependencies, plot_nums = self._analysis_schedule()
+        measured = {}  # Dictionary of analysis number with dictionary of values it measured
+        outputs = {}  # Dictionary of analysis number with its output
+        results = scs_results.ResultsStore()
+        written = 0
+
+        if jobs > 1 and hasattr(os, 'fork'):
+            global _worker_data
+            _worker_data = (self, instance)
+            pool = multiprocessing.Pool(jobs)
+        else:
+            pool = None
+
+        try:
+            with open("%s.results" % file_prefix, 'w') as fil:
+                for wave in self._analysis_waves(groups, dependencies):
+                    tasks = [(group, file_prefix, plot_nums,
+                              dict((name, measured[number][name]) for name, number in dependencies[group[0]]
+                                   if number in measured))
+                             for group in wave]
+                    if pool:
+                        wave_outputs = pool.map(_perform_analysis_group, tasks)
+                    else:
+                        wave_outputs = [self._perform_analysis_group(instance, *task) for task in tasks]
+                    for group, (group_outputs, group_measured) in zip(wave, wave_outputs):
+                        outputs.update(zip(group, group_outputs))
+                        measured.update(group_measured)
+                    # Write outputs of all analyses up to first not performed one
+                    while written in outputs:
+                        fil.write(''.join(outputs[written].text))
+                        results.extend(outputs.pop(written).results)
+                        written += 1
+        finally:
+            if pool:
+                pool.close()
+                pool.join()
+
+        if results.index:
+            results.save('%s.npz' % file_prefix)
+
+    def _analysis_schedule(self):
+        """ Prepares analyses for performing them in any order
+
+            Returns tuple of: list of groups of analyses numbers which have to be performed together in one process,
+            dictionary of first analysis number of each group with list of (name, analysis number) pairs of measured
+            values used by group, and list of number of first plot of each analysis.
+        """
+        groups = []
+        group = []
+        for number, analysis in enumerate(self.analysisl):
+            group.append(number)
+            if analysis.paramsd.get('hold', 'no') == 'no':
+                groups.append(group)
+                group = []
+        if group:
+            groups.append(group)
+
+        dependencies = {}
+        producers = {}  # Dictionary of measure names with number of analysis which measures them
+        for group in groups:
+            used = set()
+            for number in group:
+                analysis = self.analysisl[number]
+                expresions = analysis.paramsl[1:] if analysis.type == 'measure' else analysis.paramsl
+                text = ' '.join(list(expresions) + [str(value) for value in analysis.paramsd.itervalues()])
+                for name, producer in producers.iteritems():
+                    if producer not in group and re.search(r'\b%s\b' % re.escape(name), text):
+                        used.add((name, producer))
+            dependencies[group[0]] = sorted(used)
+            for number in group:
+                if self.analysisl[number].type == 'measure':
+                    producers[self.analysisl[number].paramsl[0]] = number
+
+        plot_nums = []
+        plot_num = 0
         for analysis in self.analysisl:
+            plot_nums.append(plot_num)
+            plot_num += scs_analysis.plots_count(analysis.type, analysis.paramsd, analysis.paramsl)
+        return groups, dependencies, plot_nums
+
+    def _analysis_waves(self, groups, dependencies):
+        """ Splits groups of analyses into waves, each group is in later wave than groups measuring values it uses
+
+            groups: list of groups of analyses numbers
+
+            dependencies: dictionary of first analysis number of group with list of used (name, analysis number)
+
+            Returns list of waves - lists of groups.
+        """
+        wave_of = {}  # Dictionary of analysis number with number of its wave
+        waves = []
+        for group in groups:
+            wave = max([wave_of[number] + 1 for name, number in dependencies[group[0]]] + [0])
+            for number in group:
+                wave_of[number] = wave
+            if wave == len(waves):
+                waves.append([])
+            waves[wave].append(group)
+        return waves
+
+    def _perform_analysis_group(self, instance, group, file_prefix, plot_nums, measured):
+        """ Performs group of analyses one after another
+
+            instance: solved instance for which we want to perform analysis
+
+            group: list of numbers of analyses
+
+            file_prefix: prefix of plot files
+
+            plot_nums: list of number of first plot of each analysis
+
+            measured: dictionary of names with values measured by other groups, used by analyses of the group
+
+            Returns tuple of list of outputs of the analyses, and dictionary of analysis number with dictionary of
+            values it measured.
+        """
+        instance.paramsd.update(measured)
+        outputs = []
+        group_measured = {}
+        for number in group:
+            analysis = self.analysisl[number]
+            output = scs_analysis.AnalysisOutput(file_prefix, plot_nums[number])
             time1 = time.clock()
-            if not created_print_file:
-                with open(results_filename, 'w'):
-                    created_print_file = True
             try:
-                scs_analysis.analysis_dict[analysis.type](analysis.paramsd, analysis.paramsl, instance, file_prefix)
+                with scs_trace.phase('analysis', type=analysis.type, analysis=analysis.paramsl[0]):
+                    scs_analysis.analysis_dict[analysis.type](dict(analysis.paramsd), analysis.paramsl, instance,
+                                                              output)
                 logging.info("Analysis: .%s '%s' performed in: %f s" %
                              (analysis.type, analysis.paramsl[0], time.clock() - time1))
             except (scs_errors.ScsInstanceError, scs_errors.ScsParameterError, scs_errors.ScsAnalysisError), e:
@@ -112,11 +378,47 @@ class TopCircuit(Circuit):
                 logging.warning("Analysis: %s %s not performed" % (analysis.type, analysis.paramsl[0]))
 
                 # TODO: add exception handling here
+            if analysis.type == 'measure' and analysis.paramsl[0] in instance.paramsd:
+                group_measured[number] = {analysis.paramsl[0]: instance.paramsd[analysis.paramsl[0]]}
+            outputs.append(output)
+        scs_analysis.close_plots()
+        return outputs, group_measured
+
+
+_worker_data = None  # Tuple of top circuit and solved instance for processes of analyses pool, inherited by fork
+
+
+def _perform_analysis_group(task):
+    """ Performs group of analyses in process of pool
+
+        task: tuple of arguments of TopCircuit._perform_analysis_group without instance
+    """
+    circuit, instance = _worker_data
+    return circuit._perform_analysis_group(instance, *task)
+
+
+def _param_string(value):
+    """ Returns parameter value as string like in netlist, value can be string, number or sympy expresion
+    """
+    return value if isinstance(value, basestring) else str(value)
+
+
+def _params_strings(params):
+    """ Returns dictionary of parameters with values as strings like in netlist
+    """
+    return dict((name, _param_string(value)) for name, value in params.iteritems())
 
 
 class Element(object):
     """Element object, which are being hold in circuits dictionaries
+
+       Templates are read-only after parsing and there are as many of them as lines in netlist, so they are kept
+       compact: no per object dictionary, positional parameters in a tuple and one shared empty dictionary for elements
+       without named parameters.
     """
+    __slots__ = ('paramsl', 'paramsd', '_nets')
+
+    _no_paramsd = {}
 
     def __init__(self, paramsl, paramsd):
         """ Initialize Element
@@ -127,13 +429,26 @@ class Element(object):
 
             Fills those structures.
         """
-        self.paramsl = paramsl
-        self.paramsd = paramsd
+        self.paramsl = tuple(paramsl)
+        self.paramsd = paramsd if paramsd else Element._no_paramsd
+        self._nets = None
+
+    def nets(self, values_count):
+        """ Nets of an element: positional parameters without the last values_count ones (values, references).
+
+            values_count: number of positional parameters at the end, which are not nets
+
+            Slice is made once and shared by all instances of the element, so it takes memory once per template.
+        """
+        if self._nets is None:
+            self._nets = self.paramsl[:len(self.paramsl) - values_count]
+        return self._nets
 
 
 class Analysis(object):
     """Analysiss object with definitions on how to perform analysis of the circuit.
     """
+    __slots__ = ('type', 'paramsl', 'paramsd')
 
     def __init__(self, typ, paramsl, paramsd):
         """ Initialize Element
@@ -147,3 +462,77 @@ class Analysis(object):
         self.type = typ
         self.paramsl = paramsl
         self.paramsd = paramsd
+
+
+class MacroModel(object):
+    """Pre-solved subcircuit, its port level description. Instantiated in place of subcircuit with the same name.
+       Made by scs_instance_hier.make_macromodel, could be saved to file and loaded back with load_macromodel.
+    """
+
+    def __init__(self, name, ports, params, G, I, chained_ports, connected_ports):
+        """ Initialize MacroModel
+
+            name: name of modeled subcircuit
+
+            ports: list of port nets of subcircuit
+
+            params: dictionary of default parameter names and expresions of subcircuit
+
+            G: dictionary of port names with conductance dictionaries (port name, conductance pairs) of port current
+
+            I: dictionary of port names with port current for zero port voltages
+
+            chained_ports: dictionary of port names with list of ports connected to it by voltage sources
+
+            connected_ports: dictionary of port names with list of ports connected to it not only by current sources
+
+            Values in G and I are sympy expresions, where parameters of subcircuit are symbols with the same name.
+        """
+        self.name = name
+        self.ports = ports
+        self.parametersd = params
+        self.G = G
+        self.I = I
+        self.chained_ports = chained_ports
+        self.connected_ports = connected_ports
+
+    def save(self, filename):
+        """ Saves macro model to a file
+
+            filename: path to the file
+
+            Expresions are saved with sympy.srepr so they are loaded back exactly as they were.
+        """
+        model = {'name': self.name,
+                 'ports': self.ports,
+                 'parametersd': self.parametersd,
+                 'G': dict((port, dict((p, sympy.srepr(g)) for p, g in G_pd.iteritems()))
+                           for port, G_pd in self.G.iteritems()),
+                 'I': dict((port, sympy.srepr(i)) for port, i in self.I.iteritems()),
+                 'chained_ports': self.chained_ports,
+                 'connected_ports': self.connected_ports}
+        with open(filename, 'w') as fil:
+            json.dump(model, fil, indent=1, sort_keys=True)
+
+
+def load_macromodel(filename):
+    """ Loads macro model from a file
+
+        filename: path to file saved with MacroModel.save
+
+        Returns MacroModel object. Raises IOError or ValueError if file couldn't be read.
+    """
+    with open(filename, 'r') as fil:
+        model = json.load(fil)
+    try:
+        return MacroModel(str(model['name']),
+                          [str(port) for port in model['ports']],
+                          dict((str(param), str(value)) for param, value in model['parametersd'].iteritems()),
+                          dict((str(port), dict((str(p), sympy.sympify(g)) for p, g in G_pd.iteritems()))
+                               for port, G_pd in model['G'].iteritems()),
+                          dict((str(port), sympy.sympify(i)) for port, i in model['I'].iteritems()),
+                          dict((str(port), [str(p) for p in ports]) for port, ports in model['chained_ports'].iteritems()),
+                          dict((str(port), [str(p) for p in ports])
+                               for port, ports in model['connected_ports'].iteritems()))
+    except (KeyError, AttributeError, sympy.SympifyError), e:
+        raise ValueError("%s is not a macro model file: %s" % (filename, e))
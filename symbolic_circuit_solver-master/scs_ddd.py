@@ -0,0 +1,157 @@
+"""
+Determinant decision diagrams
+
+Solver engine which doesn't invert conductance matrix explicitly. Determinant of the matrix and its cofactors are held
+as determinant decision diagram (DDD): graph whose vertices are nonzero entries of the matrix. Vertex of entry
+(row, col) has two edges: 1-edge to diagram of minor without row and col (entry is taken into product, with sign of its
+position) and 0-edge to diagram of the rest of expansion (entry is skipped). Diagram is made by Laplace expansion along
+its sparsest row, and minors are memoized by their rows and columns, while vertices are kept unique, so diagrams of
+determinant and of all cofactors share their subgraphs and every minor is expanded once.
+
+Values of diagrams are built bottom up, each vertex once:
+entry*sign*value(1-edge) + value(0-edge)
+so expresions keep nested form of the diagram and share subexpresions instead of being flattened into sums of products.
+They are evaluated best with cse=yes option of analyses. Node voltages are found by Cramer's rule:
+V_i = sum_k b_k*C_ki/det(G_i), with b being current vector or columns of port conductance matrix, and numerators are
+returned with the determinant they share.
+"""
+import sympy
+
+__author__ = "Tomasz Kniola"
+__credits__ = ["Tomasz Kniola"]
+
+__license__ = "LGPL"
+__version__ = "0.0.1"
+__email__ = "kniola.tomasz@gmail.com"
+__status__ = "development"
+
+ZERO = 0  # Terminal vertex of empty sum
+ONE = 1  # Terminal vertex of empty product (determinant of empty minor)
+
+
+class DeterminantDiagram(object):
+    """ Diagram of determinant and cofactors of a square sympy matrix
+    """
+
+    def __init__(self, matrix):
+        """ Initialize DeterminantDiagram
+
+            matrix: square sympy matrix
+
+            Diagrams of minors are made on demand, by determinant and cofactor.
+        """
+        self.matrix = matrix
+        self.entries = {}  # Dictionary of (row, col) with nonzero entries, faster to look up than in sympy matrix
+        self.row_cols = []  # List of sets of columns of nonzero entries of each row
+        for row in range(matrix.rows):
+            self.row_cols.append(set())
+            for col in range(matrix.cols):
+                if matrix[row, col] != 0:
+                    self.entries[(row, col)] = matrix[row, col]
+                    self.row_cols[row].add(col)
+        self.vertices = [None, None]  # List of (row, col, sign, one, zero) of vertices by their ids, 0 and 1 terminals
+        self.unique = {}  # Dictionary of (row, col, sign, one, zero) with id of vertex
+        self.minors = {}  # Dictionary of (rows, cols) with id of vertex of minor diagram
+        self.values = {ZERO: sympy.S.Zero, ONE: sympy.S.One}  # Dictionary of vertex id with its sympy value
+
+    def _vertex(self, row, col, sign, one, zero):
+        """ Returns id of unique vertex, reduced to its 0-edge when 1-edge leads to zero
+        """
+        if one == ZERO:
+            return zero
+        key = (row, col, sign, one, zero)
+        if key not in self.unique:
+            self.unique[key] = len(self.vertices)
+            self.vertices.append(key)
+        return self.unique[key]
+
+    def minor(self, rows, cols):
+        """ Returns id of vertex of diagram of minor
+
+            rows: tuple of rows of minor, sorted
+
+            cols: tuple of columns of minor, sorted
+        """
+        if not rows:
+            return ONE
+        key = (rows, cols)
+        if key not in self.minors:
+            # Expanding along the sparsest row gives the fewest branches
+            colset = set(cols)
+            row = min(rows, key=lambda row: (len(self.row_cols[row] & colset), row))
+            rest = tuple(other for other in rows if other != row)
+            offset = rows.index(row)
+            vertex = ZERO
+            for position in reversed(range(len(cols))):
+                col = cols[position]
+                if (row, col) not in self.entries:
+                    continue
+                one = self.minor(rest, cols[:position] + cols[position + 1:])
+                vertex = self._vertex(row, col, -1 if (offset + position) % 2 else 1, one, vertex)
+            self.minors[key] = vertex
+        return self.minors[key]
+
+    def determinant(self):
+        """ Returns id of vertex of determinant diagram
+        """
+        indexes = tuple(range(self.matrix.rows))
+        return self.minor(indexes, indexes)
+
+    def cofactor(self, row, col):
+        """ Returns tuple of sign and id of vertex of diagram of minor without row and col
+        """
+        indexes = tuple(range(self.matrix.rows))
+        minor = self.minor(indexes[:row] + indexes[row + 1:], indexes[:col] + indexes[col + 1:])
+        return -1 if (row + col) % 2 else 1, minor
+
+    def value(self, vertex):
+        """ Returns sympy value of diagram with vertex on top, each vertex is evaluated once
+        """
+        stack = [vertex]
+        while stack:
+            top = stack[-1]
+            if top in self.values:
+                stack.pop()
+                continue
+            row, col, sign, one, zero = self.vertices[top]
+            missing = [child for child in (one, zero) if child not in self.values]
+            if missing:
+                stack.extend(missing)
+                continue
+            self.values[top] = sign * self.entries[(row, col)] * self.values[one] + self.values[zero]
+            stack.pop()
+        return self.values[vertex]
+
+    def size(self):
+        """ Returns number of nonterminal vertices of diagrams made so far
+        """
+        return len(self.vertices) - 2
+
+
+def solve(G_i, G_p, I_v):
+    """ Solves equations G_i*V_i + G_p*V_p = I_v into V_i = V0 + Ap*V_p with diagrams of G_i
+
+        G_i, G_p, I_v: sympy matrices of equations
+
+        Returns tuple of numerators of V0 and Ap matrices, their determinant and DeterminantDiagram. If G_i is singular
+        raise ValueError.
+    """
+    diagram = DeterminantDiagram(G_i)
+    determinant = diagram.value(diagram.determinant())
+    if determinant == 0:
+        raise ValueError("Matrix det == 0; not invertible.")
+    N = G_i.rows
+    B = I_v.row_join(-G_p)
+    V = sympy.zeros(N, B.cols)
+    for i in range(N):
+        for k in range(N):
+            if not any(B[k, j] != 0 for j in range(B.cols)):
+                continue
+            sign, vertex = diagram.cofactor(k, i)
+            if vertex == ZERO:
+                continue
+            cofactor = sign * diagram.value(vertex)
+            for j in range(B.cols):
+                if B[k, j] != 0:
+                    V[i, j] += B[k, j] * cofactor
+    return V[:, :I_v.cols], V[:, I_v.cols:], determinant, diagram
@@ -5,6 +5,7 @@ Element
 +-VoltageSource
 | +-VoltageControlledVoltageSource
 | +-CurrentControlledCurrentSource
+| +-Nullor
 |
 + -CurrentSource
 | +-VoltageControlledCurrentSource
@@ -14,12 +15,12 @@ Element
   +-Reistance
   +-Capacitance
   +-Inductance
+  +-Admittance
 
 Those elements are part of instance not circuit.
 """
 
 import sympy
-import sympy.abc
 import scs_errors
 import scs_parser
 
@@ -34,7 +35,12 @@ __status__ = "development"
 
 class Element(object):
     """Object with instance of an element in circuit, just template for hierarchy of object
+
+       Elements are the most numerous objects of instantiated circuit, so they are kept compact: no per object
+       dictionary (__slots__ in each class of the hierarchy) and tuples instead of lists. Nets tuple is shared with
+       circuit element template, so all instances of the same subcircuit refer to the same one.
     """
+    __slots__ = ('names', 'nets', 'values')
 
     def __init__(self, names, nets, values):
         """ Initialize element
@@ -45,14 +51,15 @@ class Element(object):
 
             values: list of values for that element
         """
-        self.names = names
-        self.nets = nets
-        self.values = values
+        self.names = tuple(names)
+        self.nets = tuple(nets)
+        self.values = tuple(values)
 
 
 class VoltageSource(Element):
     """Object with instance of voltage source of a circtuit
     """
+    __slots__ = ()
 
     def __init__(self, name, element, evaluated_paramsd, parent):
         """ Initialize VoltageSource
@@ -74,14 +81,15 @@ class VoltageSource(Element):
         if len(element.paramsl[:-1]) != 2:
             raise scs_errors.ScsElementError("Port list is too long or too short.")
         vvalue = scs_parser.evaluate_param('_v', {'_v': vvalue_expresion}, evaluated_paramsd, parent)
-        self.names = [name]
-        self.nets = element.paramsl[:-1]
-        self.values = [sympy.sympify(vvalue,sympy.abc._clash)]
+        self.names = (name,)
+        self.nets = element.nets(1)
+        self.values = (scs_parser.sympify(vvalue),)
 
 
 class VoltageControlledVoltageSource(VoltageSource):
     """Object with instance of voltage controlled voltage source of a circtuit
     """
+    __slots__ = ()
 
     def __init__(self, name, element, evaluated_paramsd, parent):
         """ Initialize VoltageControlledVoltageSource
@@ -99,14 +107,15 @@ class VoltageControlledVoltageSource(VoltageSource):
         """
         gain_expresion = element.paramsl[-1]
         gain_value = scs_parser.evaluate_param('_gain', {'_gain': gain_expresion}, evaluated_paramsd, parent)
-        self.names = [name]
-        self.nets = element.paramsl[:-1]
-        self.values = [sympy.sympify(gain_value,sympy.abc._clash)]
+        self.names = (name,)
+        self.nets = element.nets(1)
+        self.values = (scs_parser.sympify(gain_value),)
 
 
 class CurrentControlledVoltageSource(VoltageSource):
     """Object with instance of current controlled voltage source of a circtuit
     """
+    __slots__ = ()
 
     def __init__(self, name, element, evaluated_paramsd, parent):
         """ Initialize CurrentControlledVoltageSource
@@ -124,14 +133,45 @@ class CurrentControlledVoltageSource(VoltageSource):
         """
         r_expresion = element.paramsl[-1]
         r_value = scs_parser.evaluate_param('_r', {'_r': r_expresion}, evaluated_paramsd, parent)
-        self.names = [name, element.paramsl[-2]]
-        self.nets = element.paramsl[:-2]
-        self.values = [sympy.sympify(r_value,sympy.abc._clash)]
+        self.names = (name, element.paramsl[-2])
+        self.nets = element.nets(2)
+        self.values = (scs_parser.sympify(r_value),)
+
+
+class Nullor(VoltageSource):
+    """Object with instance of nullor (ideal operational amplifier) of a circuit
+
+       Output pair of nets is a norator: its current and voltage are whatever circuit needs, like of a voltage source.
+       Input pair is a nullator: no current and no voltage between nets. Its equation V(in+) - V(in-) = 0 takes place
+       of equation of output net, so it's voltage controlled voltage source with infinite gain, without gain symbol
+       and without limits in analyses.
+    """
+    __slots__ = ()
+
+    def __init__(self, name, element, evaluated_paramsd, parent):
+        """ Initialize Nullor
+
+            name: element name
+
+            element: element template from circuit, object from scs_circuit.Element, nets out+ out- in+ in-
+
+            evaluated_paramsd: dictionary of parameter value pair, nullor has no values
+
+            parent: instance parent
+
+            Nullor has no values, so only nets of generic element are filled.
+        """
+        if len(element.paramsl) != 4:
+            raise scs_errors.ScsElementError("Port list is too long or too short.")
+        self.names = (name,)
+        self.nets = element.nets(0)
+        self.values = ()
 
 
 class CurrentSource(Element):
     """Object with instance of current source of a circtuit
     """
+    __slots__ = ()
 
     def __init__(self, name, element, evaluated_paramsd, parent):
         """ Initialize CurrentSource
@@ -153,14 +193,15 @@ class CurrentSource(Element):
         if len(element.paramsl[:-1]) != 2:
             raise scs_errors.ScsElementError("Port list is too long or too short.")
         ivalue = scs_parser.evaluate_param('_i', {'_i': ivalue_expresion}, evaluated_paramsd, parent)
-        self.names = [name]
-        self.nets = element.paramsl[:-1]
-        self.values = [sympy.sympify(ivalue,sympy.abc._clash)]
+        self.names = (name,)
+        self.nets = element.nets(1)
+        self.values = (scs_parser.sympify(ivalue),)
 
 
 class VoltageControlledCurrentSource(CurrentSource):
     """Object with instance of volatage controlled current source of a circtuit
     """
+    __slots__ = ()
 
     def __init__(self, name, element, evaluated_paramsd, parent):
         """ Initialize VoltageControlledCurrentSource
@@ -178,14 +219,15 @@ class VoltageControlledCurrentSource(CurrentSource):
         """
         gm_expresion = element.paramsl[-1]
         gm_value = scs_parser.evaluate_param('_gm', {'_gm': gm_expresion}, evaluated_paramsd, parent)
-        self.names = [name]
-        self.nets = element.paramsl[:-1]
-        self.values = [sympy.sympify(gm_value,sympy.abc._clash)]
+        self.names = (name,)
+        self.nets = element.nets(1)
+        self.values = (scs_parser.sympify(gm_value),)
 
 
 class CurrentControlledCurrentSource(CurrentSource):
     """Object with instance of current controlled current source of a circtuit
     """
+    __slots__ = ()
 
     def __init__(self, name, element, evaluated_paramsd, parent):
         """ Initialize CurrentControlledCurrentSource
@@ -203,20 +245,21 @@ class CurrentControlledCurrentSource(CurrentSource):
         """
         ai_expresion = element.paramsl[-1]
         ai_value = scs_parser.evaluate_param('_ai', {'_ai': ai_expresion}, evaluated_paramsd, parent)
-        self.names = [name, element.paramsl[-2]]
-        self.nets = element.paramsl[:-2]
-        self.values = [sympy.sympify(ai_value,sympy.abc._clash)]
+        self.names = (name, element.paramsl[-2])
+        self.nets = element.nets(2)
+        self.values = (scs_parser.sympify(ai_value),)
 
 
 class PassiveElement(Element):
     """ Object with instance of a passive element of a circuit
     """
-    None
+    __slots__ = ()
 
 
 class Resistance(PassiveElement):
     """Object with instance of a resitance of a circuit.
     """
+    __slots__ = ()
 
     def __init__(self, name, element, evaluated_paramsd, parent):
         """ Initialize Resistance
@@ -240,19 +283,20 @@ class Resistance(PassiveElement):
         if len(element.paramsl[:-1]) != 2:
             raise scs_errors.ScsElementError("Port list is too long or too short.")
         rvalue = scs_parser.evaluate_param('_r', {'_r': rvalue_expresion}, evaluated_paramsd, parent)
-        self.names = [name]
-        self.nets = element.paramsl[:-1]
-        self.values = [sympy.sympify(rvalue,sympy.abc._clash)]
+        self.names = (name,)
+        self.nets = element.nets(1)
+        self.values = (scs_parser.sympify(rvalue),)
 
     def conductance(self):
         """ Calculate the conductance of self
         """
-        return 1.0 / self.values[0]
+        return (1 if scs_parser.exact else 1.0) / self.values[0]
 
 
 class Capacitance(PassiveElement):
     """Object with instance of a capacitance of a circuit.
     """
+    __slots__ = ()
 
     def __init__(self, name, element, evaluated_paramsd, parent):
         """ Initialize Capacitance
@@ -276,9 +320,9 @@ class Capacitance(PassiveElement):
         if len(element.paramsl[:-1]) != 2:
             raise scs_errors.ScsElementError("Port list is too long or too short.")
         cvalue = scs_parser.evaluate_param('_c', {'_c': cvalue_expresion}, evaluated_paramsd, parent)
-        self.names = [name]
-        self.nets = element.paramsl[:-1]
-        self.values = [sympy.sympify(cvalue,sympy.abc._clash)]
+        self.names = (name,)
+        self.nets = element.nets(1)
+        self.values = (scs_parser.sympify(cvalue),)
 
     def conductance(self):
         """ Calculate the conductance of self
@@ -289,6 +333,7 @@ class Capacitance(PassiveElement):
 class Inductance(PassiveElement):
     """Object with instance of a inductance of a circuit.
     """
+    __slots__ = ()
 
     def __init__(self, name, element, evaluated_paramsd, parent):
         """ Initialize Inductace
@@ -312,14 +357,27 @@ class Inductance(PassiveElement):
         if len(element.paramsl[:-1]) != 2:
             raise scs_errors.ScsElementError("Port list is too long or too short.")
         lvalue = scs_parser.evaluate_param('_l', {'_l': lvalue_expresion}, evaluated_paramsd, parent)
-        self.names = [name]
-        self.nets = element.paramsl[:-1]
-        self.values = [sympy.sympify(lvalue,sympy.abc._clash)]
+        self.names = (name,)
+        self.nets = element.nets(1)
+        self.values = (scs_parser.sympify(lvalue),)
+
+    def conductance(self):
+        """ Calculate the conductance of self
+        """
+        return (1 if scs_parser.exact else 1.0) / (sympy.symbols('s') * self.values[0])
+
+
+class Admittance(PassiveElement):
+    """Object with admittance of passive elements merged by reduction of instance (scs_reduction)
+
+       It's made with generic Element initialization: names, nets and values with the admittance, not by parser.
+    """
+    __slots__ = ()
 
     def conductance(self):
         """ Calculate the conductance of self
         """
-        return 1.0 / (sympy.symbols('s') * self.values[0])
+        return self.values[0]
 
 
 # Dictionary of 1st letter of a name with appriopriate element object
@@ -331,5 +389,6 @@ elementd = {'r': Resistance, 'R': Resistance,
             'e': VoltageControlledVoltageSource, 'E': VoltageControlledVoltageSource,
             'g': VoltageControlledCurrentSource, 'G': VoltageControlledCurrentSource,
             'f': CurrentControlledCurrentSource, 'F': CurrentControlledCurrentSource,
-            'h': CurrentControlledVoltageSource, 'H': CurrentControlledVoltageSource
+            'h': CurrentControlledVoltageSource, 'H': CurrentControlledVoltageSource,
+            'n': Nullor, 'N': Nullor
             }
@@ -38,3 +38,8 @@ class ScsAnalysisError(BaseException):
     """
     pass
 
+
+class ScsTimeoutError(BaseException):
+    """ Error raised when a step of solving or analysis runs longer than its time budget.
+    """
+    pass
@@ -0,0 +1,129 @@
+"""
+Complexity governor
+
+Keeps runtime of costly symbolic steps bounded. Steps which only make expresions prettier (cancel while solving,
+factor and simplify in analyses, symbolic poles and zeros) are run through guarded, which skips the step when its input
+expresion has more operations than max_ops, or interrupts it when it runs longer than stage_timeout seconds, and then
+uses a cheaper fallback instead: keeping expresion as it is, or substituting numeric values before solving. Each taken
+fallback is logged as a warning and recorded in the trace event of the step and in the list returned by fallbacks(),
+which long running processes clear with reset() for each job (netlist of scs_batch.py, request of scs_service.py).
+
+Both limits are off by default, scs.py sets them with --max-ops and --stage-timeout options. Time budget works only
+where SIGALRM is available and in the main thread, elsewhere only the operations count is checked.
+"""
+import contextlib
+import logging
+import signal
+import threading
+
+import sympy
+
+import scs_errors
+
+__author__ = "Tomasz Kniola"
+__credits__ = ["Tomasz Kniola"]
+
+__license__ = "LGPL"
+__version__ = "0.0.1"
+__email__ = "kniola.tomasz@gmail.com"
+__status__ = "development"
+
+max_ops = None  # Operations count of input expresion above which step is skipped, None - no limit
+stage_timeout = None  # Time in seconds after which step is interrupted, None - no limit
+_fallbacks = []  # List of (step, reason) of fallbacks taken since last reset
+
+
+def configure(ops=None, timeout=None):
+    """ Sets limits of the governor
+
+        ops: operations count of input expresion above which step is skipped, None for no limit
+
+        timeout: time in seconds after which step is interrupted, None for no limit
+    """
+    global max_ops, stage_timeout
+    max_ops = ops
+    stage_timeout = timeout
+
+
+def fallbacks():
+    """ Returns list of (step, reason) pairs of fallbacks taken since last reset
+    """
+    return list(_fallbacks)
+
+
+def reset():
+    """ Forgets fallbacks taken so far
+    """
+    del _fallbacks[:]
+
+
+def _raise_timeout(signum, frame):
+    raise scs_errors.ScsTimeoutError("time budget of %s s exceeded" % stage_timeout)
+
+
+@contextlib.contextmanager
+def _time_budget():
+    """ Context manager raising ScsTimeoutError inside of its block when it runs longer than stage_timeout
+    """
+    if not stage_timeout or not hasattr(signal, 'setitimer') \
+            or threading.current_thread().name != 'MainThread':
+        yield
+        return
+    old_handler = signal.signal(signal.SIGALRM, _raise_timeout)
+    signal.setitimer(signal.ITIMER_REAL, stage_timeout)
+    try:
+        yield
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        signal.signal(signal.SIGALRM, old_handler)
+
+
+def _ops(expresion):
+    """ Counts operations of sympy expresion or matrix
+    """
+    if isinstance(expresion, sympy.MatrixBase):
+        return sum(sympy.count_ops(expr) for expr in expresion)
+    return sympy.count_ops(expresion)
+
+
+def guarded(step, function, fallback, expresion, event=None):
+    """ Runs costly step with limits of governor
+
+        step: name of the step for log and trace
+
+        function: function taking expresion and returning result of the step
+
+        fallback: cheaper function taking expresion, used when limit is exceeded
+
+        expresion: input sympy expresion of the step
+
+        event: optional trace event dictionary (from scs_trace.phase) to record taken fallback in
+
+        Returns function(expresion), or fallback(expresion) if expresion has more than max_ops operations or
+        the function took more than stage_timeout seconds.
+    """
+    if max_ops is not None:
+        ops = _ops(expresion)
+        if ops > max_ops:
+            return _fall_back(step, fallback, expresion, event, "expresion has %d operations" % ops)
+    try:
+        with _time_budget():
+            return function(expresion)
+    except scs_errors.ScsTimeoutError, e:
+        return _fall_back(step, fallback, expresion, event, str(e))
+
+
+def _fall_back(step, fallback, expresion, event, reason):
+    """ Records taken fallback and returns its result
+    """
+    logging.warning("Using fallback for %s: %s" % (step, reason))
+    _fallbacks.append((step, reason))
+    if event is not None:
+        event['fallback'] = reason
+    return fallback(expresion)
+
+
+def keep(expresion):
+    """ Fallback which leaves expresion as it is
+    """
+    return expresion
@@ -17,9 +17,25 @@ import sympy
 import copy
 import logging
 
+import scs_analysis
+import scs_approx
+import scs_backend
+import scs_ddd
+import scs_interpolation
+import scs_symmetry
 import scs_errors
 import scs_parser
 import scs_elements
+import scs_circuit
+import scs_governor
+import scs_trace
+
+# Dictionary of assembled equations (G_i, G_p, I matrices) with solutions (V0, Ap numerators and determinant) of instances, so instances
+# with the same equations (same subcircuit with the same parameters) are solved once, None if caching is off
+solution_cache = None
+solution_cache_size = 10000  # Number of solutions after which the cache is emptied
+solver = 'inverse'  # Name of engine solving equations of instances, key of solvers dictionary
+superposition = False  # Each independent source is a right hand side of its own, so its contribution can be probed (vsrc)
 
 class Instance(object):
     """ Instance class
@@ -56,14 +72,21 @@ class Instance(object):
         self.paramsd = {}               #dictionary of parameter values by their name
         self.parent = parent            
         self.name = name                
+        self.circuit_name = None        #name of instantiated subcircuit or macro model
         self.V = {}                     #dictionary of voltage values on net
         self.Vp = {}                    #dictionary of voltage values on port net
-        self.V0 = {}                    #dictionary of voltage values on inner net with zero port voltage vector
-        self.Ap = {}                    #dictionary form of attenuation matrix
+        self.V0 = {}                    #dictionary of numerators of voltage values on inner net with zero port voltage vector
+        self.Ap = {}                    #dictionary form of numerators of attenuation matrix
         self.Ap_m = None                #Attenutation matrix
         self.V0_m = None                #vector of voltages on inner nets with zero port voltage vector
+        self.determinant = sympy.S.One  #determinant of G_i, denominator shared by all entries of V0_m and Ap_m
         self.chained_ports = {}         #dictionary of port nets which are connected by voltage sources 
         self.used_voltage_sources = []  #list of used voltage sources durring  check_voltage_loops procedure
+        self.approximation = parent.approximation if parent else None  #scs_approx.Approximation when solved approximately
+        self.symmetry = {} if parent and parent.symmetry is not None else None  #declared pairs of symmetric nets, empty to find them, None if not used
+        self.sources = parent.sources if parent else {}  #dictionary of placeholders of independent sources with their names and values, shared by all instances
+        self.V0_sources = {}            #dictionary of names of sources with dictionaries of numerators of their contributions to V0
+        self.Vsrc = {}                  #dictionary of (net,source) pairs with contributions of sources to voltages on nets
 
     def add_element(self,element):
         """ Adds element to instance
@@ -299,8 +322,13 @@ class Instance(object):
             if element is ignore_element: continue             
             if isinstance(element,scs_elements.VoltageSource) and (net in element.nets[:2]):
                 if (not element in self.used_voltage_sources):
-                    if element.nets[0] in self.net_name_index:G_v[self.net_name_index[element.nets[0]]] += 1
-                    if element.nets[1] in self.net_name_index: G_v[self.net_name_index[element.nets[1]]] += -1  
+                    if isinstance(element,scs_elements.Nullor):
+                        #Nullator equation V(in+) - V(in-) = 0 replaces equation of norator net
+                        if element.nets[2] in self.net_name_index: G_v[self.net_name_index[element.nets[2]]] += 1
+                        if element.nets[3] in self.net_name_index: G_v[self.net_name_index[element.nets[3]]] += -1
+                    else:
+                        if element.nets[0] in self.net_name_index:G_v[self.net_name_index[element.nets[0]]] += 1
+                        if element.nets[1] in self.net_name_index: G_v[self.net_name_index[element.nets[1]]] += -1  
                     if isinstance(element,scs_elements.VoltageControlledVoltageSource):
                         if element.nets[2] in self.net_name_index: G_v[self.net_name_index[element.nets[2]]] += -element.values[0]
                         if element.nets[3] in self.net_name_index: G_v[self.net_name_index[element.nets[3]]] += +element.values[0]
@@ -315,7 +343,7 @@ class Instance(object):
                         self.update_current_v(ref_element,ref_net,G_vx,Ix)
                         I[0] += Ix[0]*r
                         for i in range(len(G_v)): G_v[i] += r*G_vx[i]
-                    else: I[0] += element.values[0]
+                    elif not isinstance(element,scs_elements.Nullor): I[0] += self._source_value(element)
                     self.used_voltage_sources.append(element)
                     updated = True
                     break
@@ -373,56 +401,247 @@ class Instance(object):
             Vi = Ap*Vp + V0
             
             Thus we update G matrix (write the equations), and by doing linear algebra we calculate the results.
+
+            All entries of Ap and V0 have determinant of G_i as denominator, solvers give their numerators and the
+            determinant, which is kept as one shared factor (see _over_determinant).
             
         """
-        for subname,subinstance in self.subinstances.iteritems():
-            subinstance.solve()       
-        
-        N = len(self.nets)
-        Ni = len(self.inner_nets)
-        Np = len(self.port_nets)
-        for i in range(N):
-            self.net_name_index.update({self.nets[i]:i})
-    
-        G_m = []
-        I_v = []
-        self.used_voltage_sources = []        
-
-        for net in self.inner_nets:
-            G_v = [0 for i in range(len(self.nets))]
-            I = [0]
-            if not self.update_eq_with_vs(net,G_v,I):
-                for element in self.elements_on_net[net]:
-                    self.update_current_v(element,net,G_v,I)
-            #G_m.append(G_v)
-            G_m.append([sympy.cancel(tmp) for tmp in G_v])
-            I_v.append([sympy.cancel(tmp) for tmp in I])
+        with scs_trace.phase('solve',instance=self.hier_name()) as event:
+            for subname,subinstance in self.subinstances.iteritems():
+                subinstance.solve()       
             
-        #Make and slice the Matrix G_M = [G_i | G_p]
-        G_m = sympy.Matrix(G_m)
-        I_v = sympy.Matrix(I_v)
-        G_i = G_m[:,:Ni]
-        G_p = G_m[:,Ni:]
-                
-        # G_i*V_i + G_p*V_p  = I_v
-        # V_i = G_i^-1 I_v - G_i^-1 * G_p * V_p
-        # V_i = Vo +Ap * vp
-        try:
-            G_i_inv = G_i.inv() 
-        except ValueError, e:
-            raise scs_errors.ScsElementError("%s is ill conditioned, and has no unique solution." % self.name if self.name else "TOP INSTANCE")
-        self.V0_m = G_i_inv*I_v
-        self.Ap_m = -G_i_inv*G_p
-
-        #Translate those into dictionaries
-        for i in range(Ni):
-            self.V0.update({self.inner_nets[i]:self.V0_m[i]})
+            N = len(self.nets)
+            Ni = len(self.inner_nets)
+            Np = len(self.port_nets)
+            event.update({'inner_nets':Ni,'port_nets':Np})
+            for i in range(N):
+                self.net_name_index.update({self.nets[i]:i})
         
-        for j in range(Np):
-            tmp_dict = {}
+            with scs_trace.phase('assembly',instance=self.hier_name()) as assembly_event:
+                G_m = []
+                I_v = []
+                self.used_voltage_sources = []        
+
+                for net in self.inner_nets:
+                    G_v = [0 for i in range(len(self.nets))]
+                    I = [0]
+                    if not self.update_eq_with_vs(net,G_v,I):
+                        for element in self.elements_on_net[net]:
+                            self.update_current_v(element,net,G_v,I)
+                    #G_m.append(G_v)
+                    G_m.append([scs_governor.guarded('cancel',scs_backend.backend.cancel,scs_governor.keep,tmp,assembly_event) for tmp in G_v])
+                    I_v.append([scs_governor.guarded('cancel',scs_backend.backend.cancel,scs_governor.keep,tmp,assembly_event) for tmp in I])
+                    
+                #Make and slice the Matrix G_M = [G_i | G_p]
+                G_m = sympy.Matrix(G_m)
+                I_v = sympy.Matrix(I_v)
+                G_i = G_m[:,:Ni]
+                G_p = G_m[:,Ni:]
+                if superposition and Ni:
+                    I_v,source_names,placeholders,values = self._split_sources(I_v,assembly_event)
+                    assembly_event['sources'] = I_v.cols
+                scs_trace.measure(assembly_event,'G',G_m)
+                scs_trace.measure(assembly_event,'I',I_v)
+                    
+            # G_i*V_i + G_p*V_p  = I_v
+            # V_i = G_i^-1 I_v - G_i^-1 * G_p * V_p
+            # V_i = Vo +Ap * vp
+            if solution_cache is not None:
+                key = (G_i.as_immutable(),G_p.as_immutable(),I_v.as_immutable(),
+                       self.approximation.key() if self.approximation else None,solver,scs_backend.backend.name,
+                       tuple(sorted(self.symmetry.items())) if self.symmetry is not None else None)
+                solution = solution_cache.get(key)
+            else:
+                solution = None
+            if solution:
+                event['cached'] = True
+            else:
+                if self.approximation:
+                    solution = self.approximation.solve(G_i,G_p,I_v,self._solution,self.hier_name(),event)
+                else:
+                    solution = self._solution(G_i,G_p,I_v)
+                if solution_cache is not None:
+                    if len(solution_cache) >= solution_cache_size:
+                        solution_cache.clear()
+                    solution_cache[key] = solution
+            V0_n,Ap_n,self.determinant = solution
+            if superposition and Ni:
+                #Columns of sources are kept apart, V0 of parents is split again by placeholders
+                for k,name in enumerate(source_names):
+                    if name is not None:
+                        self.V0_sources.update({name:dict((self.inner_nets[i],V0_n[i,k]*values[k]) for i in range(Ni))})
+                self.V0_m = (V0_n*sympy.Matrix(placeholders)).applyfunc(self._over_determinant)
+                V0_n = V0_n*sympy.Matrix(values)
+            else:
+                self.V0_m = V0_n.applyfunc(self._over_determinant)
+            self.Ap_m = Ap_n.applyfunc(self._over_determinant)
+
+            #Translate numerators into dictionaries
             for i in range(Ni):
-                tmp_dict.update({self.inner_nets[i]:self.Ap_m[i,j]})
-            self.Ap.update({self.port_nets[j]:tmp_dict})
+                self.V0.update({self.inner_nets[i]:V0_n[i]})
+            
+            for j in range(Np):
+                tmp_dict = {}
+                for i in range(Ni):
+                    tmp_dict.update({self.inner_nets[i]:Ap_n[i,j]})
+                self.Ap.update({self.port_nets[j]:tmp_dict})
+
+    def _source_value(self,element):
+        """ Value of independent source element, or in superposition mode its placeholder symbol, registered in sources
+        """
+        if not superposition:
+            return element.values[0]
+        name = '%s.%s' % (self.hier_name(),element.names[0]) if self.parent else element.names[0]
+        placeholder = sympy.Symbol('{%s}' % name)
+        self.sources.update({placeholder:(name,element.values[0])})
+        return placeholder
+
+    def _source_values(self,expresion):
+        """ Expresion with placeholders of sources replaced by their values
+        """
+        if not self.sources:
+            return expresion
+        return sympy.sympify(expresion).xreplace(dict((placeholder,value) for placeholder,(name,value) in self.sources.iteritems()))
+
+    def _split_sources(self,I_v,event=None):
+        """ Splits right hand side of equations into columns, one for each independent source (superposition)
+
+            I_v: vector of right hand side, with placeholders of sources (see _source_value)
+
+            Returns tuple of matrix of columns, list of names of their sources, and lists of placeholders and values of
+            sources by which columns are multiplied to give I_v back. Part of I_v which doesn't come from placeholders
+            (currents of macro models) is the last column, with None for name and 1 for placeholder and value, it's
+            also made when there are no sources, so there is always a column.
+        """
+        cancel = lambda expr: scs_governor.guarded('cancel',scs_backend.backend.cancel,scs_governor.keep,expr,event)
+        placeholders = sorted(I_v.free_symbols & set(self.sources),key=str)
+        columns = [I_v.diff(placeholder).applyfunc(cancel) for placeholder in placeholders]
+        names = [self.sources[placeholder][0] for placeholder in placeholders]
+        values = [self.sources[placeholder][1] for placeholder in placeholders]
+        rest = I_v.xreplace(dict((placeholder,0) for placeholder in placeholders)).applyfunc(cancel)
+        if any(rest) or not placeholders:
+            columns.append(rest)
+            names.append(None)
+            placeholders.append(sympy.S.One)
+            values.append(sympy.S.One)
+        return sympy.Matrix.hstack(*columns),names,placeholders,values
+
+    def _solution(self,G_i,G_p,I_v):
+        """ Solves equations G_i*V_i + G_p*V_p = I_v into V_i = V0 + Ap*V_p with engine chosen by solver
+
+            G_i, G_p, I_v: matrices of equations
+
+            Returns tuple of numerators of V0 and Ap matrices and their determinant. If G_i is singular raise an error.
+            When symmetry is used and equations are symmetric, they are solved as two half circuits (scs_symmetry).
+        """
+        engine = lambda G_i,G_p,I_v: solvers[solver](self,G_i,G_p,I_v)
+        if self.symmetry is not None:
+            pairs = scs_symmetry.find_pairs(G_i,self.inner_nets,self.symmetry)
+            if pairs:
+                logging.info("Solving %s as common and differential mode halves, symmetric nets: %s" %
+                             (self.hier_name(),', '.join('%s-%s' % (self.inner_nets[a],self.inner_nets[b]) for a,b in pairs)))
+                return scs_symmetry.solve(G_i,G_p,I_v,pairs,engine)
+            elif self.symmetry:
+                logging.warning("Nets declared by .symmetry aren't symmetric, solving %s whole" % self.hier_name())
+        return engine(G_i,G_p,I_v)
+
+    def _inverse_solution(self,G_i,G_p,I_v):
+        """ Solves equations by inverting G_i: V0 = G_i^-1*I_v, Ap = -G_i^-1*G_p
+
+            Inverse is adjugate over determinant, both found by backend (in sympy by division free Berkowitz
+            algorithm), numerators are products of adjugate, left unexpanded so common factors (like source values)
+            stay visible. Berkowitz algorithm adds and subtracts products of entries, so terms which should cancel
+            leave float noise (like a constant term of determinant of a ladder with numeric values), and fraction free
+            elimination of the field backend needs exact divisions; floats of G_i are made rationals for both and
+            adjugate and determinant are turned back into floats.
+        """
+        with scs_trace.phase('inversion',instance=self.hier_name()) as inversion_event:
+            backend = scs_backend.backend
+            floats = any(entry.has(sympy.Float) for entry in G_i)
+            if floats:
+                G_i = G_i.applyfunc(lambda entry: sympy.nsimplify(entry,rational=True))
+            determinant,G_i_adj = backend.det_adjugate(G_i)
+            cancel = lambda expr: scs_governor.guarded('cancel',backend.cancel,scs_governor.keep,expr,inversion_event)
+            if not backend.cancelled:
+                determinant = cancel(determinant)
+            if determinant == 0:
+                raise scs_errors.ScsElementError("%s is ill conditioned, and has no unique solution." % self.name if self.name else "TOP INSTANCE")
+            if not backend.cancelled:
+                G_i_adj = G_i_adj.applyfunc(cancel)
+            if floats:
+                determinant = determinant.evalf()
+                G_i_adj = G_i_adj.applyfunc(lambda entry: entry.evalf())
+            scs_trace.measure(inversion_event,'G_adj',G_i_adj)
+        with scs_trace.phase('product',instance=self.hier_name()) as product_event:
+            V0_m = G_i_adj*I_v
+            Ap_m = -G_i_adj*G_p
+            scs_trace.measure(product_event,'V0',V0_m)
+            scs_trace.measure(product_event,'Ap',Ap_m)
+        return V0_m,Ap_m,determinant
+
+    def _ddd_solution(self,G_i,G_p,I_v):
+        """ Solves equations with determinant decision diagrams of G_i and Cramer's rule, look at scs_ddd
+        """
+        with scs_trace.phase('product',instance=self.hier_name()) as product_event:
+            try:
+                V0_m,Ap_m,determinant,diagram = scs_ddd.solve(G_i,G_p,I_v)
+            except ValueError, e:
+                raise scs_errors.ScsElementError("%s is ill conditioned, and has no unique solution." % self.name if self.name else "TOP INSTANCE")
+            product_event['vertices'] = diagram.size()
+            scs_trace.measure(product_event,'V0',V0_m)
+            scs_trace.measure(product_event,'Ap',Ap_m)
+        return V0_m,Ap_m,determinant
+
+    def _interpolation_solution(self,G_i,G_p,I_v):
+        """ Solves equations numerically at many points of s and interpolates polynomials, look at scs_interpolation
+
+            Instances with too many symbols left, with inaccurate interpolation, or without inner nets, are solved by
+            inversion.
+        """
+        solution = None
+        if G_i.rows:
+            with scs_trace.phase('product',instance=self.hier_name()) as product_event:
+                try:
+                    solution = scs_interpolation.solve(G_i,G_p,I_v)
+                except ValueError, e:
+                    raise scs_errors.ScsElementError("%s is ill conditioned, and has no unique solution." % self.name if self.name else "TOP INSTANCE")
+                if solution:
+                    V0_m,Ap_m,determinant,product_event['points'] = solution
+                    scs_trace.measure(product_event,'V0',V0_m)
+                    scs_trace.measure(product_event,'Ap',Ap_m)
+            if not solution:
+                logging.warning("Can't interpolate %s (too many symbols or inaccurate), solving it by inversion" % self.hier_name())
+        if not solution:
+            return self._inverse_solution(G_i,G_p,I_v)
+        return V0_m,Ap_m,determinant
+
+    def _over_determinant(self,numerator):
+        """ Value of numerator over determinant of the instance
+
+            numerator: sympy expresion, e.g. sum of voltages of the instance multiplied by determinant
+
+            Determinant stays a single factor, so ratios of values of the same instance, like v(out)/v(in), cancel
+            it right away, without gcd computations in analyses.
+        """
+        if self.determinant == 1:
+            return numerator
+        return sympy.Mul(numerator,sympy.Pow(self.determinant,-1))
+
+    def _over_determinant_sum(self,terms):
+        """ Sum of values of the instance (terms) as one numerator over determinant of the instance
+        """
+        if self.determinant == 1:
+            return sympy.Add(*terms)
+        return self._over_determinant(sympy.Add(*[term*self.determinant for term in terms]))
+
+    def hier_name(self):
+        """ Name of instance in dot notation starting from top instance, 'top' for top instance itself
+        """
+        if not self.parent:
+            return 'top'
+        elif not self.parent.parent:
+            return self.name
+        return '%s.%s' % (self.parent.hier_name(),self.name)
              
     def adjoint_elements(self,refelement,net):
         """ Provides list of pairs of element,net that are adjoint to reference element on provided net
@@ -486,7 +705,8 @@ class Instance(object):
                 for i in range(len(G_vx)): G_v[i] += a*G_vx[i]
                 I[0] += a*Ix[0]
             elif isinstance(element,scs_elements.CurrentSource):
-                I[0] += (element.values[0] if element.nets[0] == net else -element.values[0])
+                value = self._source_value(element)
+                I[0] += (value if element.nets[0] == net else -value)
         elif isinstance(element,Instance):
                 port_nets = inv_map(element.port_map)[net]
                 #Check if it is connected, if it is we need to take into account the chain voltage, not current
@@ -530,12 +750,16 @@ class Instance(object):
         
         G_v = [0 for i in range(N)]
         I = [0]
-        G_v[self.net_name_index[element.nets[0]]] = 1
-        G_v[self.net_name_index[element.nets[1]]] = -1  
+        if isinstance(element,scs_elements.Nullor):
+            G_v[self.net_name_index[element.nets[2]]] = 1
+            G_v[self.net_name_index[element.nets[3]]] = -1
+        else:
+            G_v[self.net_name_index[element.nets[0]]] = 1
+            G_v[self.net_name_index[element.nets[1]]] = -1  
         if isinstance(element,scs_elements.VoltageControlledVoltageSource):
             G_v[self.net_name_index[element.nets[2]]] = element.values[0]
             G_v[self.net_name_index[element.nets[3]]] = -element.values[0]                                   
-        else: I = [element.values[0]]
+        elif not isinstance(element,scs_elements.Nullor): I = [self._source_value(element)]
         
         G_v1,G_v2 = G_v[:Ni],G_v[Ni:]
         G_v1m,G_v2m = sympy.Matrix(G_v1),sympy.Matrix(G_v2)
@@ -618,12 +842,13 @@ class Instance(object):
             for other_port in other_ports:
                 for other_port_element in self.elements_on_net[element.port_map[other_port]]:
                     if not other_port_element is element: self.update_current_v(other_port_element,element.port_map[other_port],G_v,I)
+            terms = [self._source_values(I[0])]
             i = 0
             for g in G_v:
                 if g:
-                    I[0] += g*self.v(self.nets[i])
+                    terms.append(g*self.v(self.nets[i]))
                 i += 1
-            return I[0]
+            return self._over_determinant_sum(terms)
             #return sympy.factor(I[0],sympy.symbols('s'))
             #return I[0].simplify()
             #return sympy.powsimp(I[0])
@@ -648,14 +873,15 @@ class Instance(object):
         if len(hier_inst) == 1:
             if hier_inst[0] in self.elements:
                 G_v,I = self.current_v(self.elements[hier_inst[0]],self.elements[hier_inst[0]].nets[0])
+                terms = [-self._source_values(I[0])]
                 i = 0
                 for g in G_v:
                     if g:
-                        I[0] -= g*self.v(self.nets[i])
+                        terms.append(g*self.v(self.nets[i]))
                     i += 1
                 #return sympy.factor(I[0],sympy.symbols('s'))
                 #return I[0].simplify()
-                return -I[0]
+                return self._over_determinant_sum(terms)
             else: 
                 raise scs_errors.ScsInstanceError("Can't find element %s in %s" % (hier_inst[0],self.name if self.name else "TOP INSTANCE"))
         else:
@@ -674,7 +900,7 @@ class Instance(object):
 
             net2: 2nd voltage net name, can be in dot notation
             
-            Instance need to be solved to use this function.
+            Instance need to be solved to use this function. Voltage is one numerator over determinant of the instance.
         """
         hier_net_1 = net1.split('.') if net1 else None
         hier_net_2 = net2.split('.') if net2 else None
@@ -693,7 +919,7 @@ class Instance(object):
                                 if port not in self.Vp:
                                     self.Vp.update({port:self.parent.v(self.port_map[port])})                                        
                                 vx += ap*self.Vp[port]
-                        self.V.update({net:vx})
+                        self.V.update({net:self._over_determinant(vx)})
                     elif net in self.port_nets:
                         if net not in self.Vp:
                             self.Vp.update({net:self.parent.v(self.port_map[net])})
@@ -716,8 +942,160 @@ class Instance(object):
                 v.append(0)            
         #return sympy.factor(v[0]-v[1],sympy.symbols('s'))
         #return (v[0]-v[1]).simplify()                                      
-        return v[0]-v[1]
+        return self._over_determinant_sum([v[0],-v[1]])
         #return sympy.cancel(v[0]-v[1])
+
+    def vsrc(self,net,source):
+        """ Contribution of independent source to voltage of net (superposition mode)
+
+            net: net name, can be in dot notation
+
+            source: name of voltage or current source in dot notation from top instance, e.g. Vp or x1.I1
+
+            Voltage of net with all other sources set to zero, so contributions of all sources add up to v(net).
+            Instance need to be solved to use this function. Returns one numerator over determinant of the instance.
+        """
+        if not superposition:
+            raise scs_errors.ScsInstanceError("Contributions of sources are known only in superposition mode")
+        if source not in set(name for name,value in self.sources.itervalues()):
+            raise scs_errors.ScsInstanceError("No independent source %s" % source)
+        hier_net = net.split('.')
+        if len(hier_net) > 1:
+            hier_instance = self
+            for hier_name in hier_net[:-1]:
+                if hier_name in hier_instance.subinstances:
+                    hier_instance = hier_instance.subinstances[hier_name]
+                else:
+                    raise scs_errors.ScsInstanceError("No %s subinstance in %s" %(hier_name,self.name if self.name else "TOP INSTANCE"))
+            return hier_instance.vsrc(hier_net[-1],source)
+        if (net,source) not in self.Vsrc:
+            if net in self.inner_nets:
+                vx = self.V0_sources[source][net] if source in self.V0_sources else 0
+                for port,Ap in self.Ap.iteritems():
+                    if Ap[net]:
+                        vx += Ap[net]*self.parent.vsrc(self.port_map[port],source)
+                self.Vsrc.update({(net,source):self._over_determinant(vx)})
+            elif net in self.port_nets:
+                self.Vsrc.update({(net,source):self.parent.vsrc(self.port_map[net],source)})
+            elif net == '0' and not self.parent:
+                self.Vsrc.update({(net,source):0})
+            else:
+                raise scs_errors.ScsInstanceError("No net %s in %s" %(net,self.name if self.name else "TOP INSTANCE"))
+        return self.Vsrc[(net,source)]
+
+    def expresion(self,expresion,subst=None):
+        """ Value of an expresion written like in analyses, e.g. 'v(out)/v(in)' or 'i(R1)*v(1,2)'
+
+            expresion: expresion string
+
+            subst: optional dictionary of symbols names with values (numbers, sympy expresions or strings like in netlist)
+
+            Instance need to be solved to use this function. Returns sympy expresion.
+        """
+        tokens = scs_parser.parse_analysis_expresion(expresion)
+        value = scs_parser.sympify(scs_parser.results2values(tokens,self))
+        if subst:
+            value = value.subs([(sympy.Symbol(symbol),scs_parser.evaluate_expresion(number,{}) if isinstance(number,basestring) else number)
+                                for symbol,number in subst.iteritems()])
+        return value
+
+    def function(self,expresion,variables,subst=None):
+        """ Numeric function of an expresion, evaluating its common subexpresions once (scs_analysis.cse_lambdify)
+
+            expresion: expresion string, like for expresion method
+
+            variables: list of names of symbols which will be arguments of function, 'f' is a frequency: s = 2*pi*I*f
+
+            subst: dictionary of other symbols with values, like for expresion method
+
+            Returns function of variables, which takes numbers or numpy arrays. If any symbol is left without value
+            raise an error.
+        """
+        value = self.expresion(expresion,subst)
+        if 'f' in variables:
+            value = value.subs(sympy.Symbol('s'),2*sympy.pi*sympy.I*sympy.Symbol('f'))
+        left = value.free_symbols-set(sympy.Symbol(variable) for variable in variables)
+        if left:
+            raise scs_errors.ScsInstanceError("No values for symbols: %s" % ', '.join(sorted(str(sym) for sym in left)))
+        return scs_analysis.cse_lambdify(variables,value)
+# Dictionary of names of engines solving equations of instances with their functions
+solvers = {'inverse': Instance._inverse_solution,
+           'ddd': Instance._ddd_solution,
+           'interpolation': Instance._interpolation_solution}
+
+class MacroInstance(Instance):
+    """ Instance of a macro model
+
+        Macro model is a subcircuit pre-solved into its port level description (see make_macromodel), so instance has no
+        elements and no inner nets, just port currents as linear function of port voltages:
+        I_port = G_port*Vp + I0_port
+        Parameters of the model are substituted with values evaluated for this instance. Instance is solved from the
+        start, only port nets can be probed.
+    """
+    def __init__(self,parent,name,port_map,macromodel,paramsd):
+        """ Initialization of MacroInstance object
+
+            parent: parent instance
+
+            name: instance name
+
+            port_map: pair of port_net parent_net names
+
+            macromodel: scs_circuit.MacroModel object being instantiated
+
+            paramsd: evaluated parameters of an instance
+        """
+        Instance.__init__(self,parent,name,port_map)
+        self.paramsd = paramsd
+        self.circuit_name = macromodel.name
+        self.G = {}                     #dictionary of conductance dictionaries of port currents
+        self.I = {}                     #dictionary of port currents with zero port voltage vector
+        for port,G_pd in macromodel.G.iteritems():
+            self.G.update({port:dict((p,_substitute_params(g,paramsd)) for p,g in G_pd.iteritems())})
+            self.I.update({port:_substitute_params(macromodel.I[port],paramsd)})
+            self.elements_on_net.update({port:[]})
+        self.chained_ports = macromodel.chained_ports
+        self.connected_ports = macromodel.connected_ports
+        self._prepare_nets()
+
+    def nets_not_connected_to_gnd(self,connected_nets):
+        """ Provides a dictionary of nets that aren't connected to ground.
+
+            connected_nets: dictionary of nets which are already known to be connected
+
+            Connections between ports were found while making the model, so its just extending the list of connected
+            ports. Model has no inner nets so nothing can be disconnected.
+        """
+        for net in connected_nets[0]:
+            for port in self.connected_ports[net]:
+                if port not in connected_nets[0]: connected_nets[0].append(port)
+        return {}
+
+    def _loops_and_chained_ports(self):
+        """ Model is free of voltage loops and chained ports are stored in a model.
+        """
+        return {0:[]}
+
+    def solve(self):
+        """ Macro model is solved already.
+        """
+        pass
+
+    def port_voltage(self,port,element):
+        """ Macro model has no voltage sources left for parent to use.
+        """
+        raise scs_errors.ScsInstanceError("No voltage source on port %s of macro model instance %s" % (port,self.name))
+
+    def port_current(self,port):
+        """ Port current of macro model
+
+            port: net for which we write equation (name as in subinstance)
+
+            Returns conductance dictionary, current for zero port voltages and list of other ports current through which
+            we needs to add, like in Instance.port_current.
+        """
+        return self.G[port],self.I[port],self.chained_ports[port]
+
 def _contract_chains(chains):
     """ Contracts chains in list into larger chains if are connected
 
@@ -812,6 +1190,122 @@ def make_top_instance(circuit):
         logging.error(e)
         return None
 
+def solve_circuit(circuit):
+    """ Instantiates, checks and solves top circuit, parsed or built with methods of Circuit (add, subcircuit, param)
+
+        circuit: top circuit
+
+        Returns solved top instance, on which expresion, function, v and i could be called. If circuit can't be
+        instantiated, isn't well-formed or can't be solved raise an error.
+    """
+    inst = make_instance(None,None,circuit)
+    if not inst.check_path_to_gnd() or not inst.check_voltage_loop():
+        raise scs_errors.ScsInstanceError("Circuit check failed, look at log for details")
+    inst.solve()
+    return inst
+
+def getMacroModel(name,circuit):
+    """ Get macro model by a name from a dictionary.
+
+        name: name of macro model to get
+
+        circuit: circuit of which dictionary of macro models will be searched for the name
+
+        If the name isn't in the circuit dictionary, parent (if exists) will be search as well.
+        Returns said macro model or None if there isn't any with such name.
+    """
+    if name in circuit.macromodelsd:
+        return circuit.macromodelsd[name]
+    elif circuit.parent:
+        return getMacroModel(name,circuit.parent)
+    else:
+        return None
+
+def _substitute_params(expresion,paramsd):
+    """ Substitutes parameters symbols in expresion with their values
+
+        expresion: sympy expresion in which parameter are substituted
+
+        paramsd: dictionary of parameter values by their name
+
+        Substitution is done in one go, so values can contain the same symbols as names of parameters. Infinite values
+        (like default pole='1/0' of opamp library) are taken as a limit, which is what solving the circuit with those
+        values would give.
+    """
+    subs = {}
+    for param,value in paramsd.iteritems():
+        symbol,value = sympy.Symbol(param),sympy.sympify(value)
+        if symbol not in expresion.free_symbols: continue
+        if value.has(sympy.zoo,sympy.oo,-sympy.oo):
+            expresion = sympy.limit(expresion,symbol,sympy.oo)
+        else:
+            subs.update({symbol:value})
+    return expresion.xreplace(subs)
+
+def make_macromodel(circuit,name):
+    """ Pre-solves a subcircuit into a macro model
+
+        circuit: circuit where the subcircuit definition will be searched for
+
+        name: name of a subcircuit
+
+        Subcircuit is instantiated once with all its parameters left as symbols and solved, so its port currents are
+        known as a linear function of port voltages (see Instance.port_current). Those are stored in
+        scs_circuit.MacroModel which make_instance will instantiate instead of subcircuit elements, so the model doesn't
+        need to be solved in each design again. Inner nets and elements are not accessible in the model.
+        Returns macro model, raises ScsInstanceError if the subcircuit can't be modeled.
+    """
+    subcircuit = getSubcircuit(name,circuit)
+    if not subcircuit:
+        raise scs_errors.ScsInstanceError("Error: no subcircuit definition of: %s found" % name)
+    # Placeholder parent, so instance is treated as any other subinstance
+    top = Instance(None,None)
+    try:
+        top.paramsd = scs_parser.evaluate_params(circuit.parametersd)
+    except scs_errors.ScsParameterError, e:
+        raise scs_errors.ScsInstanceError("Error evaluating parametrs in %s circuit. %s" % (circuit.name,e))
+    inst = Instance(top,name,dict((port,port) for port in subcircuit.ports))
+    inst.paramsd = dict((param,sympy.symbols(param)) for param in subcircuit.parametersd)
+    _make_instance_contents(inst,subcircuit)
+    inst._prepare_nets()
+
+    loops = inst._flat_net_hier(inst._loops_and_chained_ports())
+    if loops:
+        raise scs_errors.ScsInstanceError("Error: voltage loop on nets: %s in %s subcircuit" % (loops[0],name))
+    inst.solve()
+
+    G,I,connected_ports = {},{},{}
+    for port in inst.port_nets:
+        for element in _unused_voltage_sources(inst,port):
+            raise scs_errors.ScsInstanceError("Error: voltage source %s on port %s of %s subcircuit can't be modeled"
+                                              % (element.names[0],port,name))
+        G_pd,I_port,_ = inst.port_current(port)
+        G.update({port:dict((p,scs_governor.guarded('cancel',scs_backend.backend.cancel,scs_governor.keep,g)) for p,g in G_pd.iteritems())})
+        I.update({port:scs_governor.guarded('cancel',scs_backend.backend.cancel,scs_governor.keep,inst._source_values(I_port))})
+        not_connected_nets = inst.nets_not_connected_to_gnd({0:[port]})
+        not_connected_nets = not_connected_nets[0] if 0 in not_connected_nets else []
+        connected_ports.update({port:[p for p in inst.port_nets if p != port and p not in not_connected_nets]})
+    return scs_circuit.MacroModel(name,subcircuit.ports,subcircuit.parametersd,G,I,inst.chained_ports,connected_ports)
+
+def _unused_voltage_sources(inst,port):
+    """ Provides list of voltage sources on port which weren't used while solving an instance
+
+        inst: solved instance
+
+        port: port net of an instance
+
+        Such voltage source would need to be used by parent to write its equations (see update_eq_with_vs), voltage
+        sources of subinstances connected to the port are looked for as well.
+    """
+    unused = []
+    for element in inst.elements_on_net[port]:
+        if isinstance(element,scs_elements.VoltageSource):
+            if port in element.nets[:2] and element not in inst.used_voltage_sources: unused.append(element)
+        elif isinstance(element,Instance):
+            for subport in inv_map(element.port_map)[port]:
+                unused += _unused_voltage_sources(element,subport)
+    return unused
+
 def make_instance(parent,name,circuit,port_map={},passed_paramsd={}):
     """ Makes an instance of a circuit
 
@@ -829,16 +1323,56 @@ def make_instance(parent,name,circuit,port_map={},passed_paramsd={}):
         Returns instance of a circuit or None if some error does apper.
     """
     inst = Instance(parent,name,port_map)
+    inst.circuit_name = circuit.name
     try:
         inst.paramsd = scs_parser.evaluate_params(circuit.parametersd,parent)
+        if not parent:
+            inst.approximation = scs_approx.make_approximation(getattr(circuit,'approxd',None))
+            inst.symmetry = getattr(circuit,'symmetryd',None)
     except scs_errors.ScsParameterError, e:
         raise scs_errors.ScsInstanceError("Error evaluating parametrs in %s subcircuit. %s" % (circuit.name,e))
     inst.paramsd.update(passed_paramsd)
+    _make_instance_contents(inst,circuit)
+    inst._prepare_nets()
+    return inst            
+
+def make_macro_instance(parent,name,macromodel,port_map,passed_paramsd):
+    """ Makes an instance of a macro model
+
+        parent: parent of an instance
+
+        name: a name string for new instance
+
+        macromodel: macro model which will be instantiated
+
+        port_map: dictionary of instance_net:parent_net pairs
+
+        passed_paramsd: parameters that are being passed to subinstance while instantiating it
+
+        Default parameters of a model are evaluated like in make_instance and overwritten by passed ones.
+    """
+    try:
+        paramsd = scs_parser.evaluate_params(macromodel.parametersd,parent)
+    except scs_errors.ScsParameterError, e:
+        raise scs_errors.ScsInstanceError("Error evaluating parametrs in %s macro model. %s" % (macromodel.name,e))
+    paramsd.update(passed_paramsd)
+    return MacroInstance(parent,name,port_map,macromodel,paramsd)
+
+def _make_instance_contents(inst,circuit):
+    """ Makes elements and subinstances of an instance
+
+        inst: instance being filled, its parameters need to be evaluated
+
+        circuit: circuit which is instantiated
+
+        Subinstances of macro models are made in place of subcircuits with the same name.
+    """
+    parent,name = inst.parent,inst.name
     for ename,element in circuit.elementsd.iteritems():
         if ename[0] in ['x','X']:   
             subcir_name = element.paramsl[-1]        
             
-            subcircuit = getSubcircuit(subcir_name,circuit)       
+            subcircuit = getMacroModel(subcir_name,circuit) or getSubcircuit(subcir_name,circuit)
             if subcircuit:
                 subcir_portl = element.paramsl[:-1] 
                 portmap = {}
@@ -853,7 +1387,10 @@ def make_instance(parent,name,circuit,port_map={},passed_paramsd={}):
                 except scs_errors.ScsParameterError, e:
                     raise scs_errors.ScsInstanceError("Error evaluating parametrs for instance: %s in %s subcircuit. %s" % (subcir_name,circuit.name,e))                    
                 
-                sub_inst = make_instance(inst,ename,subcircuit,portmap,eps)
+                if isinstance(subcircuit,scs_circuit.MacroModel):
+                    sub_inst = make_macro_instance(inst,ename,subcircuit,portmap,eps)
+                else:
+                    sub_inst = make_instance(inst,ename,subcircuit,portmap,eps)
                 inst.add_sub_instance(sub_inst)
             else:
                 raise scs_errors.ScsInstanceError("Error: no subcircuit definition of: %s found for instance %s in %s subcircuit"
@@ -867,7 +1404,5 @@ def make_instance(parent,name,circuit,port_map={},passed_paramsd={}):
         else:
             raise scs_errors.ScsInstanceError("Error: no element of that type: %s. Strange should have been cought by parser?"   
                   % (ename))
-    inst._prepare_nets()
-    return inst            
 
-            
\ No newline at end of file
+            
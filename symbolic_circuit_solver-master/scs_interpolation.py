@@ -0,0 +1,226 @@
+"""
+Interpolation solver engine
+
+When parameters of a circuit have numeric values (.param gm=1m) and only s, or s and a few symbols, stay symbolic,
+exact elimination is wasteful. This engine solves equations of an instance numerically, at many points, and rebuilds
+polynomials in s (and in other symbols) from those values:
+
+- each row of equations is multiplied by least common multiple of denominators of its entries, so all entries are
+  polynomials, and degree of determinant and of Cramer's rule numerators in each symbol is bounded by sum of highest
+  degrees of rows,
+- determinant and numerators (det(G_i)*V_i) are computed with numpy LU decomposition at points of a grid on circles
+  of radius r in each symbol, as many points as the bound plus one,
+- radius starts at geometric mean of ratios of lowest and highest coefficients of entries (for s: natural frequencies),
+- coefficients are recovered with FFT, radius is then adjusted so coefficients of lowest and highest power have similar
+  size and interpolation is repeated until radii settle, coefficients below noise are zeroed,
+- polynomials are checked against numeric solution at points off the grid, if they don't match instance isn't
+  interpolated (it's solved by inversion).
+
+Results are polynomials with float coefficients: numerators and the determinant they share. Common factor s**n of
+numerators and determinant is divided out, other common factors (from scaling of rows) are kept. Symbols are interpolated on a
+dense grid, so number of symbols besides s is limited by max_symbols and size of the grid by max_points.
+"""
+import math
+
+import sympy
+
+__author__ = "Tomasz Kniola"
+__credits__ = ["Tomasz Kniola"]
+
+__license__ = "LGPL"
+__version__ = "0.0.1"
+__email__ = "kniola.tomasz@gmail.com"
+__status__ = "development"
+
+max_symbols = 2  # Number of symbols besides s which can be interpolated
+max_points = 100000  # Number of points of grid above which instance isn't interpolated
+_passes = 8  # Maximal number of interpolations adjusting radii
+_noise = 1e-10  # Coefficients smaller than this fraction of the biggest one (on circles of radii) are zeroed
+_accuracy = 1e-6  # Maximal relative error of interpolated polynomials at check points
+
+
+def _scaled_rows(G_i, B):
+    """ Returns matrices G_i and B with rows multiplied by least common multiple of denominators of their entries
+    """
+    G_rows, B_rows = [], []
+    for k in range(G_i.rows):
+        row = [sympy.together(entry) for entry in list(G_i.row(k)) + list(B.row(k))]
+        multiple = sympy.lcm_list([sympy.denom(entry) for entry in row if entry != 0] or [1])
+        row = [sympy.cancel(entry * multiple) for entry in row]
+        G_rows.append(row[:G_i.cols])
+        B_rows.append(row[G_i.cols:])
+    return sympy.Matrix(G_rows), sympy.Matrix(B_rows)
+
+
+def _degree_bounds(G_i, B, symbols):
+    """ Returns list of bounds of degree in each symbol of determinant and numerators: sums of highest degrees of rows
+    """
+    bounds = [0] * len(symbols)
+    for k in range(G_i.rows):
+        row_degrees = [0] * len(symbols)
+        for entry in list(G_i.row(k)) + list(B.row(k)):
+            if entry != 0:
+                row_degrees = [max(pair) for pair in zip(row_degrees, sympy.Poly(entry, *symbols).degree_list())]
+        bounds = [bound + degree for bound, degree in zip(bounds, row_degrees)]
+    return bounds
+
+
+def _initial_radii(G_i, symbols):
+    """ Returns list of geometric means of ratios of lowest and highest coefficients of entries in each symbol, other
+        symbols taken as 1
+    """
+    radii = []
+    for symbol in symbols:
+        others = dict((other, 1) for other in symbols if other != symbol)
+        logarithms = []
+        for entry in G_i:
+            if entry == 0 or not entry.has(symbol):
+                continue
+            terms = sympy.Poly(entry.xreplace(others), symbol).terms()
+            (high,), high_coefficient = terms[0]
+            (low,), low_coefficient = terms[-1]
+            if high > low:
+                ratio = abs(complex(low_coefficient)) / abs(complex(high_coefficient))
+                logarithms.append(math.log(ratio) / (high - low))
+        radii.append(math.exp(sum(logarithms) / len(logarithms)) if logarithms else 1.0)
+    return radii
+
+
+def _interpolate(np, function, shape, radii):
+    """ Returns array of coefficients, scaled by radii to powers, of polynomials whose values function returns
+
+        np: numpy module
+
+        function: function of point (list of values of symbols) returning array of values of polynomials
+
+        shape: number of points in each symbol, bound of degree plus one
+
+        radii: radius of circle of points of each symbol
+    """
+    values = None
+    for index in np.ndindex(*shape):
+        point = [radius * np.exp(2j * np.pi * k / n) for radius, k, n in zip(radii, index, shape)]
+        value = function(point)
+        if values is None:
+            values = np.zeros(tuple(shape) + value.shape, dtype=complex)
+        values[index] = value
+    return np.fft.fftn(values, axes=tuple(range(len(shape)))) / np.prod(shape)
+
+
+def _adjusted_radii(np, coefficients, radii):
+    """ Returns radii making the lowest and the highest nonzero coefficients of each symbol of similar size, and
+        flag if they are close to given radii
+    """
+    adjusted, settled = [], True
+    for axis, radius in enumerate(radii):
+        other = tuple(a for a in range(coefficients.ndim) if a != axis)
+        magnitudes = np.max(np.abs(coefficients), axis=other)
+        nonzero = np.nonzero(magnitudes > _noise * np.max(magnitudes))[0]
+        factor = 1.0
+        if len(nonzero) > 1:
+            low, high = nonzero[0], nonzero[-1]
+            factor = (magnitudes[low] / magnitudes[high]) ** (1.0 / (high - low))
+        adjusted.append(radius * factor)
+        settled = settled and 0.5 < factor < 2.0
+    return adjusted, settled
+
+
+def _polynomial(np, coefficients, radii, symbols, shift):
+    """ Returns sympy polynomial with coefficients scaled by radii, lowering powers of the first symbol by shift
+    """
+    terms = []
+    for index in zip(*np.nonzero(coefficients)):
+        coefficient = coefficients[index] / np.prod([radius ** k for radius, k in zip(radii, index)])
+        coefficient = sympy.Float(coefficient.real) if not coefficient.imag else sympy.sympify(complex(coefficient))
+        term = coefficient
+        for v, (symbol, k) in enumerate(zip(symbols, index)):
+            term *= symbol ** (k - shift if v == 0 else k)
+        terms.append(term)
+    return sympy.Add(*terms)
+
+
+def _accurate(np, function, coefficients, radii):
+    """ Returns True if polynomials of coefficients match values of function at points between circles of the grid,
+        error is relative to sum of magnitudes of terms, so zeros of polynomials don't matter
+    """
+    shape = coefficients.shape[:-1]
+    for scale, turn in ((0.5, 0.3), (0.9, 0.7), (1.7, 0.1), (3.1, 0.55)):
+        point = [scale * radius * np.exp(2j * np.pi * (turn + 0.13 * k) / n)
+                 for k, (radius, n) in enumerate(zip(radii, shape))]
+        powers = np.ones(shape, dtype=complex)
+        for axis, (x, radius, n) in enumerate(zip(point, radii, shape)):
+            powers = powers * ((x / radius) ** np.arange(n)).reshape([n if a == axis else 1 for a in range(len(shape))])
+        values = np.tensordot(powers, coefficients, axes=len(shape))
+        exact = function(point)
+        magnitudes = np.tensordot(np.abs(powers), np.abs(coefficients), axes=len(shape))
+        if np.any(np.abs(values - exact) > _accuracy * magnitudes):
+            return False
+    return True
+
+
+def solve(G_i, G_p, I_v):
+    """ Solves equations G_i*V_i + G_p*V_p = I_v into V_i = V0 + Ap*V_p by interpolation
+
+        G_i, G_p, I_v: sympy matrices of equations, with numbers, s and at most max_symbols other symbols
+
+        Returns tuple of numerators of V0 and Ap matrices, their determinant and number of points of grid, or None if
+        there are too many symbols or points, or if interpolated polynomials aren't accurate. If G_i is singular raise ValueError.
+    """
+    import scs_analysis  # Imported here, analyses import solver modules
+    np = scs_analysis.numpy_module()
+    N = G_i.rows
+    B = I_v.row_join(-G_p)
+    s = sympy.Symbol('s')
+    free_symbols = G_i.free_symbols | B.free_symbols
+    symbols = [s] + sorted(free_symbols - set([s]), key=sympy.default_sort_key)
+    if len(free_symbols - set([s])) > max_symbols:
+        return None
+    G_i, B = _scaled_rows(G_i, B)
+    shape = [bound + 1 for bound in _degree_bounds(G_i, B, symbols)]
+    if np.prod(shape) > max_points:
+        return None
+
+    matrix = sympy.lambdify(symbols, G_i.row_join(B), 'numpy')
+
+    def function(point):
+        A = np.array(matrix(*point), dtype=complex).reshape(N, N + B.cols)
+        try:
+            determinant = np.linalg.det(A[:, :N])
+            numerators = determinant * np.linalg.solve(A[:, :N], A[:, N:])
+        except np.linalg.LinAlgError:
+            raise ValueError("Matrix is singular")
+        return np.concatenate(([determinant], numerators.ravel()))
+
+    radii = _initial_radii(G_i, symbols)
+    for passes in range(_passes):
+        coefficients = _interpolate(np, function, shape, radii)
+        radii, settled = _adjusted_radii(np, coefficients, radii)
+        if settled:
+            break
+    coefficients = _interpolate(np, function, shape, radii)
+
+    # Zero the noise of each polynomial and imaginary parts of real ones
+    for j in range(coefficients.shape[-1]):
+        column = coefficients[..., j]
+        peak = np.max(np.abs(column))
+        column[np.abs(column) <= _noise * peak] = 0
+        if np.max(np.abs(column.imag)) <= _noise * peak:
+            column.imag = 0
+    if not np.any(coefficients[..., 0]):
+        raise ValueError("Matrix det == 0; not invertible.")
+    if not _accurate(np, function, coefficients, radii):
+        return None
+
+    def lowest_power(column):
+        return np.nonzero(np.any(np.abs(column.reshape(shape[0], -1)) > 0, axis=1))[0][0]
+
+    shift = min(lowest_power(coefficients[..., j]) for j in range(coefficients.shape[-1])
+                if np.any(coefficients[..., j]))
+    V = sympy.zeros(N, B.cols)
+    for i in range(N):
+        for j in range(B.cols):
+            numerator = coefficients[..., 1 + i * B.cols + j]
+            if np.any(numerator):
+                V[i, j] = _polynomial(np, numerator, radii, symbols, shift)
+    determinant = _polynomial(np, coefficients[..., 0], radii, symbols, shift)
+    return V[:, :I_v.cols], V[:, I_v.cols:], determinant, int(np.prod(shape))
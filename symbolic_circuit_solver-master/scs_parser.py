@@ -7,6 +7,9 @@ There are also function which deals with convering expresions for paramters and
  
 """
 import re
+import os
+import mmap
+import time
 import sympy
 import sympy.abc
 import logging
@@ -64,6 +67,28 @@ suffixd = {'meg': 1e6, 'Meg': 1e6, 'MEg': 1e6, 'MEG': 1e6,
            'k': 1e6, 'K': 1e3, 'x': 1e6, 'X': 1e6,
            'g': 1e9, 'G': 1e9, 't': 1e12, 'T': 1e12}
 
+# Dictionary of (path, modification time) of included files with circuits parsed from them, None if caching is off
+include_cache = None
+
+# Number of lines after which parse_file reports its progress
+progress_lines = 100000
+
+# Keep numbers and engineer suffixes as exact rationals instead of floats, so solving and simplifying work on exact
+# polynomials and give the same strings every time (scs.py --exact), floats appear only in numeric results
+exact = False
+
+
+def sympify(expresion):
+    """ Sympy value of expresion string, its numbers are rationals in exact mode
+    """
+    return sympy.sympify(expresion, sympy.abc._clash, rational=exact)
+
+
+def _value_string(value):
+    """ String of value put into expresion, bracketed in exact mode, in which numbers are fractions like 1/1000
+    """
+    return '(%s)' % value if exact else str(value)
+
 
 def evaluate_param(param, paramsd, evaluated_paramsd, parent=None, params_called_list=None):
     """ Evaluates param value and puts it into dictionary for later use
@@ -110,7 +135,7 @@ def evaluate_param(param, paramsd, evaluated_paramsd, parent=None, params_called
                                 tmp = evaluate_param(token, paramsd, evaluated_paramsd, parent,
                                                      params_called_list + [token])
                                 if tmp:
-                                    evaluated_paramsd.update({token: sympy.sympify(tmp,sympy.abc._clash)})
+                                    evaluated_paramsd.update({token: sympify(tmp)})
                             else:
                                 raise scs_errors.ScsParameterError("Circulary refence for %s" % token)
                         else:
@@ -121,7 +146,7 @@ def evaluate_param(param, paramsd, evaluated_paramsd, parent=None, params_called
                             expr += tmp
                             continue
                     if token in evaluated_paramsd:
-                        expr += str(evaluated_paramsd[token])
+                        expr += _value_string(evaluated_paramsd[token])
                     else:
                         raise scs_errors.ScsParameterError("Can't find definition for parameter: %s" % token)
                 elif reg_only_numeric_eng.match(token):
@@ -157,7 +182,7 @@ def evaluate_params(paramsd, parent=None):
         if param not in evaluated_paramsd:
             tmp = evaluate_param(param, paramsd, evaluated_paramsd, parent, [param])
             if tmp:
-                evaluated_paramsd.update({param: sympy.sympify(tmp,sympy.abc._clash)})
+                evaluated_paramsd.update({param: sympify(tmp)})
     return evaluated_paramsd
 
 
@@ -181,7 +206,7 @@ def evaluate_passed_params(paramsd, inst, evaluated_paramsd=None):
         if param not in evaluated_paramsd:
             tmp = evaluate_expresion(param_str, inst.paramsd)
             if tmp:
-                evaluated_paramsd.update({param: sympy.sympify(tmp,sympy.abc._clash)})
+                evaluated_paramsd.update({param: sympify(tmp)})
             elif inst.parent:
                 evaluate_passed_params({param: paramsd}, inst.parent, evaluated_paramsd)
     return evaluated_paramsd
@@ -193,7 +218,7 @@ def parse_analysis_expresion(expresion):
         expresion: string to be parsed
 
         Function parses the expresion. Expresion should be mathematical construct. Could contain variable names, numbers
-        and operators, round brackets and functions from the set of v(),i(),isub(). Function returns grammatical tokens
+        and operators, round brackets and functions from the set of v(),i(),isub(),vsrc(). Function returns grammatical tokens
         for this expresion.
     """
     expresion0 = expresion
@@ -269,7 +294,7 @@ def get_parent_evaluated_param(param, parent):
     """
     if parent:
         if param in parent.paramsd:
-            return str(parent.paramsd[param])
+            return _value_string(parent.paramsd[param])
         return get_parent_evaluated_param(param, parent.parent)
     return ''
 
@@ -299,11 +324,14 @@ def results2values(tokens, instance):
                     ret_str += '(' + str(instance.i(m.group('argument'))) + ')'
                 elif m.group('function') == 'isub':
                     ret_str += '(' + str(instance.isub(m.group('argument'))) + ')'
+                elif m.group('function') == 'vsrc':
+                    arguments = m.group('argument').split(',')
+                    ret_str += '(' + str(instance.vsrc(*tuple(arguments))) + ')'
                 else:
                     raise scs_errors.ScsInstanceError("Can't find function: %s" % token)
             elif reg_only_symbol.match(token):  # symbol token
                 if token in instance.paramsd:
-                    ret_str += str(instance.paramsd[token])
+                    ret_str += _value_string(instance.paramsd[token])
                 else:
                     raise scs_errors.ScsInstanceError("Can't find definition for parameter: %s" % token)
             elif reg_only_numeric_eng.match(token):
@@ -331,7 +359,7 @@ def params2values(tokens, valuesd):
         else:
             if reg_only_symbol.match(token):  # symbol token
                 if token in valuesd:
-                    ret_str += str(valuesd[token])
+                    ret_str += _value_string(valuesd[token])
                 else:
                     raise scs_errors.ScsInstanceError("Can't find definition for parameter: %s" % token)
             elif reg_only_numeric_eng.match(token):
@@ -352,7 +380,7 @@ def evaluate_expresion(expresion, valuesd):
         Evaluate expresion into tokens and than change it to a single value or symbolic expresion
     """
     tokens = parse_param_expresion(expresion)
-    return sympy.sympify(params2values(tokens, valuesd),sympy.abc._clash)
+    return sympify(params2values(tokens, valuesd))
 
 
 def strip_comment(in_str):
@@ -437,9 +465,10 @@ def add_element(param_d, param_l, name, circuit):
         circuit: circuit where we are adding an element
 
         Function is on the list of function for getNameFunctionFromHead. It adds a element to circuit and returns this
-        circuit.
+        circuit. Names and positional parameters (mostly net names) are interned, so each distinct name is held in
+        memory once, no matter how many elements refer to it.
     """
-    circuit.add_element(name, scs_circuit.Element(param_l, param_d))
+    circuit.add_element(intern(name), scs_circuit.Element([intern(param) for param in param_l], param_d))
     return circuit
 
 
@@ -476,8 +505,46 @@ def include_file(param_d, param_l, name, circuit):
 
         Function is on the list of function for getNameFunctionFromHead. It includes contents of another file into
         parsing process. It just start parsing this file. Returns circuit (could be modified while parsing include file)
+
+        If include_cache is on, file included into top circuit is parsed once into its own circuit, which contents
+        are then added to every circuit including it (see Circuit.add_library), until the file is modified. Subcircuits
+        of such file can use only subcircuits defined in the same file.
     """
-    parse_file(param_l[0], circuit)
+    if include_cache is None or circuit.parent is not None:
+        parse_file(param_l[0], circuit)
+        return circuit
+    try:
+        key = (os.path.abspath(param_l[0]), os.path.getmtime(param_l[0]))
+    except OSError:
+        parse_file(param_l[0], circuit)  # Logs the error
+        return circuit
+    if key not in include_cache:
+        library = parse_file(param_l[0], scs_circuit.TopCircuit())
+        if library is None:
+            return circuit
+        include_cache[key] = library
+    circuit.add_library(include_cache[key])
+    return circuit
+
+
+def add_macromodel(param_d, param_l, name, circuit):
+    """ Adds macro model loaded from a file to circuit
+
+        param_d: dummy - ignored
+
+        param_l: on first position of the list should be name of macro model file, rest is ignored
+
+        name: dummy - ignored
+
+        circuit: circuit where we are adding a macro model
+
+        Function is on the list of function for getNameFunctionFromHead. Macro model file is made by scs.py --macro.
+        Model will be instantiated instead of subcircuit with the same name. Returns circuit.
+    """
+    try:
+        circuit.add_macromodel(scs_circuit.load_macromodel(param_l[0]))
+    except (IOError, ValueError), e:
+        raise scs_errors.ScsParserError("Can't load macro model: %s" % e)
     return circuit
 
 
@@ -521,6 +588,48 @@ def add_analysis(param_d, param_l, name, circuit):
     return circuit
 
 
+def add_approximation(param_d, param_l, name, circuit):
+    """ Makes top circuit solved approximately
+
+        param_d: options (tol, fstart, fstop, npoints) and nominal values of symbols
+
+        param_l: dummy - ignored
+
+        name: dummy - ignored
+
+        circuit: circuit where .approx was written
+
+        Function is on the list of function for getNameFunctionFromHead. Works only in top circuit, look at scs_approx
+        for description of approximate solving, in subcircuit it's ignored with a warning. Returns circuit.
+    """
+    if not circuit.parent:
+        circuit.approxd = param_d
+    else:
+        logging.warning(".approx in subcircuit %s ignored, it works only in top circuit" % circuit.name)
+    return circuit
+
+
+def add_symmetry(param_d, param_l, name, circuit):
+    """ Makes symmetric instances solved as half circuits
+
+        param_d: pairs of symmetric nets of top circuit, if empty pairs are found in equations of each instance
+
+        param_l: dummy - ignored
+
+        name: dummy - ignored
+
+        circuit: circuit where .symmetry was written
+
+        Function is on the list of function for getNameFunctionFromHead. Works only in top circuit, look at
+        scs_symmetry for description of half circuits, in subcircuit it's ignored with a warning. Returns circuit.
+    """
+    if not circuit.parent:
+        circuit.symmetryd = param_d
+    else:
+        logging.warning(".symmetry in subcircuit %s ignored, it works only in top circuit" % circuit.name)
+    return circuit
+
+
 def change_to_parent_circuit(param_d, param_l, name, circuit):
     """ Change working circuit to parent circuit
         
@@ -551,10 +660,13 @@ def get_name_function_from_head(head):
     name, funct = head[1:], None
     function_dict = {'param': add_param,
                      'include': include_file,
+                     'macro': add_macromodel,
                      'subckt': add_subcircuit,
                      'measure': add_analysis,
                      'ac': add_analysis,
                      'dc': add_analysis,
+                     'approx': add_approximation,
+                     'symmetry': add_symmetry,
                      'ends': change_to_parent_circuit}
     if head[0] == '.':
         if name in function_dict:
@@ -562,7 +674,7 @@ def get_name_function_from_head(head):
         else:
             raise scs_errors.ScsParserError("Unknown control sentence: %s" % head)
     elif head[0] in \
-            ('R', 'r', 'L', 'l', 'C', 'c', 'V', 'v', 'I', 'i', 'E', 'e', 'H', 'h', 'G', 'g', 'F', 'f', 'X', 'x'):
+            ('R', 'r', 'L', 'l', 'C', 'c', 'V', 'v', 'I', 'i', 'E', 'e', 'H', 'h', 'G', 'g', 'F', 'f', 'N', 'n', 'X', 'x'):
         name, funct = head, add_element
     elif head[0] == '*':  # Comment
         pass
@@ -597,6 +709,36 @@ def parseline(line, circuit):
     return circuit
 
 
+def read_lines(filename):
+    """ Generator of logical lines of a netlist file
+
+        filename - path to a file to be read
+
+        File is memory-mapped and read line by line, so only a line currently being assembled is held in memory and not
+        the whole file. Lines starting with '+' are continuation of previous line and are glued to it. Yields pairs of
+        (line_number, line), where line_number is the number of first physical line making up the logical line.
+    """
+    with open(filename, 'rb') as fil:
+        try:
+            buf = mmap.mmap(fil.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:  # empty file can't be mapped, there is nothing to read anyway
+            return
+        try:
+            line_number, current_line = 0, None
+            for physical_line_number, line in enumerate(iter(buf.readline, ''), 1):
+                line = line.rstrip('\r\n')
+                if line[:1] == '+' and current_line is not None:
+                    current_line += ' ' + line[1:]
+                    continue
+                if current_line is not None:
+                    yield line_number, current_line
+                line_number, current_line = physical_line_number, line
+            if current_line is not None:
+                yield line_number, current_line
+        finally:
+            buf.close()
+
+
 def parse_file(filename, circuit):
     """ Parses input file into a circuit
 
@@ -604,38 +746,37 @@ def parse_file(filename, circuit):
 
         circuit - a circuit which will parse a file into
     
-        Takes filename, tries to open the file, read the file line by line, creating circuit on the go from it. 
-        Returns circuit. Will return None if any problems occured.
+        Takes filename, streams the file logical line by logical line (see read_lines), creating circuit on the go from
+        it. Progress is reported every progress_lines lines in lines per second. Returns circuit. Will return None if
+        any problems occured.
     """
     current_cir = circuit
-    line_number = 1
+    line_number = 0
+    lines_parsed = 0
+    time1 = time.clock()
     try:
-        with open(filename, 'r') as fil:
-            next_line = fil.readline()
-            for line in fil:
-                current_line = next_line
-                next_line = line
-                while next_line and next_line[0] == '+':
-                    current_line += next_line[1:]
-                    next_line = fil.readline()
-                circuit = parseline(current_line, circuit)
-                line_number += 1
-                if circuit is None:
-                    break
-        if next_line and circuit:
-            circuit = parseline(next_line, circuit)
+        for line_number, line in read_lines(filename):
+            circuit = parseline(line, circuit)
+            lines_parsed += 1
+            if not lines_parsed % progress_lines:
+                logging.info("Parsing %s: %d lines (%.0f lines/s)" %
+                             (filename, line_number, line_number / max(time.clock() - time1, 1e-9)))
+            if circuit is None:
+                break
         if circuit is current_cir:
             logging.error("No .end statement on the end of file!")
+        logging.info("Parsed %s: %d lines in %f s (%.0f lines/s)" %
+                     (filename, line_number, time.clock() - time1, line_number / max(time.clock() - time1, 1e-9)))
         return current_cir
     except scs_errors.ScsParserError, e:
         logging.error("Syntax error in file: %s on line: %d \n %s" % (filename, line_number, e))
         return None
-    except IOError, e:
+    except (IOError, OSError), e:
         logging.error(e)
         return None
 
 
-__all__ = [add_analysis, add_element, add_param, add_subcircuit, change_to_parent_circuit,
+__all__ = [add_analysis, add_element, add_macromodel, add_param, add_subcircuit, change_to_parent_circuit,
            get_name_function_from_head, get_parent_evaluated_param, get_params, get_unnamed_params,
            evaluate_expresion, evaluate_param, evaluate_params, include_file, params2values, parse_analysis_expresion,
-           parse_param_expresion, parse_file, parseline, strip_comment]
+           parse_param_expresion, parse_file, parseline, read_lines, strip_comment, sympify]
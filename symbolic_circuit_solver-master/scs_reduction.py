@@ -0,0 +1,197 @@
+"""
+Topology reduction of instances
+
+Pass between instantiating and solving a circuit, which lowers number of unknowns of each instance before its
+equations are written. Only passive elements (R, C, L) are touched, their admittances are merged into Admittance
+elements:
+
+- parallel elements (connecting the same pair of nets) are merged into one admittance, sum of their admittances,
+- element with both ends on the same net carries no current and is dropped,
+- inner net with only passive elements on it and at most max_degree of them is eliminated by star-mesh
+  transformation: each pair of its neighbours (a, b) is connected by admittance y_a*y_b/sum(y), which is series
+  connection for two elements, star-delta for three, and just dropping element of dangling net for one. Merged
+  admittances are cancelled, and net is eliminated only when admittances on it are small (max_ops), so long ladders
+  aren't solved element by element, which is slower than solving their equations.
+
+Eliminating a net this way is exact (Kron reduction of its row of equations), so voltages of kept nets don't change.
+Kept are port nets, ground, nets controlling voltage controlled sources and nullors and nets observed by analyses: arguments of
+v() and vsrc() of the netlist, as well as elements observed by i() and referenced by current controlled sources. Nets and
+elements which were reduced can't be probed afterwards, so the pass is turned on by --reduce option.
+"""
+import logging
+import re
+
+import sympy
+
+import scs_backend
+import scs_elements
+import scs_governor
+import scs_trace
+
+__author__ = "Tomasz Kniola"
+__credits__ = ["Tomasz Kniola"]
+
+__license__ = "LGPL"
+__version__ = "0.0.1"
+__email__ = "kniola.tomasz@gmail.com"
+__status__ = "development"
+
+enabled = False  # Reduce instances before solving them
+max_degree = 3  # Highest number of elements on net eliminated by star-mesh, above it mesh grows faster than it saves
+max_ops = 40  # Highest number of operations of admittances of elements on net eliminated by star-mesh
+
+reg_probe = re.compile('(?<![\w.])(?P<function>v|vsrc|i|isub)\((?P<argument>[^()]*)\)')
+
+
+def observed(circuit):
+    """ Returns set of names of nets, elements and subinstances observed by analyses of top circuit, in dot notation
+
+        circuit: top circuit made by parser
+
+        Port of isub() is kept anyway, as a port net, but its subinstance has to be kept too.
+    """
+    names = set()
+    for analysis in circuit.analysisl:
+        for param in list(analysis.paramsl) + list(analysis.paramsd.values()):
+            for m in reg_probe.finditer(str(param)):
+                arguments = [argument.strip() for argument in m.group('argument').split(',')]
+                if m.group('function') == 'isub':
+                    names.update(argument.rsplit('.', 1)[0] for argument in arguments if '.' in argument)
+                else:
+                    names.update(arguments)
+    return names
+
+
+def reduce_instance(inst, observed_names):
+    """ Reduces instance and its subinstances
+
+        inst: instance made by scs_instance_hier.make_instance, not solved yet
+
+        observed_names: set of names of nets and elements which have to be kept, in dot notation from top instance
+
+        Returns tuple of numbers of nets and elements removed.
+    """
+    nets, elements = 0, 0
+    for subinstance in inst.subinstances.values():
+        subnets, subelements = reduce_instance(subinstance, observed_names)
+        nets, elements = nets + subnets, elements + subelements
+    if not inst.elements:
+        return nets, elements
+    with scs_trace.phase('reduction', instance=inst.hier_name()) as event:
+        prefix = '%s.' % inst.hier_name() if inst.parent else ''
+        kept_nets = set(inst.port_map) | set(['0'])
+        kept_elements = set()
+        for name in observed_names:
+            if name.startswith(prefix) and '.' not in name[len(prefix):]:
+                kept_nets.add(name[len(prefix):])
+                kept_elements.add(name[len(prefix):])
+        for element in inst.elements.values():
+            if isinstance(element, (scs_elements.VoltageControlledVoltageSource,
+                                    scs_elements.VoltageControlledCurrentSource, scs_elements.Nullor)):
+                kept_nets.update(element.nets[2:4])
+            elif isinstance(element, (scs_elements.CurrentControlledVoltageSource,
+                                      scs_elements.CurrentControlledCurrentSource)):
+                kept_elements.add(element.names[1])
+        elements_count, nets_count = len(inst.elements), len(inst.elements_on_net)
+
+        changed = True
+        while changed:
+            changed = _merge_parallel(inst, kept_elements)
+            for net in sorted(inst.elements_on_net):
+                if net not in kept_nets and _eliminate_net(inst, net, kept_elements):
+                    changed = True
+        inst._prepare_nets()
+
+        removed_nets = nets_count - len(inst.elements_on_net)
+        removed_elements = elements_count - len(inst.elements)
+        event.update({'removed_nets': removed_nets, 'removed_elements': removed_elements})
+    return nets + removed_nets, elements + removed_elements
+
+
+def _reducible(element, kept_elements):
+    """ Returns True if element is passive and isn't observed
+    """
+    return isinstance(element, scs_elements.PassiveElement) and element.names[0] not in kept_elements
+
+
+def _remove_element(inst, element):
+    """ Removes element from instance, with inner nets which are left without elements
+    """
+    del inst.elements[element.names[0]]
+    for net in set(element.nets):
+        inst.elements_on_net[net].remove(element)
+        if not inst.elements_on_net[net] and net not in inst.port_map:
+            del inst.elements_on_net[net]
+
+
+def _add_admittance(inst, name, nets, admittance):
+    """ Adds Admittance element to instance, name is made unique and admittance is cancelled, so admittances merged
+        again and again don't nest
+    """
+    while name in inst.elements:
+        name += "'"
+    admittance = scs_governor.guarded('cancel', scs_backend.backend.cancel, scs_governor.keep, admittance)
+    inst.add_element(scs_elements.Admittance((name,), nets, (admittance,)))
+
+
+def _merge_parallel(inst, kept_elements):
+    """ Merges parallel passive elements of instance and drops ones shorted to a single net
+
+        Returns True if instance was changed.
+    """
+    groups = {}
+    changed = False
+    for name in sorted(inst.elements):
+        element = inst.elements[name]
+        if not _reducible(element, kept_elements):
+            continue
+        if element.nets[0] == element.nets[1]:
+            _remove_element(inst, element)
+            changed = True
+        else:
+            groups.setdefault(frozenset(element.nets[:2]), []).append(element)
+    for group in groups.values():
+        if len(group) > 1:
+            for element in group:
+                _remove_element(inst, element)
+            _add_admittance(inst, '|'.join(element.names[0] for element in group), group[0].nets[:2],
+                            sum(element.conductance() for element in group))
+            changed = True
+    return changed
+
+
+def _eliminate_net(inst, net, kept_elements):
+    """ Eliminates net of instance by star-mesh transformation, if all elements on it are reducible, there are at
+        most max_degree of them and their admittances have at most max_ops operations, so mesh is cheap to cancel
+
+        Returns True if net was eliminated.
+    """
+    star = list(inst.elements_on_net.get(net, []))
+    if not star or len(star) > max_degree or not all(_reducible(element, kept_elements) for element in star):
+        return False
+    neighbours = [element.nets[1] if element.nets[0] == net else element.nets[0] for element in star]
+    if len(set(neighbours)) < len(neighbours) or net in neighbours:
+        return False  # Parallel elements are merged first
+    admittances = [element.conductance() for element in star]
+    if sum(sympy.count_ops(admittance) for admittance in admittances) > max_ops:
+        return False
+    total = sum(admittances)
+    for element in star:
+        _remove_element(inst, element)
+    for a in range(len(star)):
+        for b in range(a + 1, len(star)):
+            _add_admittance(inst, '%s-%s' % (star[a].names[0], star[b].names[0]), (neighbours[a], neighbours[b]),
+                            admittances[a] * admittances[b] / total)
+    logging.info('Net %s of %s eliminated' % (net, inst.hier_name()))
+    return True
+
+
+def reduce_circuit(inst, circuit):
+    """ Reduces top instance keeping nets and elements observed by analyses of circuit
+
+        inst: top instance, checked but not solved
+
+        circuit: top circuit made by parser
+    """
+    nets, elements = reduce_instance(inst, observed(circuit))
+    logging.info('Reduction removed %d nets and %d elements' % (nets, elements))
@@ -0,0 +1,126 @@
+"""
+Structured results store
+
+Besides text .results file and plots, analyses put their results into ResultsStore, which is saved once, after all
+analyses, into numpy .npz file (prefix.npz). Each result has its arrays under keys 'r<number>_<field>':
+sweep points (x and y for .dc, f and y for .ac), numeric values of poles and zeros, and symbolic expresions saved as
+strings made with sympy.srepr. Key '__index__' holds JSON list describing each result:
+
+{"number": 0, "type": "ac", "name": "T", "expresion": "v(out)/v(in)", "arrays": ["f", "pole_values", "y", ...],
+ "expresions": ["value"], "expresion_lists": ["poles", "zeros"], "info": {"yscale": "log", ...}}
+
+so scripts can find and load just the results they need without running the solver again:
+
+index, arrays = scs_results.load('circuit.npz')
+ac = [result for result in index if result['type'] == 'ac'][0]
+ys = arrays[scs_results.key(ac, 'y')]
+transfer_function = scs_results.expresion(arrays, ac, 'value')
+"""
+import json
+
+import sympy
+
+__author__ = "Tomasz Kniola"
+__credits__ = ["Tomasz Kniola"]
+
+__license__ = "LGPL"
+__version__ = "0.0.1"
+__email__ = "kniola.tomasz@gmail.com"
+__status__ = "development"
+
+
+def key(result, field):
+    """ Returns key of array of field of result from index
+    """
+    return 'r%d_%s' % (result['number'], field)
+
+
+class ResultsStore(object):
+    """ Collects results of analyses, and saves them in one pass
+    """
+
+    def __init__(self):
+        """ Initialize empty store
+        """
+        self.index = []  # List of dictionaries describing results
+        self.arrays = {}  # Dictionary of keys with arrays (lists of numbers or strings)
+
+    def add(self, analysis_type, name, expresion, arrays=None, expresions=None, info=None):
+        """ Adds a result
+
+            analysis_type: type of analysis (measure, dc, ac)
+
+            name: name of the result
+
+            expresion: analysed expresion as written in netlist
+
+            arrays: dictionary of field names with sequences of numbers (real or complex)
+
+            expresions: dictionary of field names with sympy expresions or lists of them, saved as strings
+
+            info: dictionary with additional information (options of analysis), must be JSON serializable
+
+            Field names have to be unique among arrays and expresions.
+        """
+        result = {'number': len(self.index),
+                  'type': analysis_type,
+                  'name': name,
+                  'expresion': expresion,
+                  'arrays': sorted(arrays) if arrays else [],
+                  'expresions': [],
+                  'expresion_lists': [],
+                  'info': info if info else {}}
+        if arrays:
+            for field, values in arrays.iteritems():
+                self.arrays[key(result, field)] = list(values)
+        if expresions:
+            for field, values in sorted(expresions.iteritems()):
+                if isinstance(values, (list, tuple)):
+                    result['expresion_lists'].append(field)
+                else:
+                    result['expresions'].append(field)
+                    values = [values]
+                self.arrays[key(result, field)] = [unicode(sympy.srepr(value)) for value in values]
+        self.index.append(result)
+
+    def extend(self, other):
+        """ Adds all results of other store after results of self, renumbering them
+
+            other: ResultsStore
+        """
+        for result in other.index:
+            renumbered = dict(result, number=len(self.index))
+            for field in result['arrays'] + result['expresions'] + result['expresion_lists']:
+                self.arrays[key(renumbered, field)] = other.arrays[key(result, field)]
+            self.index.append(renumbered)
+
+    def save(self, filename):
+        """ Saves all results with index into .npz file
+
+            filename: path of the file
+        """
+        import numpy  # Imported here not to load it for runs without any results
+        arrays = dict((name, numpy.array(values)) for name, values in self.arrays.iteritems())
+        arrays['__index__'] = numpy.array(unicode(json.dumps(self.index)))
+        with open(filename, 'wb') as fil:
+            numpy.savez(fil, **arrays)
+
+
+def load(filename):
+    """ Loads results store
+
+        filename: path of .npz file saved by ResultsStore
+
+        Returns tuple of index (list of dictionaries describing results) and numpy NpzFile, which reads arrays from
+        the file only when they are accessed.
+    """
+    import numpy
+    arrays = numpy.load(filename)
+    return json.loads(arrays['__index__'][()]), arrays
+
+
+def expresion(arrays, result, field):
+    """ Returns sympy expresion (or list of them) saved for field of result
+    """
+    values = [sympy.sympify(value) for value in arrays[key(result, field)]]
+    return values if field in result['expresion_lists'] else values[0]
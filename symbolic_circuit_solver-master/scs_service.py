@@ -0,0 +1,338 @@
+#!/depot/Python-2.7.2/bin/python -E
+
+""" Service script.
+
+    Keeps solved circuits in memory and answers queries about them, so a netlist is solved once and then each query
+    takes only time of evaluating its expresion. Requests and responses are JSON objects, one in line, read from
+    standard input and written to standard output, or exchanged over Unix socket (--socket PATH). Each response has
+    'status' - 'ok' or 'error' (then 'error' holds the message), 'time' in seconds and 'id' copied from request, and
+    'fallbacks' - [step, reason] pairs of cheaper steps taken by the governor (--max-ops, --stage-timeout), if any.
+
+    Requests:
+    {"command": "load", "netlist": "amp.sp", "name": "amp"}
+        parses, instantiates, checks and solves netlist, and keeps it under name (netlist file name on default)
+    {"command": "eval", "name": "amp", "expresion": "v(out)/v(in)", "subst": {"gm": "1m"}, "at": {"f": [1, 1e3]}}
+        returns "value" - expresion as string, with symbols substituted by values of optional subst. With optional
+        "at" dictionary of symbols with lists of values it also returns numeric "values" (and "imag" if they are
+        complex); "f" is frequency, s = 2*pi*I*f. Set "simplify": false to skip simplifying. Expresions and compiled
+        numeric functions are cached, so repeated queries are fast.
+    {"command": "analyze", "name": "amp", "analysis": ".ac v(out)/v(in) fstart=1 fstop=1e9", "output": "amp_q1"}
+        performs analysis written as in netlist, writing its files with output prefix (name on default), returns
+        "text" of .results file
+    {"command": "unload", "name": "amp"}
+    {"command": "list"}
+        returns "names" of loaded circuits
+    {"command": "quit"}
+
+    Example:
+    scs_service.py --socket /tmp/scs.sock
+"""
+import SocketServer
+import argparse
+import json
+import logging
+import os
+import sys
+import time
+
+import sympy
+
+import scs
+import scs_analysis
+import scs_backend
+import scs_circuit
+import scs_errors
+import scs_governor
+import scs_instance_hier
+import scs_parser
+
+__author__ = "Tomasz Kniola"
+__credits__ = ["Tomasz Kniola"]
+
+__license__ = "LGPL"
+__version__ = "0.0.1"
+__email__ = "kniola.tomasz@gmail.com"
+__status__ = "development"
+
+__description__ = """
+    Symbolic circuit solver service - keeps solved circuits in memory and answers JSON queries about them
+
+"""
+
+
+class ServiceError(Exception):
+    """ Error in a request, reported back in response
+    """
+    pass
+
+
+def _byte_strings(value):
+    """ Returns JSON value with unicode strings encoded to str, which the parser and solver work on (intern() of names
+        doesn't take unicode)
+    """
+    if isinstance(value, unicode):
+        return value.encode('utf-8')
+    if isinstance(value, list):
+        return [_byte_strings(item) for item in value]
+    if isinstance(value, dict):
+        return dict((_byte_strings(key), _byte_strings(item)) for key, item in value.iteritems())
+    return value
+
+
+class Session(object):
+    """ Solved circuit kept by service, with caches of its expresions
+    """
+
+    def __init__(self, circuit, instance):
+        """ Initialize session
+
+            circuit: parsed top circuit
+
+            instance: solved top instance
+        """
+        self.circuit = circuit
+        self.instance = instance
+        self.expresions = {}  # Dictionary of (expresion, simplify) with sympy values
+        self.functions = {}  # Dictionary of (expresion, simplify, substitutions, variables) with compiled functions
+
+    def clear_caches(self):
+        """ Drops cached expresions, needed when parameters of instance change
+        """
+        self.expresions.clear()
+        self.functions.clear()
+
+
+class Service(object):
+    """ Handles requests, holding sessions of loaded circuits by their names
+    """
+
+    def __init__(self):
+        """ Initialize service without any circuits
+        """
+        self.sessions = {}
+        self.stopped = False
+        self.commands = {'load': self.load,
+                         'eval': self.eval,
+                         'analyze': self.analyze,
+                         'unload': self.unload,
+                         'list': self.list,
+                         'quit': self.quit}
+
+    def handle(self, line):
+        """ Handles one request
+
+            line: JSON request
+
+            Returns JSON response.
+        """
+        time1 = time.time()
+        response = {'status': 'ok'}
+        scs_governor.reset()
+        try:
+            request = _byte_strings(json.loads(line))
+            if not isinstance(request, dict):
+                raise ServiceError('request has to be JSON object')
+            response['id'] = request.get('id')
+            command = request.get('command')
+            if command not in self.commands:
+                raise ServiceError('unknown command: %s' % command)
+            response.update(self.commands[command](request))
+        except (ValueError, ServiceError, scs_errors.ScsInstanceError, scs_errors.ScsParameterError,
+                scs_errors.ScsAnalysisError, scs_errors.ScsParserError, scs_errors.ScsElementError), e:
+            response.update({'status': 'error', 'error': str(e)})
+        except Exception, e:
+            logging.exception(e)
+            response.update({'status': 'error', 'error': '%s: %s' % (type(e).__name__, e)})
+        if scs_governor.fallbacks():
+            response['fallbacks'] = scs_governor.fallbacks()
+        response['time'] = time.time() - time1
+        return json.dumps(response)
+
+    def session(self, request):
+        """ Returns session of circuit named in request
+        """
+        name = request.get('name')
+        if name not in self.sessions:
+            raise ServiceError('no circuit loaded with name: %s' % name)
+        return self.sessions[name]
+
+    def load(self, request):
+        """ Parses and solves netlist
+        """
+        if 'netlist' not in request:
+            raise ServiceError('no netlist given')
+        netlist = request['netlist']
+        name = request.get('name', netlist)
+        circuit = scs_parser.parse_file(netlist, scs_circuit.TopCircuit())
+        if not circuit:
+            raise ServiceError('failed to parse %s' % netlist)
+        summary = {'status': 'ok'}
+        instance = scs.solve(circuit, summary)
+        if not instance:
+            raise ServiceError('%s: %s' % (netlist, summary['status']))
+        self.sessions[name] = Session(circuit, instance)
+        return {'name': name, 'nets': sorted(instance.nets)}
+
+    def _expresion(self, session, expresion, simplify):
+        """ Returns sympy value of analysis expresion, from cache if it was evaluated before
+        """
+        key = (expresion, simplify)
+        if key not in session.expresions:
+            value = session.instance.expresion(expresion)
+            if simplify:
+                value = scs_governor.guarded('simplify', sympy.simplify, scs_governor.keep, value)
+            session.expresions[key] = value
+        return session.expresions[key]
+
+    def eval(self, request):
+        """ Evaluates expresion, symbolically and optionally numerically
+        """
+        session = self.session(request)
+        if 'expresion' not in request:
+            raise ServiceError('no expresion given')
+        expresion = request['expresion']
+        simplify = bool(request.get('simplify', True))
+        subst = tuple(sorted((str(symbol), str(value)) for symbol, value in request.get('subst', {}).iteritems()))
+        value = self._expresion(session, expresion, simplify)
+        substituted = value.subs([(sympy.Symbol(symbol), scs_parser.evaluate_expresion(number, {}))
+                                  for symbol, number in subst]) if subst else value
+        response = {'value': str(substituted)}
+
+        at = request.get('at')
+        if at:
+            variables = tuple(sorted(str(symbol) for symbol in at))
+            key = (expresion, simplify, subst, variables)
+            if key not in session.functions:
+                s = sympy.Symbol('s')
+                if 'f' in variables:
+                    substituted = substituted.subs(s, 2 * sympy.pi * sympy.I * sympy.Symbol('f'))
+                left = substituted.free_symbols - set(sympy.Symbol(variable) for variable in variables)
+                if left:
+                    raise ServiceError('no values for symbols: %s' % ', '.join(sorted(str(sym) for sym in left)))
+                session.functions[key] = scs_analysis.cse_lambdify(variables, substituted)
+            np = scs_analysis.numpy_module()
+            arguments = [np.asarray(at[variable], dtype=float) for variable in variables]
+            values = np.asarray(session.functions[key](*arguments), dtype=complex)
+            values = np.broadcast_to(values, np.broadcast(*arguments).shape)
+            response['values'] = values.real.tolist()
+            if np.any(values.imag):
+                response['imag'] = values.imag.tolist()
+        return response
+
+    def analyze(self, request):
+        """ Performs analysis on loaded circuit
+        """
+        session = self.session(request)
+        if 'analysis' not in request:
+            raise ServiceError('no analysis given')
+        output = request.get('output', request['name'])
+        head = scs_parser.strip_comment(request['analysis']).split(None, 1)
+        if not head or head[0][:1] != '.' or head[0][1:] not in scs_analysis.analysis_dict:
+            raise ServiceError('not an analysis: %s' % request['analysis'])
+        circuit = scs_circuit.TopCircuit()
+        scs_parser.parseline(request['analysis'], circuit)
+        if not circuit.analysisl:
+            raise ServiceError('not an analysis: %s' % request['analysis'])
+        circuit.perform_analysis(session.instance, output)
+        # .measure could have changed values of parameters
+        session.clear_caches()
+        with open('%s.results' % output) as fil:
+            return {'text': fil.read()}
+
+    def unload(self, request):
+        """ Drops loaded circuit
+        """
+        self.session(request)
+        self.sessions.pop(request['name'])
+        return {}
+
+    def list(self, request):
+        """ Lists loaded circuits
+        """
+        return {'names': sorted(self.sessions)}
+
+    def quit(self, request):
+        """ Stops the service after response
+        """
+        self.stopped = True
+        return {}
+
+
+def serve_stdio(service):
+    """ Answers requests from standard input on standard output, until quit or end of input
+    """
+    for line in iter(sys.stdin.readline, ''):
+        if not line.strip():
+            continue
+        sys.stdout.write(service.handle(line) + '\n')
+        sys.stdout.flush()
+        if service.stopped:
+            break
+
+
+def serve_socket(service, path):
+    """ Answers requests on Unix socket, each connection can send many requests, until quit
+    """
+
+    class Handler(SocketServer.StreamRequestHandler):
+        def handle(self):
+            for line in iter(self.rfile.readline, ''):
+                if not line.strip():
+                    continue
+                self.wfile.write(service.handle(line) + '\n')
+                self.wfile.flush()
+                if service.stopped:
+                    break
+
+    if os.path.exists(path):
+        os.remove(path)
+    server = SocketServer.UnixStreamServer(path, Handler)
+    try:
+        while not service.stopped:
+            server.handle_request()
+    finally:
+        server.server_close()
+        os.remove(path)
+
+
+def main():
+    """ Main function.
+
+        Look at description of this file.
+    """
+    parser = argparse.ArgumentParser(description=__description__, prog='scs_service')
+    parser.add_argument('--socket', metavar='PATH', help='listen on Unix socket PATH instead of standard input')
+    parser.add_argument('-v', action='store_true', help='verbose mode - logs information, not only warnings')
+    parser.add_argument('--max-ops', type=int, metavar='N',
+                        help='skip simplifying steps of expresions with more than N operations (see scs.py)')
+    parser.add_argument('--stage-timeout', type=float, metavar='SEC',
+                        help='interrupt simplifying step after SEC seconds (see scs.py)')
+    parser.add_argument('--solver', default='inverse', choices=sorted(scs_instance_hier.solvers),
+                        help='engine solving equations of instances (see scs.py)')
+    parser.add_argument('--backend', default='sympy', choices=sorted(scs_backend.backends),
+                        help='symbolic engine of cancelling, determinants and factoring (see scs.py)')
+    parser.add_argument('--exact', action='store_true',
+                        help='keep numbers of netlists as exact rationals (see scs.py)')
+    parser.add_argument('--superposition', action='store_true',
+                        help='solve each independent source as a right hand side of its own (see scs.py)')
+    args = parser.parse_args(sys.argv[1:])
+
+    # Standard output is used for responses, so log goes to standard error
+    logging.basicConfig(format='%(levelname)s: %(message)s', stream=sys.stderr,
+                        level=logging.INFO if args.v else logging.WARNING)
+    scs_governor.configure(args.max_ops, args.stage_timeout)
+    scs_instance_hier.solver = args.solver
+    scs_parser.exact = args.exact
+    scs_instance_hier.superposition = args.superposition
+    if not scs_backend.use(args.backend):
+        parser.error('%s backend is not installed' % args.backend)
+
+    service = Service()
+    if args.socket:
+        serve_socket(service, args.socket)
+    else:
+        serve_stdio(service)
+
+
+if __name__ == "__main__":
+    main()
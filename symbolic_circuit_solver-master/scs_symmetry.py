@@ -0,0 +1,121 @@
+"""
+Half circuit decomposition of symmetric instances
+
+Differential circuits are mirror symmetric: swapping nets of each pair (outp with outm, inp with inm) and keeping nets
+on the axis (tail) leaves equations unchanged, P*G_i*P = G_i with P permutation of nets. Then G_i maps sums of voltages
+of pairs (common mode) and their differences (differential mode) separately, and with
+T = [common columns: e_a + e_b of each pair and e_c of each net on the axis | differential columns: e_a - e_b]
+T^t*G_i*T is block diagonal. Equations G_i*V_i = B are solved as two half circuits:
+G_cc*Y_c = (T^t*B)_c and G_dd*Y_d = (T^t*B)_d, each by the solver engine, and V_i = T*Y. Halves have their own
+determinants, so numerators are brought over common one: det(G_cc)*det(G_dd). Right hand side (sources, port
+columns) doesn't need to be symmetric.
+
+Pairs are declared by .symmetry statement for top instance (.symmetry outp=outm inp=inm), or found in equations:
+nets are colored by their entries and colors of their neighbours until coloring is stable (color refinement), so nets
+which have a color by themselves are on the axis and colors of two nets are pairs. Pairs are checked on equations
+before they are used, instance without symmetry is solved whole.
+"""
+import sympy
+
+import scs_backend
+import scs_governor
+import scs_trace
+
+__author__ = "Tomasz Kniola"
+__credits__ = ["Tomasz Kniola"]
+
+__license__ = "LGPL"
+__version__ = "0.0.1"
+__email__ = "kniola.tomasz@gmail.com"
+__status__ = "development"
+
+
+def _colors(G_i):
+    """ Returns list of colors of nets (rows and columns of G_i) after color refinement, equal colors for nets which
+        can't be told apart by their entries and entries of their neighbours
+    """
+    N = G_i.rows
+    rows = [[(j, str(G_i[i, j])) for j in range(N) if j != i and G_i[i, j] != 0] for i in range(N)]
+    cols = [[(j, str(G_i[j, i])) for j in range(N) if j != i and G_i[j, i] != 0] for i in range(N)]
+    colors = [0] * N
+    classes = 1
+    while True:
+        signatures = [(colors[i], str(G_i[i, i]),
+                       tuple(sorted((entry, colors[j]) for j, entry in rows[i])),
+                       tuple(sorted((entry, colors[j]) for j, entry in cols[i]))) for i in range(N)]
+        numbers = dict((signature, number) for number, signature in enumerate(sorted(set(signatures))))
+        colors = [numbers[signature] for signature in signatures]
+        if len(numbers) == classes:
+            return colors
+        classes = len(numbers)
+
+
+def _symmetric(G_i, permutation):
+    """ Returns True if permuting rows and columns of G_i leaves it unchanged
+    """
+    for i in range(G_i.rows):
+        for j in range(G_i.cols):
+            if G_i[i, j] != G_i[permutation[i], permutation[j]]:
+                return False
+    return True
+
+
+def find_pairs(G_i, nets, declared=None):
+    """ Returns list of pairs of indexes of symmetric nets of equations, or None if they aren't symmetric
+
+        G_i: sympy matrix of equations of inner nets
+
+        nets: list of names of inner nets, in order of rows and columns of G_i
+
+        declared: dictionary of names of nets with names of their symmetric nets, pairs are found if it's empty
+    """
+    if declared:
+        index = dict((net, i) for i, net in enumerate(nets))
+        pairs = [(index[a], index[b]) for a, b in sorted(declared.iteritems()) if a in index and b in index]
+    else:
+        classes = {}
+        for i, color in enumerate(_colors(G_i)):
+            classes.setdefault(color, []).append(i)
+        if any(len(members) > 2 for members in classes.values()):
+            return None
+        pairs = sorted(tuple(members) for members in classes.values() if len(members) == 2)
+    if not pairs:
+        return None
+    permutation = range(G_i.rows)
+    for a, b in pairs:
+        permutation[a], permutation[b] = b, a
+    return pairs if _symmetric(G_i, permutation) else None
+
+
+def solve(G_i, G_p, I_v, pairs, engine):
+    """ Solves equations G_i*V_i + G_p*V_p = I_v into V_i = V0 + Ap*V_p as common and differential mode halves
+
+        G_i, G_p, I_v: sympy matrices of equations
+
+        pairs: list of pairs of indexes of symmetric nets (find_pairs)
+
+        engine: function solving equations like _solution of instance, returning numerators of V0 and Ap and their
+        determinant
+
+        Returns tuple of numerators of V0 and Ap matrices and their determinant.
+    """
+    N = G_i.rows
+    paired = set(i for pair in pairs for i in pair)
+    axis = [i for i in range(N) if i not in paired]
+    T = sympy.zeros(N, N)
+    for k, (a, b) in enumerate(pairs):
+        T[a, k], T[b, k] = 1, 1
+        T[a, N - len(pairs) + k], T[b, N - len(pairs) + k] = 1, -1
+    for k, i in enumerate(axis):
+        T[i, len(pairs) + k] = 1
+    Nc = N - len(pairs)
+    with scs_trace.phase('symmetry', common=Nc, differential=len(pairs)) as event:
+        cancel = lambda expr: scs_governor.guarded('cancel', scs_backend.backend.cancel, scs_governor.keep, expr, event)
+        G_h = (T.T * G_i * T).applyfunc(cancel)
+        I_h = (T.T * I_v).applyfunc(cancel)
+        G_ph = (T.T * G_p).applyfunc(cancel)
+        V0_c, Ap_c, det_c = engine(G_h[:Nc, :Nc], G_ph[:Nc, :], I_h[:Nc, :])
+        V0_d, Ap_d, det_d = engine(G_h[Nc:, Nc:], G_ph[Nc:, :], I_h[Nc:, :])
+    Y = (V0_c.row_join(Ap_c) * det_d).col_join(V0_d.row_join(Ap_d) * det_c)
+    V = T * Y
+    return V[:, :I_v.cols], V[:, I_v.cols:], det_c * det_d
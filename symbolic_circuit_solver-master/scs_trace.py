@@ -0,0 +1,121 @@
+"""
+Tracing of solver phases
+
+Module records structured timings of each phase of a run (parsing, instantiating, solving each of subinstances,
+steps of analyses) together with expresion size metrics (operations count, free symbols count), and dumps them into
+JSON trace file. Tracing is off by default, and then phases cost just a function call and metrics aren't calculated
+at all. scs.py turns it on with --trace option.
+
+Trace file holds list of events in order of their completion:
+{"id": 3, "parent": 1, "phase": "inversion", "instance": "x1", "wall": 0.01, "cpu": 0.01, "start": 0.2, ...}
+where parent is id of phase which was in progress when phase was started, and additional keys hold metrics.
+"""
+import contextlib
+import json
+import time
+
+import sympy
+
+__author__ = "Tomasz Kniola"
+__credits__ = ["Tomasz Kniola"]
+
+__license__ = "LGPL"
+__version__ = "0.0.1"
+__email__ = "kniola.tomasz@gmail.com"
+__status__ = "development"
+
+_events = None  # List of recorded events, None while tracing is off
+_stack = []  # Events of phases being in progress
+_time0 = 0  # Time of enabling the tracing, events start times are relative to it
+_next_id = 0  # Id of next started phase
+
+
+def enable():
+    """ Turns tracing on, dropping everything recorded before
+    """
+    global _events, _stack, _time0, _next_id
+    _events = []
+    _stack = []
+    _time0 = time.time()
+    _next_id = 0
+
+
+def enabled():
+    """ Returns True if tracing is on
+    """
+    return _events is not None
+
+
+@contextlib.contextmanager
+def phase(name, **info):
+    """ Context manager which records a phase
+
+        name: name of the phase
+
+        info: additional information to record with it, like name of the instance
+
+        Yields event dictionary to which caller can add its own information or metrics (see measure). Phases can be
+        nested, the event records id of enclosing phase as its parent.
+    """
+    global _next_id
+    if _events is None:
+        yield {}
+        return
+    event = {'phase': name, 'id': _next_id, 'parent': _stack[-1]['id'] if _stack else None}
+    event.update(info)
+    _next_id += 1
+    _stack.append(event)
+    wall, cpu = time.time(), time.clock()
+    event['start'] = wall - _time0
+    try:
+        yield event
+    finally:
+        event['wall'] = time.time() - wall
+        event['cpu'] = time.clock() - cpu
+        _stack.pop()
+        _events.append(event)
+
+
+def measure(event, key, expresions):
+    """ Adds size metrics of expresions to event
+
+        event: event dictionary yield by phase
+
+        key: prefix of the metrics names
+
+        expresions: sympy expresion, matrix or list of them
+
+        Adds key_ops - total count of operations in expresions, and key_symbols - count of distinct free symbols.
+        Nothing is calculated while tracing is off.
+    """
+    if _events is None:
+        return
+    if isinstance(expresions, sympy.MatrixBase) or not isinstance(expresions, (list, tuple)):
+        expresions = [expresions]
+    ops, symbols = 0, set()
+    for expresion in expresions:
+        if isinstance(expresion, sympy.MatrixBase):
+            measure_list = list(expresion)
+        else:
+            measure_list = [expresion]
+        for expr in measure_list:
+            expr = sympy.sympify(expr)
+            ops += sympy.count_ops(expr)
+            symbols |= expr.free_symbols
+    event['%s_ops' % key] = int(ops)
+    event['%s_symbols' % key] = len(symbols)
+
+
+def events():
+    """ Returns list of events recorded so far, empty if tracing is off
+    """
+    return _events if _events else []
+
+
+def dump(filename):
+    """ Saves recorded events into a JSON file
+
+        filename: path of the trace file
+    """
+    with open(filename, 'w') as fil:
+        json.dump({'events': events()}, fil, indent=1, sort_keys=True, default=str)